@@ -1,78 +1,855 @@
-from flask import Flask, request, jsonify, abort, send_file
+from flask import Flask, request, jsonify, abort, send_file, g, Response
+import base64
+import math
 import os
 import json
 import sqlite3
 import sys
+import threading
+from dataclasses import asdict
 from typing import List, Dict, Any, Optional
 from flask_cors import CORS
+import numpy as np
 from urllib.parse import unquote
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_dir)
 
-from utils import get_db_path, get_trail_files
+from utils import get_db_path, get_full_trail_path, get_tile_cache_dir, get_trail_files
+from utils.cache import LRUCache
+from utils.db_pool import ConnectionPool, enable_wal
+from utils.tile_cache import DiskTileCache
+from data.init_db import migrate
+from utils.http_cache import (
+    MIN_COMPRESS_SIZE,
+    choose_encoding,
+    compress,
+    database_stamp,
+    file_stamp,
+    is_compressible,
+    last_modified,
+    make_etag,
+)
+from core.dem import default_elevation_model
+from core.encoding import (
+    PATH_FORMATS,
+    coordinates_to_list,
+    encode_path,
+    load_line_coordinates,
+    unpack_coordinates,
+    unpack_importance,
+)
+from core.geometry import TrailGeometry
+from core.metrics import RangeStats
+from core.profile import (
+    DEFAULT_PROFILE_POINTS,
+    MAX_PROFILE_POINTS,
+    PROFILE_RESOLUTIONS,
+    elevation_profile,
+)
+from core.simplify import (
+    MAX_ZOOM,
+    path_importance,
+    simplify_mask,
+    tolerance_for_zoom,
+)
+from core.mvt import (
+    BUFFER,
+    EXTENT,
+    MVT_MEDIA_TYPE,
+    TileLayer,
+    buffered_bounds,
+    clip_line,
+    encode_line_geometry,
+    encode_tile,
+    tile_bounds,
+    tile_coordinates,
+)
+from core.search import escape_like, search_trails
+from core.spatial import bbox_condition, nearest_trails
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# decoded trail paths, keyed by file path and evicted by total array size
+PATH_CACHE_BYTES = int(os.environ.get("TRAILGRADE_PATH_CACHE_MB", "64")) * 1024 * 1024
+path_cache = LRUCache(PATH_CACHE_BYTES)
+
+# compressed bodies, keyed by (etag, content encoding)
+compressed_cache = LRUCache(16 * 1024 * 1024)
+
+# prefix sums and sparse tables of trail paths, for range queries
+stats_cache = LRUCache(16 * 1024 * 1024)
+
+# downsampled elevation profiles, keyed by (file path, points)
+profile_cache = LRUCache(8 * 1024 * 1024)
+
+# generated vector tiles, kept on disk so they survive restarts
+tile_cache = DiskTileCache(
+    os.environ.get("TRAILGRADE_TILE_CACHE", get_tile_cache_dir())
+)
+
+# bump when tile contents change, so cached tiles are rebuilt
+TILE_VERSION = 1
+TILE_LAYER = "trails"
+
+# responses may be stored, but must be revalidated with the ETag before use
+CACHE_CONTROL = "public, no-cache"
+
+# bump when response bodies change shape, so clients drop old copies
+ETAG_VERSION = 1
+
+
+# read-only connections shared by requests, created on first use
+db_pool = None
+db_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    global db_pool
+    db_path = get_db_path()
+    with db_pool_lock:
+        if db_pool is None or db_pool.db_path != db_path:
+            prepare_database(db_path)
+            db_pool = ConnectionPool(db_path)
+    return db_pool
+
+
+@app.before_request
+def open_db_pool():
+    # set up (and migrate) the database before validators are computed from it
+    get_db_pool()
+
+
+def prepare_database(db_path):
+    """
+    Make sure the tables and indexes added after the original schema exist
+    before the first request reads the database, however the app was started
+    """
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        migrate(conn)
+    except sqlite3.Error as e:
+        # a read-only database can still serve the original endpoints
+        print(f"Could not migrate {db_path}: {e}")
+    finally:
+        conn.close()
+
 
 # Database connection helper
 def get_db_connection():
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row
-    return conn
+    """
+    The current request's connection, borrowed from the pool on first use
+    and handed back by release_db_connection when the app context ends.
+    """
+    if "db" not in g:
+        g.db_pool = get_db_pool()
+        g.db = g.db_pool.acquire()
+    return g.db
+
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    conn = g.pop("db", None)
+    if conn is not None:
+        g.pop("db_pool").release(conn)
+
+
+def load_trail_path(cursor, trail_id, geojson_path):
+    """
+    Coordinates of a trail path as an (n, dims) array, with the per-vertex
+    simplification importance from core.simplify.
+
+    Served from the in-process cache, then from the blobs written at ingest,
+    and only parsed from the GeoJSON file when neither matches the file's
+    current size and mtime (the file was edited since it was ingested).
+    """
+    stat = os.stat(geojson_path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+
+    cached = path_cache.get(geojson_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1], cached[2]
+
+    coordinates, importance = None, None
+    if trail_id is not None:
+        try:
+            cursor.execute(
+                """
+                SELECT g.dims, g.coordinates, g.source_size, g.source_mtime_ns,
+                       l.importance
+                FROM trail_geometry g
+                LEFT JOIN trail_geometry_lod l ON g.trail_id = l.trail_id
+                WHERE g.trail_id = ?
+            """,
+                (trail_id,),
+            )
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            # database predates the trail_geometry tables
+            row = None
+        if row and (row["source_size"], row["source_mtime_ns"]) == stamp:
+            coordinates = unpack_coordinates(row["dims"], row["coordinates"])
+            if row["importance"] is not None:
+                importance = unpack_importance(row["importance"])
+
+    if coordinates is None:
+        coordinates = load_line_coordinates(geojson_path)
+    if importance is None:
+        importance = path_importance(coordinates)
+
+    path_cache.put(
+        geojson_path,
+        (stamp, coordinates, importance),
+        coordinates.nbytes + importance.nbytes,
+    )
+    return coordinates, importance
+
+
+# media types that select a compact path format through the Accept header
+PATH_MEDIA_TYPES = {
+    "application/vnd.trailgrade.polyline+json": "polyline",
+    "application/vnd.trailgrade.delta+json": "delta",
+}
+
+
+def requested_path_format():
+    """
+    Coordinate format from ?format=, else from the Accept header.
+    Plain JSON coordinate arrays unless a compact format was asked for.
+    """
+    path_format = request.args.get("format")
+    if path_format is None:
+        best = request.accept_mimetypes.best_match(
+            ["application/json", *PATH_MEDIA_TYPES]
+        )
+        return PATH_MEDIA_TYPES.get(best, "json")
+
+    if path_format not in PATH_FORMATS:
+        abort(400, description=f"format must be one of {', '.join(PATH_FORMATS)}")
+    return path_format
+
+
+def requested_tolerance(coordinates):
+    """
+    Simplification tolerance in meters from the ?tolerance= or ?zoom= query
+    arguments, or None when the full path was asked for.
+    """
+    if "tolerance" in request.args:
+        return max(0.0, requested_float("tolerance"))
+    if "zoom" in request.args:
+        zoom = requested_float("zoom")
+        latitude = float(np.nanmean(coordinates[:, 1])) if len(coordinates) else 0
+        return tolerance_for_zoom(zoom, latitude)
+    return None
+
+
+def not_modified(*stamps, extra=()):
+    """
+    Set the validators for a response built from the given file/database
+    stamps and the request URL, and return a 304 response if the client's
+    copy is still current. Returns None when the body has to be built.
+    """
+    etag = make_etag(ETAG_VERSION, request.full_path, *stamps, *extra)
+    g.etag = etag
+    g.last_modified = last_modified(*stamps)
+
+    # a compressed copy has the encoding appended to its ETag; a 304 repeats
+    # whichever one the client holds, as that is what its 200 carried
+    if request.if_none_match:
+        g.matched_etag = next(
+            (
+                candidate
+                for candidate in (etag, f"{etag}-gzip", f"{etag}-br")
+                if request.if_none_match.contains(candidate)
+            ),
+            None,
+        )
+        fresh = g.matched_etag is not None
+    else:
+        since = request.if_modified_since
+        fresh = since is not None and g.last_modified <= since
+
+    if fresh:
+        return Response(status=304)
+    return None
+
+
+@app.after_request
+def add_cache_headers(response):
+    """Compress large text bodies and attach the validators set by not_modified"""
+    encoding = None
+    if (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and "Content-Encoding" not in response.headers
+        and is_compressible(response.mimetype)
+    ):
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding and response.content_length < MIN_COMPRESS_SIZE:
+            encoding = None
+
+    etag = g.get("etag")
+    if encoding:
+        key = (etag, encoding)
+        body = compressed_cache.get(key) if etag else None
+        if body is None:
+            body = compress(response.get_data(), encoding)
+            if etag:
+                compressed_cache.put(key, body, len(body))
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+    elif response.status_code == 304:
+        encoding = choose_encoding(request.accept_encodings)
+
+    if etag and response.status_code in (200, 304):
+        validator = f"{etag}-{encoding}" if encoding else etag
+        if response.status_code == 304:
+            validator = g.get("matched_etag") or validator
+        response.set_etag(validator)
+        response.last_modified = g.last_modified
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+# output field -> column it is read from
+TRAIL_FIELDS = {
+    "name": "t.name",
+    "location_lat": "t.location_lat",
+    "location_long": "t.location_long",
+    "length": "t.length",
+    "difficulty": "d.overall_difficulty",
+    "difficulty_rating": "d.overall_difficulty",
+    "cardio_intensity": "d.cardio_intensity",
+    "technical_difficulty": "d.technical_difficulty",
+}
+
+# sort option -> column; sorted on directly so the name sort and its keyset
+# seek use idx_trails_name. NULLs sort first (last when descending) and are
+# paged as a block of their own, see get_trails
+TRAIL_SORTS = {
+    "name": "t.name",
+    "length": "t.length",
+    "difficulty": "d.overall_difficulty",
+    "cardio": "d.cardio_intensity",
+    "technical": "d.technical_difficulty",
+}
+
+# numeric query argument -> condition
+TRAIL_FILTERS = {
+    "min_difficulty": "d.overall_difficulty >= ?",
+    "max_difficulty": "d.overall_difficulty <= ?",
+    "min_length": "t.length >= ?",
+    "max_length": "t.length <= ?",
+    "min_cardio": "d.cardio_intensity >= ?",
+    "max_cardio": "d.cardio_intensity <= ?",
+    "min_technical": "d.technical_difficulty >= ?",
+    "max_technical": "d.technical_difficulty <= ?",
+}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+DEFAULT_NEAREST = 5
+MAX_NEAREST = 100
+
+DEFAULT_SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 50
+
+# only the first rating of each trail, so every trail is one row
+FIRST_RATING_JOIN = """
+    LEFT JOIN difficulty_ratings d ON d.rating_id = (
+        SELECT MIN(rating_id) FROM difficulty_ratings
+        WHERE trail_id = t.trail_id
+    )
+"""
+
+
+def format_trail(row, fields):
+    """Catalogue entry for a trails row with the columns of fields"""
+    trail = {}
+    for field in fields:
+        value = row[TRAIL_FIELDS[field].split(".")[1]]
+        if field == "difficulty":
+            value = str(int(value)) if value is not None else "Unknown"
+        trail[field] = value
+    return trail
+
+
+def encode_cursor(sort, key, trail_id):
+    """Opaque pagination cursor pointing just after (key, trail_id)"""
+    data = json.dumps([sort, key, trail_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, sort):
+    """Inverse of encode_cursor, aborts with 400 if it is not for this sort"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        cursor_sort, key, trail_id = data
+    except (ValueError, TypeError):
+        abort(400, description="invalid cursor")
+    if cursor_sort != sort:
+        abort(400, description="cursor was issued for a different sort")
+    return key, trail_id
+
+
+def requested_fields():
+    """Catalogue fields named by ?fields=, all of them by default"""
+    fields = list(TRAIL_FIELDS)
+    if request.args.get("fields"):
+        fields = [field.strip() for field in request.args["fields"].split(",")]
+        unknown = [field for field in fields if field not in TRAIL_FIELDS]
+        if unknown:
+            abort(400, description=f"unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def requested_float(name, default=None):
+    """Numeric query argument, aborting with 400 if it is not a finite number"""
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            abort(400, description=f"{name} is required")
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = math.nan
+    if not math.isfinite(number):
+        abort(400, description=f"{name} must be a number")
+    return number
+
+
+def trail_query_args(default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Parse the catalogue query arguments into (fields, sort, descending,
+    conditions, params, limit), aborting with 400 on anything invalid.
+    """
+    args = request.args
+    fields = requested_fields()
+
+    sort = args.get("sort", "name")
+    descending = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort not in TRAIL_SORTS:
+        abort(400, description=f"sort must be one of {', '.join(TRAIL_SORTS)}")
+
+    conditions, params = requested_filters()
+
+    if args.get("name_prefix"):
+        # LIKE is case-insensitive; escape its wildcards in the prefix
+        conditions.append("t.name LIKE ? ESCAPE '\\'")
+        params.append(escape_like(args["name_prefix"]) + "%")
+
+    limit = requested_limit(default_limit, MAX_PAGE_SIZE)
+    return fields, sort, descending, conditions, params, limit
+
+
+def requested_filters():
+    """SQL conditions and parameters for the min_/max_ query arguments"""
+    conditions, params = [], []
+    for name, condition in TRAIL_FILTERS.items():
+        if name in request.args:
+            params.append(requested_float(name))
+            conditions.append(condition)
+    return conditions, params
+
+
+def requested_limit(default, maximum):
+    """?limit= clamped to 1..maximum, aborting with 400 if not an integer"""
+    try:
+        limit = int(request.args.get("limit", default))
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    return min(max(limit, 1), maximum)
 
 
 @app.route("/api/trails", methods=["GET"])
 def get_trails():
-    """Fetch all trails from the database."""
+    """
+    Fetch one page of the trail catalogue.
+
+    Query arguments: limit, cursor (the next_cursor of the previous page),
+    sort (name, length, difficulty, cardio or technical, prefixed with - for
+    descending), fields (comma-separated), name_prefix, and min_/max_ bounds
+    for difficulty, length, cardio and technical.
+    """
+    cached = not_modified(database_stamp(get_db_path()))
+    if cached is not None:
+        return cached
+
+    fields, sort, descending, conditions, params, limit = trail_query_args()
+    sort_key = TRAIL_SORTS[sort]
+    operator = "<" if descending else ">"
+    direction = "DESC" if descending else "ASC"
+    columns = sorted({TRAIL_FIELDS[field] for field in fields})
+
+    # rows with and without a sort key are two blocks, each paged with a
+    # plain keyset comparison; start from the block the cursor is in
+    blocks = [False, True] if descending else [True, False]  # key is NULL
+    after = None
+    if request.args.get("cursor"):
+        after = decode_cursor(request.args["cursor"], sort)
+        blocks = blocks[blocks.index(after[0] is None) :]
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    trails = []
+    for position, null_keys in enumerate(blocks):
+        block_conditions = [
+            *conditions,
+            f"{sort_key} IS NULL" if null_keys else f"{sort_key} IS NOT NULL",
+        ]
+        block_params = list(params)
+
+        # keyset pagination: continue after the last row of the previous page
+        if after is not None and position == 0:
+            key, trail_id = after
+            if null_keys:
+                block_conditions.append(f"t.trail_id {operator} ?")
+                block_params.append(trail_id)
+            else:
+                block_conditions.append(f"({sort_key}, t.trail_id) {operator} (?, ?)")
+                block_params.extend([key, trail_id])
+
+        cursor.execute(
+            f"""
+                SELECT t.trail_id, {sort_key} AS sort_key, {", ".join(columns)}
+                FROM trails t
+                {FIRST_RATING_JOIN}
+                WHERE {" AND ".join(block_conditions)}
+                ORDER BY {sort_key} {direction}, t.trail_id {direction}
+                LIMIT ?
+            """,
+            (*block_params, limit + 1 - len(trails)),
+        )
+        trails.extend(cursor.fetchall())
+        if len(trails) > limit:
+            break
+
+    next_cursor = None
+    if len(trails) > limit:
+        trails = trails[:limit]
+        last = trails[-1]
+        next_cursor = encode_cursor(sort, last["sort_key"], last["trail_id"])
+
+    result = [format_trail(t, fields) for t in trails]
+    return {"trails": result, "next_cursor": next_cursor}
+
+
+@app.route("/api/trails/within", methods=["GET"])
+def get_trails_within():
+    """
+    Trails whose path crosses a map viewport.
+
+    Query arguments: bbox as min_lon,min_lat,max_lon,max_lat (a min_lon
+    greater than max_lon wraps across the antimeridian), plus the fields,
+    sort, filter and limit arguments of /api/trails. Results are not paged;
+    truncated is true when more than limit trails are in view.
+    """
+    cached = not_modified(database_stamp(get_db_path()))
+    if cached is not None:
+        return cached
+
+    try:
+        bbox = tuple(float(value) for value in request.args["bbox"].split(","))
+    except (KeyError, ValueError):
+        abort(400, description="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if len(bbox) != 4 or not all(map(math.isfinite, bbox)) or bbox[1] > bbox[3]:
+        abort(400, description="bbox must be min_lon,min_lat,max_lon,max_lat")
+
+    fields, sort, descending, conditions, params, limit = trail_query_args(
+        default_limit=MAX_PAGE_SIZE
+    )
+    bbox_sql, bbox_params = bbox_condition(bbox, alias="r")
+    columns = sorted({TRAIL_FIELDS[field] for field in fields})
+    where = " AND ".join([bbox_sql, *conditions])
+    direction = "DESC" if descending else "ASC"
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # the R*Tree narrows the search to the viewport before anything else
     cursor.execute(
-        """
-            SELECT t.name, t.location_lat, t.location_long, t.length,
-                   d.overall_difficulty, d.cardio_intensity, d.technical_difficulty
+        f"""
+            SELECT t.trail_id, {", ".join(columns)}
+            FROM trail_rtree r
+            JOIN trails t ON t.trail_id = r.trail_id
+            {FIRST_RATING_JOIN}
+            WHERE {where}
+            ORDER BY {TRAIL_SORTS[sort]} {direction}, t.trail_id {direction}
+            LIMIT ?
+        """,
+        (*bbox_params, *params, limit + 1),
+    )
+    trails = cursor.fetchall()
+
+    return {
+        "trails": [format_trail(t, fields) for t in trails[:limit]],
+        "truncated": len(trails) > limit,
+    }
+
+
+@app.route("/api/trails/nearest", methods=["GET"])
+def get_nearest_trails():
+    """
+    The k trails closest to a point, nearest first.
+
+    Query arguments: lat, lon, k (default 5, at most 100) and fields.
+    Each trail carries its distance in meters to the closest point of
+    its path.
+    """
+    cached = not_modified(database_stamp(get_db_path()))
+    if cached is not None:
+        return cached
+
+    latitude = requested_float("lat")
+    longitude = requested_float("lon")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        abort(400, description="lat or lon out of range")
+    k = int(min(max(requested_float("k", DEFAULT_NEAREST), 1), MAX_NEAREST))
+    fields = requested_fields()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    nearest = nearest_trails(cursor, latitude, longitude, k)
+    if not nearest:
+        return {"trails": []}
+
+    columns = sorted({TRAIL_FIELDS[field] for field in fields})
+    placeholders = ", ".join("?" * len(nearest))
+    cursor.execute(
+        f"""
+            SELECT t.trail_id, {", ".join(columns)}
             FROM trails t
-            LEFT JOIN difficulty_ratings d ON t.trail_id = d.trail_id
+            {FIRST_RATING_JOIN}
+            WHERE t.trail_id IN ({placeholders})
+        """,
+        [trail_id for trail_id, _ in nearest],
+    )
+    rows = {t["trail_id"]: t for t in cursor.fetchall()}
+
+    result = []
+    for trail_id, distance in nearest:
+        trail = format_trail(rows[trail_id], fields)
+        trail["distance"] = round(distance, 1)
+        result.append(trail)
+    return {"trails": result}
+
+
+@app.route("/api/search", methods=["GET"])
+def search():
+    """
+    Search-as-you-type over trail names and notes.
+
+    Query arguments: q, limit (default 10, at most 50), fields, and the
+    min_/max_ filters of /api/trails. Matches are ranked exact name, name
+    prefix, name substring, then notes; names within a typo or two of the
+    query fill any remaining places. Each result says how it matched.
+    """
+    cached = not_modified(database_stamp(get_db_path()))
+    if cached is not None:
+        return cached
+
+    query = request.args.get("q", "")
+    fields = requested_fields()
+    conditions, params = requested_filters()
+    limit = requested_limit(DEFAULT_SEARCH_RESULTS, MAX_SEARCH_RESULTS)
+
+    # filters apply to the trail behind each trail_search row
+    condition = ""
+    if conditions:
+        condition = f"""
+            rowid IN (
+                SELECT t.trail_id FROM trails t
+                {FIRST_RATING_JOIN}
+                WHERE {" AND ".join(conditions)}
+            )
         """
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    matches = search_trails(cursor, query, limit, condition, params)
+    if not matches:
+        return {"results": []}
+
+    columns = sorted({TRAIL_FIELDS[field] for field in fields})
+    placeholders = ", ".join("?" * len(matches))
+    cursor.execute(
+        f"""
+            SELECT t.trail_id, {", ".join(columns)}
+            FROM trails t
+            {FIRST_RATING_JOIN}
+            WHERE t.trail_id IN ({placeholders})
+        """,
+        [trail_id for trail_id, _ in matches],
     )
+    rows = {t["trail_id"]: t for t in cursor.fetchall()}
 
-    trails = cursor.fetchall()
-    conn.close()
+    results = []
+    for trail_id, match in matches:
+        result = format_trail(rows[trail_id], fields)
+        result["match"] = match
+        results.append(result)
+    return {"results": results}
 
-    result = []
-    for t in trails:
-        difficulty_rating = t["overall_difficulty"]
-        difficulty_display = (
-            str(int(difficulty_rating)) if difficulty_rating is not None else "Unknown"
-        )
 
-        result.append(
+def tile_trails(cursor, z, x, y):
+    """Trails whose bounding box crosses tile z/x/y, with their first rating"""
+    condition, params = bbox_condition(buffered_bounds(z, x, y), alias="r")
+    cursor.execute(
+        f"""
+            SELECT t.trail_id, t.name, t.geojson_path, t.length,
+                   d.overall_difficulty, d.cardio_intensity, d.technical_difficulty
+            FROM trail_rtree r
+            JOIN trails t ON t.trail_id = r.trail_id
+            {FIRST_RATING_JOIN}
+            WHERE {condition}
+            ORDER BY t.trail_id
+        """,
+        params,
+    )
+    return cursor.fetchall()
+
+
+def build_tile(cursor, z, x, y, trails):
+    """Encode the given trails crossing tile z/x/y as MVT line features"""
+    # drop vertices closer together than half a screen pixel at this zoom
+    _, min_lat, _, max_lat = tile_bounds(z, x, y)
+    tolerance = tolerance_for_zoom(z, (min_lat + max_lat) / 2)
+
+    layer = TileLayer(TILE_LAYER)
+    for trail in trails:
+        if not trail["geojson_path"]:
+            continue
+        try:
+            path, importance = load_trail_path(
+                cursor, trail["trail_id"], get_full_trail_path(trail["geojson_path"])
+            )
+        except (OSError, ValueError) as e:
+            print(f"Skipping {trail['name']} in tile {z}/{x}/{y}: {e}")
+            continue
+        if len(path) < 2:
+            continue
+
+        points = tile_coordinates(path[simplify_mask(importance, tolerance)], z, x, y)
+        geometry = encode_line_geometry(clip_line(points, -BUFFER, EXTENT + BUFFER))
+        overall = trail["overall_difficulty"]
+        layer.add_line(
+            trail["trail_id"],
+            geometry,
             {
-                "name": t["name"],
-                "location_lat": t["location_lat"],
-                "location_long": t["location_long"],
-                "length": t["length"],
-                "difficulty": difficulty_display,
-                "difficulty_rating": difficulty_rating,
-                "cardio_intensity": t["cardio_intensity"],
-                "technical_difficulty": t["technical_difficulty"],
-            }
+                "name": trail["name"],
+                "difficulty": int(overall) if overall is not None else None,
+                "length": trail["length"],
+                "cardio_intensity": trail["cardio_intensity"],
+                "technical_difficulty": trail["technical_difficulty"],
+            },
         )
+    return encode_tile([layer])
 
-    return result
 
+@app.route("/tiles/<int:z>/<int:x>/<int:y>", methods=["GET"])
+def get_tile(z, x, y):
+    """
+    Mapbox Vector Tile with every trail line in tile z/x/y, in a "trails"
+    layer with name, difficulty, length, cardio_intensity and
+    technical_difficulty attributes. Lines are simplified for the zoom
+    level. Tiles are cached on disk until the database or the GeoJSON file
+    of a trail in the tile changes.
+    """
+    if z > MAX_ZOOM or not (0 <= x < 2**z and 0 <= y < 2**z):
+        abort(404, description="no such tile")
 
-@app.route("/api/trail_path/<trail_name>", methods=["GET"])
-def get_trail_path(trail_name):
-    """Retrieve trail path and details from the GeoJSON file and database."""
-    decoded_name = unquote(trail_name)
+    stamp = database_stamp(get_db_path())
+    cursor = get_db_connection().cursor()
+    trails = tile_trails(cursor, z, x, y)
+    # a file edited since ingest is drawn from its new contents
+    # (load_trail_path), so its stamp is part of the tile's validators
+    file_stamps = [
+        file_stamp(get_full_trail_path(trail["geojson_path"]))
+        for trail in trails
+        if trail["geojson_path"]
+    ]
+    cached = not_modified(stamp, *file_stamps, extra=(TILE_VERSION,))
+    if cached is not None:
+        return cached
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    version = make_etag(TILE_VERSION, stamp)
+    variant = make_etag(*file_stamps)
+    data = tile_cache.get(version, z, x, y, variant)
+    if data is None:
+        data = build_tile(cursor, z, x, y, trails)
+        tile_cache.put(version, z, x, y, data, variant)
+    return Response(data, mimetype=MVT_MEDIA_TYPE)
 
-    cursor.execute("SELECT geojson_path FROM trails WHERE name = ?", (decoded_name,))
+
+# most coordinates one /api/elevation request may ask for
+MAX_ELEVATION_POINTS = 10000
+
+
+@app.route("/api/elevation", methods=["POST"])
+def get_elevations():
+    """
+    Elevations for a batch of points from the local DEM.
+
+    Expects {"locations": [[latitude, longitude], ...]} and returns
+    {"elevations": [meters or null, ...]} in the same order; null where
+    the DEM has no data.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, description='expected a JSON object with "locations"')
+    locations = body.get("locations")
+    if not isinstance(locations, list):
+        abort(400, description="locations must be a list of [latitude, longitude]")
+    if len(locations) > MAX_ELEVATION_POINTS:
+        abort(400, description=f"at most {MAX_ELEVATION_POINTS} locations")
+
+    if not locations:
+        return {"elevations": []}
+    try:
+        points = np.array(locations, dtype=np.float64)
+    except (TypeError, ValueError):
+        points = None
+    if points is None or points.ndim != 2 or points.shape[1] != 2:
+        abort(400, description="locations must be a list of [latitude, longitude]")
+    if not (np.all(np.abs(points[:, 0]) <= 90) and np.all(np.abs(points[:, 1]) <= 180)):
+        abort(400, description="latitude or longitude out of range")
+
+    elevations = default_elevation_model().sample(points[:, 0], points[:, 1])
+    return {
+        "elevations": [
+            None if np.isnan(value) else round(float(value), 1) for value in elevations
+        ]
+    }
+
+
+def find_trail(cursor, decoded_name):
+    """
+    (row, geojson_path) of a trail by name: its details and first rating
+    (row is None if the trail is not in the database) and its GeoJSON file.
+    """
+    # trail details and ratings in one lookup on the unique name index
+    cursor.execute(
+        """
+        SELECT t.trail_id, t.geojson_path, t.length, t.max_elevation,
+               t.min_elevation, t.elevation_gain, t.elevation_loss,
+               d.rating_id, d.overall_difficulty, d.cardio_intensity,
+               d.technical_difficulty, d.accessibility, d.weather_vulnerability
+        FROM trails t
+        LEFT JOIN difficulty_ratings d ON d.trail_id = t.trail_id
+        WHERE t.name = ?
+        ORDER BY d.rating_id
+        LIMIT 1
+    """,
+        (decoded_name,),
+    )
     row = cursor.fetchone()
 
     geojson_path = None
@@ -88,83 +865,197 @@ def get_trail_path(trail_name):
     else:
         # Fallback to direct file lookup
         geojson_path = os.path.join(get_trail_files(), f"{decoded_name}.geojson")
+    return row, geojson_path
+
+
+@app.route("/api/trail_path/<trail_name>", methods=["GET"])
+def get_trail_path(trail_name):
+    """Retrieve trail path and details from the GeoJSON file and database."""
+    decoded_name = unquote(trail_name)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    row, geojson_path = find_trail(cursor, decoded_name)
 
     if not os.path.exists(geojson_path):
         print(f"File not found: {geojson_path}")
-        conn.close()
         return None
 
-    # Load GeoJSON data
-    with open(geojson_path, "r") as f:
-        data = json.load(f)
-
-    coordinates = []
-    for feature in data.get("features", []):
-        if feature["geometry"]["type"] == "MultiLineString":
-            for line in feature["geometry"]["coordinates"]:
-                coordinates.extend(line)
-        elif feature["geometry"]["type"] == "LineString":
-            coordinates.extend(feature["geometry"]["coordinates"])
-
-    cursor.execute(
-        """
-        SELECT t.trail_id, t.length, t.max_elevation, t.min_elevation,
-                t.elevation_gain, t.elevation_loss 
-        FROM trails t
-        WHERE t.name = ?
-    """,
-        (decoded_name,),
+    # nothing to do if the client already has this version
+    path_format = requested_path_format()
+    cached = not_modified(
+        database_stamp(get_db_path()), file_stamp(geojson_path), extra=(path_format,)
     )
+    if cached is not None:
+        return cached, {"Vary": "Accept"}
 
-    trail_row = cursor.fetchone()
+    # Load path coordinates, without reparsing the file when possible
+    trail_id = row["trail_id"] if row else None
+    path, importance = load_trail_path(cursor, trail_id, geojson_path)
 
-    difficulty = None
-    if trail_row:
-        trail_id = trail_row["trail_id"]
-
-        # get difficulty ratings
-        cursor.execute(
-            """
-            SELECT * FROM difficulty_ratings
-            WHERE trail_id = ?
-        """,
-            (trail_id,),
-        )
+    # simplify for the requested zoom level, if any
+    simplification = {}
+    tolerance = requested_tolerance(path)
+    if tolerance is not None:
+        simplification = {"tolerance": tolerance, "original_point_count": len(path)}
+        path = path[simplify_mask(importance, tolerance)]
 
-        diff_row = cursor.fetchone()
-        if diff_row:
-            difficulty = {
-                "overall_difficulty": diff_row["overall_difficulty"],
-                "cardio_intensity": diff_row["cardio_intensity"],
-                "technical_difficulty": diff_row["technical_difficulty"],
-                "accessibility": diff_row["accessibility"],
-                "weather_vulnerability": diff_row["weather_vulnerability"],
-            }
+    # full coordinate arrays, or one of the compact encodings
+    if path_format == "json":
+        path_fields = {"coordinates": coordinates_to_list(path)}
+    else:
+        path_fields = {"path": encode_path(path, path_format)}
 
-    conn.close()
+    trail_row = row
+    difficulty = None
+    if trail_row and trail_row["rating_id"] is not None:
+        difficulty = {
+            "overall_difficulty": trail_row["overall_difficulty"],
+            "cardio_intensity": trail_row["cardio_intensity"],
+            "technical_difficulty": trail_row["technical_difficulty"],
+            "accessibility": trail_row["accessibility"],
+            "weather_vulnerability": trail_row["weather_vulnerability"],
+        }
 
     if trail_row:
-        return {
+        result = {
             "name": decoded_name,
-            "coordinates": coordinates,
+            **path_fields,
             "length": trail_row["length"],
             "max_elevation": trail_row["max_elevation"],
             "min_elevation": trail_row["min_elevation"],
             "elevation_gain": trail_row["elevation_gain"],
             "elevation_loss": trail_row["elevation_loss"],
             "difficulty": difficulty,
+            **simplification,
         }
     else:
-        return {
+        result = {
             "name": decoded_name,
-            "coordinates": coordinates,
+            **path_fields,
             "length": None,
             "max_elevation": None,
             "min_elevation": None,
             "elevation_gain": None,
             "elevation_loss": None,
+            **simplification,
         }
 
+    # the body depends on the Accept header when no format was given
+    return result, {"Vary": "Accept"}
+
+
+def load_trail_stats(cursor, trail_id, geojson_path):
+    """
+    core.metrics.RangeStats of a trail path, built from the same coordinates
+    as load_trail_path and cached until the file changes.
+    """
+    stamp = file_stamp(geojson_path)
+    cached = stats_cache.get(geojson_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    coordinates, _ = load_trail_path(cursor, trail_id, geojson_path)
+    stats = RangeStats(TrailGeometry.from_coordinates(coordinates))
+    stats_cache.put(geojson_path, (stamp, stats), stats.nbytes)
+    return stats
+
+
+@app.route("/api/trail_path/<trail_name>/range", methods=["GET"])
+def get_trail_range(trail_name):
+    """
+    Length, elevation gain and loss, elevation range and slopes of the
+    stretch of a trail between start and end, in meters along the trail
+    (the whole trail by default).
+    """
+    start = requested_float("start", 0.0)
+    end = requested_float("end", math.inf)
+    if start > end:
+        abort(400, description="start must not be after end")
+
+    decoded_name = unquote(trail_name)
+    cursor = get_db_connection().cursor()
+    row, geojson_path = find_trail(cursor, decoded_name)
+    if row is None or not os.path.exists(geojson_path):
+        abort(404, description=f"trail {decoded_name} not found")
+
+    cached = not_modified(database_stamp(get_db_path()), file_stamp(geojson_path))
+    if cached is not None:
+        return cached
+
+    stats = load_trail_stats(cursor, row["trail_id"], geojson_path)
+    return {"name": decoded_name, **asdict(stats.between(start, end))}
+
+
+def load_trail_profile(cursor, trail_id, geojson_path, points):
+    """
+    Elevation profile of a trail path downsampled to at most points rows of
+    [distance, elevation]. Standard sizes are read from the rows stored at
+    ingest while the file is unchanged; anything else is built from the
+    path. Either way the result is cached until the file changes.
+    """
+    stamp = file_stamp(geojson_path)
+    cached = profile_cache.get((geojson_path, points))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    series = None
+    if trail_id is not None and points in PROFILE_RESOLUTIONS:
+        try:
+            cursor.execute(
+                """
+                SELECT p.series, g.source_size, g.source_mtime_ns
+                FROM trail_profile p
+                JOIN trail_geometry g ON g.trail_id = p.trail_id
+                WHERE p.trail_id = ? AND p.points = ?
+            """,
+                (trail_id, points),
+            )
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            # database predates the trail_profile table
+            row = None
+        if row and (row["source_size"], row["source_mtime_ns"]) == stamp:
+            series = unpack_coordinates(2, row["series"])
+
+    if series is None:
+        coordinates, _ = load_trail_path(cursor, trail_id, geojson_path)
+        series = elevation_profile(TrailGeometry.from_coordinates(coordinates), points)
+
+    profile_cache.put((geojson_path, points), (stamp, series), series.nbytes)
+    return series
+
+
+@app.route("/api/trail_path/<trail_name>/profile", methods=["GET"])
+def get_trail_profile(trail_name):
+    """
+    Distance (m) vs elevation (m) series of a trail for charting, with at
+    most ?points= entries chosen to keep the profile's shape.
+    """
+    try:
+        points = int(request.args.get("points", DEFAULT_PROFILE_POINTS))
+    except ValueError:
+        abort(400, description="points must be an integer")
+    points = min(max(points, 2), MAX_PROFILE_POINTS)
+
+    decoded_name = unquote(trail_name)
+    cursor = get_db_connection().cursor()
+    row, geojson_path = find_trail(cursor, decoded_name)
+    if row is None or not os.path.exists(geojson_path):
+        abort(404, description=f"trail {decoded_name} not found")
+
+    cached = not_modified(database_stamp(get_db_path()), file_stamp(geojson_path))
+    if cached is not None:
+        return cached
+
+    series = load_trail_profile(cursor, row["trail_id"], geojson_path, points)
+    return {
+        "name": decoded_name,
+        "points": len(series),
+        "distance": np.round(series[:, 0], 1).tolist(),
+        "elevation": np.round(series[:, 1], 1).tolist(),
+    }
+
 
 # Error handlers
 @app.errorhandler(400)
@@ -188,5 +1079,8 @@ if __name__ == "__main__":
         print("Database not found. Please run data/init_db.py first.")
         sys.exit(1)
 
+    # readers use WAL so they never wait for add_trails to finish writing
+    enable_wal(get_db_path())
+
     # Run the Flask app
     app.run(debug=True, port=8000)
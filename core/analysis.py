@@ -1,10 +1,46 @@
+import math
 import sqlite3
-import statistics
-from typing import Optional, TYPE_CHECKING
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from utils.cache import LRUCache
 
 if TYPE_CHECKING:
     from core.trail import Trail
 
+# bump whenever a change to parsing, metrics, ratings or the stored rows
+# should make the ingestion manifest re-analyze every trail file
+ANALYZER_VERSION = 5
+
+# most difficulty reports one analyzer keeps, least recently used dropped first
+REPORT_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class DifficultyReport:
+    """Difficulty ratings for one trail, each computed exactly once"""
+
+    content_hash: str
+    elevation_variance: float
+    cardio_intensity: int
+    technical_difficulty: int
+    accessibility: Optional[int]
+    weather_vulnerability: Optional[int]
+    overall_difficulty: int
+
+    def to_dict(self) -> Dict[str, Optional[int]]:
+        """Ratings keyed the same way as the difficulty_ratings table"""
+        return {
+            "cardio_intensity": self.cardio_intensity,
+            "technical_difficulty": self.technical_difficulty,
+            "accessibility": self.accessibility,
+            "weather_vulnerability": self.weather_vulnerability,
+            "overall_difficulty": self.overall_difficulty,
+        }
+
 
 class TrailAnalyzer:
     """Analyzes trail data and generates difficulty ratings"""
@@ -12,11 +48,58 @@ class TrailAnalyzer:
     def __init__(self, db_connection: Optional[sqlite3.Connection] = None):
         self.db = db_connection
 
+        # difficulty reports keyed by trail content hash; each report counts
+        # as size 1, so the cache is bounded by a report count
+        self._reports = LRUCache(REPORT_CACHE_SIZE)
+
+    def get_difficulty_report(self, trail: "Trail") -> DifficultyReport:
+        """
+        Return the difficulty report for a trail, computing it on first use.
+        Trails with identical geometry share one cached report.
+        """
+        key = trail.content_hash
+        report = self._reports.get(key)
+        if report is None:
+            report = self._build_report(trail, key)
+            self._reports.put(key, report, 1)
+        return report
+
+    def clear_cache(self) -> None:
+        """Forget every cached difficulty report"""
+        self._reports.clear()
+
+    def _build_report(self, trail: "Trail", content_hash: str) -> DifficultyReport:
+        """Compute every sub-score once, sharing the elevation variance"""
+        elev_var = (
+            trail.elevation_variance if hasattr(trail, "elevation_variance") else 0
+        )
+
+        cardio = self._score_cardio_intensity(trail, elev_var)
+        technical = self._score_technical_difficulty(trail, elev_var)
+        accessibility = self.calculate_accessibility(trail)
+        weather = self.calculate_weather_vulnerability(trail)
+        overall = self._score_overall_difficulty(
+            cardio, technical, accessibility, weather
+        )
+
+        return DifficultyReport(
+            content_hash=content_hash,
+            elevation_variance=elev_var,
+            cardio_intensity=cardio,
+            technical_difficulty=technical,
+            accessibility=accessibility,
+            weather_vulnerability=weather,
+            overall_difficulty=overall,
+        )
+
     def calculate_cardio_intensity(self, trail: "Trail") -> int:
         """
         Calculate cardio intensity 1-10
         Factors: elevation gain, trail length, average slope
         """
+        return self.get_difficulty_report(trail).cardio_intensity
+
+    def _score_cardio_intensity(self, trail: "Trail", elev_var: float) -> int:
         # normalize each factor to a 0-1 scale and then combine
 
         # elev. gain: 0m (0) to 1500m+ (1.0)
@@ -30,9 +113,6 @@ class TrailAnalyzer:
         slope_factor = min(1.0, avg_slope / 15)
 
         # add weight to elevation variance for more differentiation
-        elev_var = (
-            trail.elevation_variance if hasattr(trail, "elevation_variance") else 0
-        )
         var_factor = min(1.0, elev_var / 100)
 
         # combined score with weights
@@ -51,6 +131,9 @@ class TrailAnalyzer:
         Calculate technical difficulty 1-10
         Factors: max slope, terrain type, obstacles, exposure
         """
+        return self.get_difficulty_report(trail).technical_difficulty
+
+    def _score_technical_difficulty(self, trail: "Trail", elev_variance: float) -> int:
         # use only max slope and elevation variance in lieu of technical terrain data
 
         # max slope: 0% (0) to 67%+ (1.0)
@@ -58,9 +141,6 @@ class TrailAnalyzer:
         slope_factor = min(1.0, max_slope / 67)
 
         # elevation variance (proxy for technical terrain)
-        elev_variance = (
-            trail.elevation_variance if hasattr(trail, "elevation_variance") else 0
-        )
         variance_factor = min(1.0, elev_variance / 200)
 
         # combined score
@@ -89,46 +169,45 @@ class TrailAnalyzer:
         """
         Enhanced method to calculate elevation variance with better sensitivity
         """
-        if len(trail.points) <= 1:
+        if len(trail.geometry) <= 1:
             return 0.0
 
         # Get all elevations
-        elevations = [p.elevation for p in trail.points]
+        elevations = trail.geometry.elevation
 
         # Calculate several variance metrics for better differentiation
-        if len(elevations) > 1:
-            # Standard variance
-            var = statistics.variance(elevations) if len(elevations) > 1 else 0.0
+        # Standard variance
+        var = float(np.var(elevations, ddof=1))
 
-            # Range (max - min)
-            elev_range = max(elevations) - min(elevations)
+        # Range (max - min)
+        elev_range = float(elevations.max() - elevations.min())
 
-            # Standard deviation
-            std_dev = statistics.stdev(elevations) if len(elevations) > 1 else 0.0
+        # Standard deviation
+        std_dev = math.sqrt(var)
 
-            # Calculate elevation changes (ups and downs)
-            elev_changes = sum(
-                abs(elevations[i] - elevations[i - 1])
-                for i in range(1, len(elevations))
-            )
-            avg_change = elev_changes / len(elevations)
+        # Calculate elevation changes (ups and downs)
+        elev_changes = float(np.abs(np.diff(elevations)).sum())
+        avg_change = elev_changes / len(elevations)
 
-            # Combined metric (weighted blend)
-            combined_variance = (
-                var * 0.3 + elev_range * 0.3 + std_dev * 0.2 + avg_change * 0.2
-            )
-
-            return combined_variance
+        # Combined metric (weighted blend)
+        combined_variance = (
+            var * 0.3 + elev_range * 0.3 + std_dev * 0.2 + avg_change * 0.2
+        )
 
-        return 0.0
+        return combined_variance
 
     def calculate_overall_difficulty(self, trail: "Trail") -> int:
         """Calculate overall difficulty score"""
-        cardio = self.calculate_cardio_intensity(trail)
-        technical = self.calculate_technical_difficulty(trail)
-        accessibility = self.calculate_accessibility(trail)
-        weather = self.calculate_weather_vulnerability(trail)
-
+        return self.get_difficulty_report(trail).overall_difficulty
+
+    def _score_overall_difficulty(
+        self,
+        cardio: int,
+        technical: int,
+        accessibility: Optional[int],
+        weather: Optional[int],
+    ) -> int:
+        """Combine the sub-scores into the overall difficulty"""
         # inverse of accessibility (lower accessibility = higher diff)
         # accessibility_inverted = 11 - accessibility
 
@@ -142,92 +221,94 @@ class TrailAnalyzer:
 
         return max(1, min(10, round(overall)))
 
-    def store_analysis_results(self, trail: "Trail") -> bool:
-        """Store trail analysis in the database"""
-        if not self.db:
-            print("Database connection not provided.")
-            return False
-
-        try:
-            cursor = self.db.cursor()
-
-            # get the trail locatioln
-            location_lat, location_long = trail.get_location_coordinates()
+    def build_record(self, trail: "Trail") -> "TrailRecord":
+        """
+        Collect the database rows for a trail without touching the database.
+        The record is plain data, so it can be built in a worker process.
+        """
+        # get the trail locatioln
+        location_lat, location_long = trail.get_location_coordinates()
 
-            # extract filename only for storage for portability
-            from utils import get_trail_file_name
+        # extract filename only for storage for portability
+        from utils import get_trail_file_name
 
-            file_name = get_trail_file_name(trail.file)
+        file_name = get_trail_file_name(trail.file)
 
-            # first, store the trail data
-            cursor.execute(
-                """
-                INSERT INTO trails (
-                    name, location_lat, location_long, length, elevation_gain, 
-                    elevation_loss, max_elevation, min_elevation,
-                    geojson_path, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """,
+        segment_rows = []
+        for segment in trail.segments:
+            segment_data = segment.to_dict()
+            segment_rows.append(
                 (
-                    trail.name,
-                    location_lat,
-                    location_long,
-                    trail.length,
-                    trail.elevation_gain,
-                    trail.elevation_loss,
-                    trail.max_elevation,
-                    trail.min_elevation,
-                    file_name,
-                ),
+                    segment_data["segment_id"],
+                    segment_data["start_lat"],
+                    segment_data["start_long"],
+                    segment_data["end_lat"],
+                    segment_data["end_long"],
+                    segment_data["length"],
+                    segment_data["elevation_gain"],
+                    segment_data["elevation_loss"],
+                    segment_data["avg_slope"],
+                    segment_data["max_slope"],
+                    segment_data["terrain_type"],
+                )
             )
 
-            trail_id = cursor.lastrowid
-
-            # store segments
-            for segment in trail.segments:
-                segment_data = segment.to_dict()
-                cursor.execute(
-                    """
-                    INSERT INTO trail_segments (
-                        trail_id, segment_order, start_lat, start_long,
-                        end_lat, end_long, length, elevation_gain,
-                        elevation_loss, avg_slope, max_slope, terrain_type
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        trail_id,
-                        segment_data["segment_id"],
-                        segment_data["start_lat"],
-                        segment_data["start_long"],
-                        segment_data["end_lat"],
-                        segment_data["end_long"],
-                        segment_data["length"],
-                        segment_data["elevation_gain"],
-                        segment_data["elevation_loss"],
-                        segment_data["avg_slope"],
-                        segment_data["max_slope"],
-                        segment_data["terrain_type"],
-                    ),
-                )
+        report = self.get_difficulty_report(trail)
+
+        bounds = trail.geometry.bounds()
+        bounds_row = () if any(math.isnan(value) for value in bounds) else bounds
+
+        return TrailRecord(
+            trail_row=(
+                trail.name,
+                location_lat,
+                location_long,
+                trail.length,
+                trail.elevation_gain,
+                trail.elevation_loss,
+                trail.max_elevation,
+                trail.min_elevation,
+                file_name,
+            ),
+            segment_rows=segment_rows,
+            rating_row=(
+                report.cardio_intensity,
+                report.technical_difficulty,
+                report.accessibility,
+                report.weather_vulnerability,
+                report.overall_difficulty,
+            ),
+            bounds_row=bounds_row,
+        )
 
-            # store difficulty ratings
-            cursor.execute(
-                """
-                INSERT INTO difficulty_ratings (
-                    trail_id, cardio_intensity, technical_difficulty,
-                    accessibility, weather_vulnerability, overall_difficulty
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    trail_id,
-                    self.calculate_cardio_intensity(trail),
-                    self.calculate_technical_difficulty(trail),
-                    self.calculate_accessibility(trail),
-                    self.calculate_weather_vulnerability(trail),
-                    self.calculate_overall_difficulty(trail),
-                ),
-            )
+    def store_many(
+        self, trails: Iterable["Trail"], batch_size: int = 100, tune: bool = False
+    ) -> int:
+        """
+        Store many trails, grouping batch_size trails per transaction.
+        A trail that fails to store is skipped. Returns the number of trails
+        stored.
+        """
+        if not self.db:
+            print("Database connection not provided.")
+            return 0
+
+        with BulkTrailWriter(self.db, batch_size=batch_size, tune=tune) as writer:
+            for trail in trails:
+                try:
+                    writer.add(self.build_record(trail))
+                except sqlite3.Error as e:
+                    print(f"Error storing trail analysis: {e}")
+            return writer.trails_written
+
+    def store_analysis_results(self, trail: "Trail") -> bool:
+        """Store trail analysis in the database"""
+        if not self.db:
+            print("Database connection not provided.")
+            return False
 
+        try:
+            insert_trail_record(self.db.cursor(), self.build_record(trail))
             self.db.commit()
             return True
 
@@ -238,6 +319,292 @@ class TrailAnalyzer:
             return False
 
 
+@dataclass
+class TrailRecord:
+    """Rows for one analyzed trail, ready to be written to the database"""
+
+    # trails columns, without trail_id and created_at
+    trail_row: Tuple
+    # trail_segments columns, without segment_id and trail_id
+    segment_rows: List[Tuple] = field(default_factory=list)
+    # difficulty_ratings columns, without rating_id and trail_id
+    rating_row: Tuple = ()
+    # trail_geometry columns, without trail_id (empty if not precomputed)
+    geometry_row: Tuple = ()
+    # trail_geometry_lod columns, without trail_id (empty if not precomputed)
+    lod_row: Tuple = ()
+    # (min longitude, min latitude, max longitude, max latitude) for trail_rtree
+    bounds_row: Tuple = ()
+    # trail_profile columns, without trail_id (empty if not precomputed)
+    profile_rows: List[Tuple] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.trail_row[0]
+
+    @property
+    def length(self) -> float:
+        return self.trail_row[3]
+
+
+def insert_trail_record(cursor: sqlite3.Cursor, record: TrailRecord) -> int:
+    """Insert a trail, its segments and ratings; returns the new trail_id"""
+    # first, store the trail data
+    cursor.execute(
+        """
+        INSERT INTO trails (
+            name, location_lat, location_long, length, elevation_gain, 
+            elevation_loss, max_elevation, min_elevation,
+            geojson_path, created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """,
+        record.trail_row,
+    )
+
+    trail_id = cursor.lastrowid
+
+    _insert_trail_children(cursor, trail_id, record)
+    return trail_id
+
+
+def _known(value: Optional[float]) -> bool:
+    """Whether a stored coordinate is a number, not None or NaN"""
+    return value is not None and not math.isnan(value)
+
+
+def _insert_trail_children(
+    cursor: sqlite3.Cursor, trail_id: int, record: TrailRecord
+) -> None:
+    """Insert the segment and difficulty rows of a record under trail_id"""
+    # store segments, all in one statement
+    cursor.executemany(
+        """
+        INSERT INTO trail_segments (
+            trail_id, segment_order, start_lat, start_long,
+            end_lat, end_long, length, elevation_gain,
+            elevation_loss, avg_slope, max_slope, terrain_type
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+        [(trail_id, *segment_row) for segment_row in record.segment_rows],
+    )
+
+    # store difficulty ratings
+    cursor.execute(
+        """
+        INSERT INTO difficulty_ratings (
+            trail_id, cardio_intensity, technical_difficulty,
+            accessibility, weather_vulnerability, overall_difficulty
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    """,
+        (trail_id, *record.rating_row),
+    )
+
+    # store packed path coordinates
+    if record.geometry_row:
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO trail_geometry (
+                trail_id, dims, point_count, coordinates,
+                source_size, source_mtime_ns
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            (trail_id, *record.geometry_row),
+        )
+
+    # store simplification levels for that path
+    if record.lod_row:
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO trail_geometry_lod (trail_id, importance)
+            VALUES (?, ?)
+        """,
+            (trail_id, *record.lod_row),
+        )
+
+    # store the downsampled elevation profiles of that path
+    if record.profile_rows:
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO trail_profile (trail_id, points, series)
+            VALUES (?, ?, ?)
+        """,
+            [(trail_id, *profile_row) for profile_row in record.profile_rows],
+        )
+
+    # index the path's bounding box, or just the trail location without one;
+    # a trail with no vertices at all has a NaN location and is not indexed
+    bounds_row = record.bounds_row
+    latitude, longitude = record.trail_row[1], record.trail_row[2]
+    if not bounds_row and _known(latitude) and _known(longitude):
+        bounds_row = (longitude, latitude, longitude, latitude)
+    if bounds_row:
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO trail_rtree (
+                trail_id, min_lon, min_lat, max_lon, max_lat
+            ) VALUES (?, ?, ?, ?, ?)
+        """,
+            (trail_id, *bounds_row),
+        )
+
+
+def replace_trail_record(
+    cursor: sqlite3.Cursor, trail_id: int, record: TrailRecord
+) -> int:
+    """
+    Overwrite a stored trail with a fresh analysis, keeping its trail_id so
+    notes and terrain data attached to it survive re-analysis.
+    """
+    cursor.execute(
+        """
+        UPDATE trails SET
+            name = ?, location_lat = ?, location_long = ?, length = ?,
+            elevation_gain = ?, elevation_loss = ?, max_elevation = ?,
+            min_elevation = ?, geojson_path = ?
+        WHERE trail_id = ?
+    """,
+        (*record.trail_row, trail_id),
+    )
+    if cursor.rowcount == 0:
+        # the row was removed by hand, store it as a new trail
+        return insert_trail_record(cursor, record)
+
+    # drop every row derived from the old analysis, so none of it outlives a
+    # record that no longer has it (e.g. a file edited down to no geometry)
+    for table in (
+        "trail_segments",
+        "difficulty_ratings",
+        "trail_geometry",
+        "trail_geometry_lod",
+        "trail_profile",
+        "trail_rtree",
+    ):
+        cursor.execute(f"DELETE FROM {table} WHERE trail_id = ?", (trail_id,))
+    _insert_trail_children(cursor, trail_id, record)
+
+    return trail_id
+
+
+class BulkTrailWriter:
+    """
+    Writes many trail records with few transactions.
+
+    Records are committed every batch_size trails and once more on exit
+    (everything since the last commit is rolled back if the block raises).
+    A batch is committed just before the next trail is written, so extra
+    statements run on writer.cursor right after add/replace (such as
+    bookkeeping rows) land in the same transaction as their trail.
+    Each trail is written under a savepoint: if one fails, its rows are
+    undone and the error raised, but the rest of the batch still commits.
+    With tune=True the connection switches to WAL with synchronous=NORMAL
+    and a larger page cache for the duration of the load, and back to its
+    previous settings afterwards.
+    """
+
+    # pragma name -> value used while loading
+    BULK_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,  # negative means KiB, so 64 MiB
+        "temp_store": "MEMORY",
+    }
+
+    def __init__(
+        self, conn: sqlite3.Connection, batch_size: int = 100, tune: bool = False
+    ) -> None:
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.batch_size = max(1, batch_size)
+        self.tune = tune
+        self.trails_written = 0
+        self.segments_written = 0
+        self._pending = 0
+        self._saved_pragmas: Dict[str, object] = {}
+
+    def __enter__(self) -> "BulkTrailWriter":
+        if self.tune:
+            # pragmas cannot change inside a transaction
+            self.conn.commit()
+            for name, value in self.BULK_PRAGMAS.items():
+                self._saved_pragmas[name] = self.conn.execute(
+                    f"PRAGMA {name}"
+                ).fetchone()[0]
+                self.conn.execute(f"PRAGMA {name} = {value}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            self.conn.rollback()
+
+        for name, value in self._saved_pragmas.items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+        self._saved_pragmas.clear()
+
+    def add(self, record: TrailRecord) -> int:
+        """Insert a new trail; returns its trail_id"""
+        self._maybe_flush()
+        with self._savepoint():
+            trail_id = insert_trail_record(self.cursor, record)
+        self._written(record)
+        return trail_id
+
+    def replace(self, trail_id: int, record: TrailRecord) -> int:
+        """Overwrite an existing trail; returns its trail_id"""
+        self._maybe_flush()
+        with self._savepoint():
+            trail_id = replace_trail_record(self.cursor, trail_id, record)
+        self._written(record)
+        return trail_id
+
+    def flush(self) -> None:
+        """Commit everything written so far"""
+        self.conn.commit()
+        self._pending = 0
+
+    @contextmanager
+    def _savepoint(self) -> Iterator[None]:
+        """Undo only the statements of this block if it raises"""
+        # a savepoint outside a transaction would commit on release
+        if not self.conn.in_transaction:
+            self.cursor.execute("BEGIN")
+        self.cursor.execute("SAVEPOINT trail_record")
+        try:
+            yield
+        except Exception:
+            self.cursor.execute("ROLLBACK TO trail_record")
+            self.cursor.execute("RELEASE trail_record")
+            raise
+        self.cursor.execute("RELEASE trail_record")
+
+    def _maybe_flush(self) -> None:
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def _written(self, record: TrailRecord) -> None:
+        self.trails_written += 1
+        self.segments_written += len(record.segment_rows)
+        self._pending += 1
+
+
+def delete_trail(cursor: sqlite3.Cursor, trail_id: int) -> None:
+    """Remove a trail and every row that references it"""
+    # foreign key cascades are off by default in SQLite, so delete explicitly
+    for table in (
+        "trail_segments",
+        "difficulty_ratings",
+        "trail_geometry",
+        "trail_geometry_lod",
+        "trail_profile",
+        "trail_rtree",
+        "terrain_data",
+        "trail_notes",
+        "trails",
+    ):
+        cursor.execute(f"DELETE FROM {table} WHERE trail_id = ?", (trail_id,))
+
+
 def connect_to_database(db_path) -> None:
     """Connect to the SQLite database"""
     try:
@@ -0,0 +1,184 @@
+# built in libraries
+import math
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+# third-party libraries
+import numpy as np
+
+from utils.cache import LRUCache
+
+# SRTM height tiles: one degree square, big-endian int16 meters, named after
+# their south-west corner, e.g. N44W124.hgt covers 44..45N, 124..123W
+HGT_DTYPE = np.dtype(">i2")
+HGT_VOID = -32768
+HGT_NAME = re.compile(r"^([NS])(\d{2})([EW])(\d{3})\.hgt$", re.IGNORECASE)
+
+# open tiles kept memory-mapped; the OS pages in only what is sampled
+DEFAULT_MAX_TILES = 16
+
+# memoized samples, keyed by coordinates rounded to about 10 cm
+DEFAULT_MEMO_SIZE = 100_000
+MEMO_DECIMALS = 6
+
+
+def tile_name(lat_index: int, lon_index: int) -> str:
+    """SRTM file name of the tile whose south-west corner is given"""
+    ns = "N" if lat_index >= 0 else "S"
+    ew = "E" if lon_index >= 0 else "W"
+    return f"{ns}{abs(lat_index):02d}{ew}{abs(lon_index):03d}.hgt"
+
+
+def open_hgt(path: str) -> np.ndarray:
+    """Memory-map an .hgt file as a square (n, n) array, north row first"""
+    size = os.path.getsize(path) // HGT_DTYPE.itemsize
+    side = math.isqrt(size)
+    if side * side != size:
+        raise ValueError(f"{path} is not a square SRTM tile")
+    return np.memmap(path, dtype=HGT_DTYPE, mode="r", shape=(side, side))
+
+
+def bilinear(grid: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    Interpolate grid at fractional (row, col) positions. Void cells are
+    left out and the remaining weights renormalized; NaN if all four are void.
+    """
+    side = grid.shape[0]
+    r0 = np.clip(np.floor(rows).astype(np.intp), 0, side - 2)
+    c0 = np.clip(np.floor(cols).astype(np.intp), 0, side - 2)
+    fr = np.clip(rows - r0, 0.0, 1.0)
+    fc = np.clip(cols - c0, 0.0, 1.0)
+
+    total = np.zeros(len(rows))
+    weight = np.zeros(len(rows))
+    for dr, dc, w in (
+        (0, 0, (1 - fr) * (1 - fc)),
+        (0, 1, (1 - fr) * fc),
+        (1, 0, fr * (1 - fc)),
+        (1, 1, fr * fc),
+    ):
+        values = np.asarray(grid[r0 + dr, c0 + dc], dtype=np.float64)
+        valid = values != HGT_VOID
+        total += np.where(valid, values * w, 0.0)
+        weight += np.where(valid, w, 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight > 0, total / weight, np.nan)
+
+
+class ElevationModel:
+    """
+    Elevations sampled from a directory of SRTM .hgt tiles.
+
+    Tiles are memory-mapped on first use and kept in an LRU of max_tiles;
+    samples are bilinearly interpolated and memoized per coordinate, so
+    the repeated lookups of an edited route are dictionary hits. Points
+    outside every available tile come back as NaN.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_tiles: int = DEFAULT_MAX_TILES,
+        memo_size: int = DEFAULT_MEMO_SIZE,
+    ) -> None:
+        self.directory = directory
+        # each tile counts as size 1, so max_bytes is a tile count
+        self._tiles = LRUCache(max_tiles)
+        self._memo = LRUCache(memo_size)
+        self._lock = threading.Lock()
+        self._available: Optional[Dict[Tuple[int, int], str]] = None
+
+    def available_tiles(self) -> Dict[Tuple[int, int], str]:
+        """(lat index, lon index) -> file path of every tile in the directory"""
+        if self._available is None:
+            tiles = {}
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                names = []
+            for name in names:
+                match = HGT_NAME.match(name)
+                if match:
+                    ns, lat, ew, lon = match.groups()
+                    lat_index = int(lat) if ns.upper() == "N" else -int(lat)
+                    lon_index = int(lon) if ew.upper() == "E" else -int(lon)
+                    tiles[(lat_index, lon_index)] = os.path.join(self.directory, name)
+            self._available = tiles
+        return self._available
+
+    def _tile(self, key: Tuple[int, int]) -> Optional[np.ndarray]:
+        path = self.available_tiles().get(key)
+        if path is None:
+            return None
+        grid = self._tiles.get(key)
+        if grid is None:
+            with self._lock:
+                grid = self._tiles.get(key)
+                if grid is None:
+                    grid = open_hgt(path)
+                    self._tiles.put(key, grid, 1)
+        return grid
+
+    def sample(self, latitudes, longitudes) -> np.ndarray:
+        """Elevations in meters at each (latitude, longitude), NaN if unknown"""
+        lats = np.asarray(latitudes, dtype=np.float64).ravel()
+        lons = np.asarray(longitudes, dtype=np.float64).ravel()
+        result = np.full(len(lats), np.nan)
+
+        keys = list(zip(np.round(lats, MEMO_DECIMALS), np.round(lons, MEMO_DECIMALS)))
+        todo = []
+        for i, key in enumerate(keys):
+            value = self._memo.get(key)
+            if value is None:
+                todo.append(i)
+            else:
+                result[i] = value
+        if not todo or not self.available_tiles():
+            return result
+
+        todo = np.array(todo)
+        lat_index = np.floor(lats[todo]).astype(np.int64)
+        lon_index = np.floor(lons[todo]).astype(np.int64)
+        for tile_key in set(zip(lat_index.tolist(), lon_index.tolist())):
+            grid = self._tile(tile_key)
+            if grid is None:
+                continue
+            in_tile = todo[(lat_index == tile_key[0]) & (lon_index == tile_key[1])]
+            side = grid.shape[0] - 1
+            rows = (tile_key[0] + 1 - lats[in_tile]) * side
+            cols = (lons[in_tile] - tile_key[1]) * side
+            result[in_tile] = bilinear(grid, rows, cols)
+
+        for i in todo:
+            self._memo.put(keys[i], float(result[i]), 1)
+        return result
+
+    def fill_missing(self, coordinates: np.ndarray) -> np.ndarray:
+        """
+        Fill NaN elevations of an (n, 3) [longitude, latitude, elevation]
+        array in place from the model; returns the array.
+        """
+        missing = np.isnan(coordinates[:, 2])
+        if missing.any():
+            coordinates[missing, 2] = self.sample(
+                coordinates[missing, 1], coordinates[missing, 0]
+            )
+        return coordinates
+
+
+_default_model: Optional[ElevationModel] = None
+
+
+def default_elevation_model() -> ElevationModel:
+    """Model over $TRAILGRADE_DEM_DIR, or storage/dem, shared per process"""
+    global _default_model
+    if _default_model is None:
+        from utils import get_dem_dir
+
+        _default_model = ElevationModel(
+            os.environ.get("TRAILGRADE_DEM_DIR", get_dem_dir())
+        )
+    return _default_model
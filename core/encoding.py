@@ -0,0 +1,176 @@
+# built in libraries
+import json
+from typing import Any, Dict, List, Tuple
+
+# third-party libraries
+import numpy as np
+
+# packed coordinates are little-endian float64, one row per vertex
+BLOB_DTYPE = np.dtype("<f8")
+
+# per-vertex simplification tolerances only need single precision
+IMPORTANCE_DTYPE = np.dtype("<f4")
+
+
+def line_coordinates(data: Dict[str, Any]) -> np.ndarray:
+    """
+    Every LineString and MultiLineString vertex of a GeoJSON document, in
+    file order, as an (n, dims) array. Vertices with fewer values than the
+    widest one are padded with NaN.
+    """
+    vertices = []
+    for feature in data.get("features", []):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "MultiLineString":
+            for line in geometry.get("coordinates", []):
+                vertices.extend(line)
+        elif geometry.get("type") == "LineString":
+            vertices.extend(geometry.get("coordinates", []))
+
+    if not vertices:
+        return np.empty((0, 2), dtype=BLOB_DTYPE)
+
+    try:
+        coords = np.asarray(vertices, dtype=BLOB_DTYPE)
+        if coords.ndim == 2:
+            return coords
+    except (TypeError, ValueError):
+        # ragged, some vertices are missing elevation
+        pass
+
+    dims = max(len(vertex) for vertex in vertices)
+    coords = np.full((len(vertices), dims), np.nan, dtype=BLOB_DTYPE)
+    for i, vertex in enumerate(vertices):
+        coords[i, : len(vertex)] = vertex
+    return coords
+
+
+def load_line_coordinates(filepath: str) -> np.ndarray:
+    """Parse a .geojson file and return its line_coordinates"""
+    with open(filepath, "r") as f:
+        return line_coordinates(json.load(f))
+
+
+def pack_coordinates(coords: np.ndarray) -> Tuple[int, int, bytes]:
+    """Pack an (n, dims) array into (dims, point count, blob) for storage"""
+    coords = np.ascontiguousarray(coords, dtype=BLOB_DTYPE)
+    return coords.shape[1], coords.shape[0], coords.tobytes()
+
+
+def unpack_coordinates(dims: int, blob: bytes) -> np.ndarray:
+    """Inverse of pack_coordinates; the array is a read-only view of blob"""
+    return np.frombuffer(blob, dtype=BLOB_DTYPE).reshape(-1, dims)
+
+
+def pack_importance(importance: np.ndarray) -> bytes:
+    """Pack core.simplify importance values for storage"""
+    return np.ascontiguousarray(importance, dtype=IMPORTANCE_DTYPE).tobytes()
+
+
+def unpack_importance(blob: bytes) -> np.ndarray:
+    """Inverse of pack_importance"""
+    return np.frombuffer(blob, dtype=IMPORTANCE_DTYPE)
+
+
+def coordinates_to_list(coords: np.ndarray) -> List[List[float]]:
+    """Nested lists for JSON, with any NaN padding dropped again"""
+    if not np.isnan(coords).any():
+        return coords.tolist()
+    return [[value for value in row if value == value] for row in coords.tolist()]
+
+
+# decimal places kept by the compact path formats: ~1 m for encoded
+# polylines (the usual Google precision), ~0.1 m for delta arrays
+POLYLINE_PRECISION = 5
+DELTA_PRECISION = 6
+ELEVATION_PRECISION = 1
+
+PATH_FORMATS = ("json", "polyline", "delta")
+
+
+def _quantized_deltas(values: np.ndarray, precision: int) -> np.ndarray:
+    """Round to `precision` decimals as integers, then difference along axis 0"""
+    quantized = np.round(np.asarray(values, dtype=np.float64) * 10**precision)
+    quantized = quantized.astype(np.int64)
+    return np.diff(quantized, axis=0, prepend=np.zeros_like(quantized[:1]))
+
+
+def encode_polyline(values: np.ndarray, precision: int = POLYLINE_PRECISION) -> str:
+    """
+    Google encoded polyline of an (n, k) array (or (n,) for one column).
+    Rows are delta-encoded and their columns interleaved, so (latitude,
+    longitude) columns give the standard format.
+    """
+    chars = []
+    for value in _quantized_deltas(values, precision).ravel().tolist():
+        # zigzag, so small negative numbers stay short
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+
+def decode_polyline(
+    text: str, dims: int = 2, precision: int = POLYLINE_PRECISION
+) -> np.ndarray:
+    """Inverse of encode_polyline, returns an (n, dims) array"""
+    values = []
+    value, shift = 0, 0
+    for char in text:
+        byte = ord(char) - 63
+        value |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+
+    deltas = np.asarray(values, dtype=np.int64).reshape(-1, dims)
+    return np.cumsum(deltas, axis=0) / 10**precision
+
+
+def delta_encode(values: np.ndarray, precision: int) -> List[int]:
+    """First value then differences, as integers of 10**-precision units"""
+    return _quantized_deltas(values, precision).tolist()
+
+
+def delta_decode(deltas: List[int], precision: int) -> np.ndarray:
+    """Inverse of delta_encode"""
+    return np.cumsum(np.asarray(deltas, dtype=np.int64)) / 10**precision
+
+
+def encode_path(coordinates: np.ndarray, path_format: str) -> Dict[str, Any]:
+    """
+    Compact form of an (n, dims) [longitude, latitude, elevation] array for
+    an API response. Elevation is left out if any vertex is missing it.
+    """
+    longitude, latitude = coordinates[:, 0], coordinates[:, 1]
+    elevation = None
+    if coordinates.shape[1] > 2 and not np.isnan(coordinates[:, 2]).any():
+        elevation = coordinates[:, 2]
+
+    if path_format == "polyline":
+        path = {
+            "format": "polyline",
+            "precision": POLYLINE_PRECISION,
+            "points": encode_polyline(np.column_stack((latitude, longitude))),
+        }
+        if elevation is not None:
+            path["elevation_precision"] = ELEVATION_PRECISION
+            path["elevation"] = encode_polyline(elevation, ELEVATION_PRECISION)
+        return path
+
+    if path_format == "delta":
+        path = {
+            "format": "delta",
+            "precision": DELTA_PRECISION,
+            "longitude": delta_encode(longitude, DELTA_PRECISION),
+            "latitude": delta_encode(latitude, DELTA_PRECISION),
+        }
+        if elevation is not None:
+            path["elevation_precision"] = ELEVATION_PRECISION
+            path["elevation"] = delta_encode(elevation, ELEVATION_PRECISION)
+        return path
+
+    raise ValueError(f"Unknown path format: {path_format}")
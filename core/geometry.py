@@ -0,0 +1,361 @@
+import hashlib
+import math
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .point import Point
+
+
+class TrailGeometry:
+    """
+    Columnar store for trail vertices.
+
+    Keeps latitude, longitude, elevation and cumulative distance (meters) in
+    contiguous float64 arrays instead of one Point object per vertex.
+    Point objects are only built when asked for.
+
+    line_starts and line_features optionally record where each GeoJSON line
+    begins and which feature it belongs to, and waypoints holds standalone
+    Point features as (latitude, longitude) rows, so per-feature shapes (such
+    as the centroid) can be derived without re-reading the file.
+    """
+
+    __slots__ = (
+        "latitude",
+        "longitude",
+        "elevation",
+        "distance",
+        "line_starts",
+        "line_features",
+        "waypoints",
+        "_content_hash",
+    )
+
+    def __init__(
+        self,
+        latitude: Union[np.ndarray, Iterable[float]],
+        longitude: Union[np.ndarray, Iterable[float]],
+        elevation: Union[np.ndarray, Iterable[float]],
+        distance: Optional[Union[np.ndarray, Iterable[float]]] = None,
+        line_starts: Optional[Iterable[int]] = None,
+        line_features: Optional[Iterable[int]] = None,
+        waypoints: Optional[Iterable[Tuple[float, float]]] = None,
+    ) -> None:
+        self.latitude = np.ascontiguousarray(latitude, dtype=np.float64)
+        self.longitude = np.ascontiguousarray(longitude, dtype=np.float64)
+        self.elevation = np.ascontiguousarray(elevation, dtype=np.float64)
+
+        if distance is None:
+            distance = np.zeros(len(self.latitude))
+        self.distance = np.ascontiguousarray(distance, dtype=np.float64)
+
+        if not (
+            len(self.latitude)
+            == len(self.longitude)
+            == len(self.elevation)
+            == len(self.distance)
+        ):
+            raise ValueError("TrailGeometry columns must all have the same length")
+
+        # without line information the whole geometry is one line of one feature
+        if line_starts is None:
+            line_starts = [0] if len(self.latitude) else []
+        self.line_starts = np.asarray(line_starts, dtype=np.intp)
+        if line_features is None:
+            line_features = np.zeros(len(self.line_starts))
+        self.line_features = np.asarray(line_features, dtype=np.intp)
+
+        if waypoints is None:
+            waypoints = []
+        self.waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+        self._content_hash: Optional[str] = None
+
+    @classmethod
+    def empty(cls) -> "TrailGeometry":
+        """Geometry with no vertices"""
+        return cls([], [], [], [])
+
+    @classmethod
+    def from_points(cls, points: List[Point]) -> "TrailGeometry":
+        """Build a geometry from a list of Point objects"""
+        return cls(
+            [p.latitude for p in points],
+            [p.longitude for p in points],
+            [p.elevation for p in points],
+            [p.distance_from_start for p in points],
+        )
+
+    @classmethod
+    def from_coordinates(cls, coordinates: np.ndarray) -> "TrailGeometry":
+        """
+        Build a geometry from an (n, dims) [longitude, latitude, elevation]
+        array, as one continuous path. Vertices without an elevation are
+        left out, as Trail does when reading a file.
+        """
+        if coordinates.ndim != 2 or coordinates.shape[1] < 3:
+            return cls.empty()
+        coordinates = coordinates[~np.isnan(coordinates[:, 2])]
+        longitude, latitude = coordinates[:, 0], coordinates[:, 1]
+        return cls(
+            latitude,
+            longitude,
+            coordinates[:, 2],
+            cumulative_distance(latitude, longitude),
+        )
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Point, "TrailGeometry"]:
+        # slices share memory with the parent arrays (numpy views)
+        if isinstance(index, slice):
+            return TrailGeometry(
+                self.latitude[index],
+                self.longitude[index],
+                self.elevation[index],
+                self.distance[index],
+            )
+        return self.point(index)
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(min longitude, min latitude, max longitude, max latitude)"""
+        latitude = np.concatenate((self.latitude, self.waypoints[:, 0]))
+        longitude = np.concatenate((self.longitude, self.waypoints[:, 1]))
+        if len(latitude) == 0:
+            return (math.nan, math.nan, math.nan, math.nan)
+        return (
+            float(longitude.min()),
+            float(latitude.min()),
+            float(longitude.max()),
+            float(latitude.max()),
+        )
+
+    def centroid(self) -> Tuple[float, float]:
+        """
+        (latitude, longitude) of the trail's center.
+
+        Matches the GeoDataFrame approach used before: each feature's line
+        centroid is taken in Web Mercator, converted back to degrees, and the
+        feature centroids are averaged.
+        """
+        x, y = to_web_mercator(self.latitude, self.longitude)
+        ends = np.append(self.line_starts[1:], len(self))
+
+        # per feature: [total length, weighted x, weighted y, vertex ranges]
+        features: Dict[int, list] = {}
+        for start, end, feature in zip(self.line_starts, ends, self.line_features):
+            line_x, line_y = x[start:end], y[start:end]
+            dx, dy = np.diff(line_x), np.diff(line_y)
+            seg_length = np.hypot(dx, dy)
+
+            acc = features.setdefault(int(feature), [0.0, 0.0, 0.0, []])
+            acc[0] += seg_length.sum()
+            acc[1] += ((line_x[:-1] + dx / 2) * seg_length).sum()
+            acc[2] += ((line_y[:-1] + dy / 2) * seg_length).sum()
+            acc[3].append((start, end))
+
+        # waypoints are their own centroid
+        lats = self.waypoints[:, 0].tolist()
+        lons = self.waypoints[:, 1].tolist()
+        for total, weighted_x, weighted_y, ranges in features.values():
+            if total > 0:
+                cx, cy = weighted_x / total, weighted_y / total
+            else:
+                # zero-length lines fall back to the mean of their vertices
+                cx = np.concatenate([x[s:e] for s, e in ranges]).mean()
+                cy = np.concatenate([y[s:e] for s, e in ranges]).mean()
+
+            lat, lon = from_web_mercator(cx, cy)
+            lats.append(lat)
+            lons.append(lon)
+
+        if not lats:
+            return (math.nan, math.nan)
+        return (float(np.mean(lats)), float(np.mean(lons)))
+
+    def resample(self, spacing: float) -> "TrailGeometry":
+        """
+        Geometry with vertices every spacing meters along each line.
+
+        Every line keeps its first and last vertex; positions in between are
+        linearly interpolated by distance, so the trail length is unchanged
+        and the vertex count depends on the length, not the recording.
+        """
+        if spacing <= 0:
+            raise ValueError("spacing must be positive")
+        if len(self) == 0:
+            return self
+
+        starts = self.line_starts
+        ends = np.append(starts[1:], len(self))
+        first = self.distance[starts]
+        span = self.distance[ends - 1] - first
+        counts = np.ceil(span / spacing).astype(np.intp) + 1
+
+        # target distances of every line in one array, the last clipped to
+        # the line's end
+        new_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        steps = np.arange(counts.sum()) - np.repeat(new_starts, counts)
+        targets = np.repeat(first, counts) + steps * spacing
+        targets = np.minimum(targets, np.repeat(first + span, counts))
+
+        # the vertex before each target, kept inside its own line
+        line_start = np.repeat(starts, counts)
+        line_last = np.repeat(ends - 1, counts)
+        lower = np.searchsorted(self.distance, targets, side="right") - 1
+        lower = np.clip(lower, line_start, np.maximum(line_last - 1, line_start))
+        upper = np.minimum(lower + 1, line_last)
+
+        gap = self.distance[upper] - self.distance[lower]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.where(gap > 0, (targets - self.distance[lower]) / gap, 0.0)
+        fraction = np.clip(fraction, 0.0, 1.0)
+
+        def interpolate(column: np.ndarray) -> np.ndarray:
+            return column[lower] + (column[upper] - column[lower]) * fraction
+
+        return TrailGeometry(
+            interpolate(self.latitude),
+            interpolate(self.longitude),
+            interpolate(self.elevation),
+            targets,
+            new_starts,
+            self.line_features,
+            self.waypoints,
+        )
+
+    def content_hash(self) -> str:
+        """
+        SHA-1 of the coordinate columns (distance is derived from them),
+        computed on first use; the columns are not modified after that.
+        """
+        if self._content_hash is None:
+            digest = hashlib.sha1()
+            for column in (self.latitude, self.longitude, self.elevation):
+                digest.update(column.tobytes())
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def point(self, index: int) -> Point:
+        """Materialise a single vertex as a Point"""
+        return Point(
+            latitude=float(self.latitude[index]),
+            longitude=float(self.longitude[index]),
+            elevation=float(self.elevation[index]),
+            distance_from_start=float(self.distance[index]),
+        )
+
+    def to_points(self) -> List[Point]:
+        """Materialise every vertex as a Point (for backwards compatibility)"""
+        return [
+            Point(latitude=lat, longitude=lon, elevation=ele, distance_from_start=dist)
+            for lat, lon, ele, dist in zip(
+                self.latitude.tolist(),
+                self.longitude.tolist(),
+                self.elevation.tolist(),
+                self.distance.tolist(),
+            )
+        ]
+
+
+# earth radius in meters
+EARTH_RADIUS = 6371000
+
+# sphere radius used by Web Mercator (EPSG:3857)
+WEB_MERCATOR_RADIUS = 6378137.0
+
+
+def to_web_mercator(latitude, longitude):
+    """Project degrees to Web Mercator (EPSG:3857) x, y in meters"""
+    x = WEB_MERCATOR_RADIUS * np.radians(longitude)
+    y = WEB_MERCATOR_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(latitude) / 2))
+    return x, y
+
+
+def from_web_mercator(x, y):
+    """Inverse of to_web_mercator, returns (latitude, longitude) in degrees"""
+    longitude = np.degrees(x / WEB_MERCATOR_RADIUS)
+    latitude = np.degrees(2 * np.arctan(np.exp(y / WEB_MERCATOR_RADIUS)) - np.pi / 2)
+    return latitude, longitude
+
+
+def haversine_distances(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """Vectorized great-circle distance in meters between paired coordinates"""
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = np.radians(lon2) - np.radians(lon1)
+
+    a = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    )
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+
+def _haversine_distance_python(
+    lat1: float, lon1: float, lat2: float, lon2: float
+) -> float:
+    """Scalar haversine, kept as a reference for the vectorized kernel"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2) - math.radians(lon1)
+
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+
+def step_distances(
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    part_starts: Optional[Iterable[int]] = None,
+    vectorized: bool = True,
+) -> np.ndarray:
+    """
+    Distance in meters from each vertex to the one before it.
+
+    The first vertex, and the first vertex of every part listed in
+    part_starts, get a step of 0 so separate lines are not joined up.
+    Pass vectorized=False to use the pure-Python kernel for validation.
+    """
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    steps = np.zeros(len(latitude))
+
+    if len(latitude) > 1:
+        if vectorized:
+            steps[1:] = haversine_distances(
+                latitude[:-1], longitude[:-1], latitude[1:], longitude[1:]
+            )
+        else:
+            lats = latitude.tolist()
+            lons = longitude.tolist()
+            steps[1:] = [
+                _haversine_distance_python(lats[i - 1], lons[i - 1], lats[i], lons[i])
+                for i in range(1, len(lats))
+            ]
+
+    if part_starts is not None:
+        steps[np.asarray(list(part_starts), dtype=np.intp)] = 0.0
+
+    return steps
+
+
+def cumulative_distance(
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    part_starts: Optional[Iterable[int]] = None,
+    vectorized: bool = True,
+) -> np.ndarray:
+    """Distance in meters from the first vertex along the path to every vertex"""
+    # np.cumsum adds sequentially, matching a running total in a loop
+    return np.cumsum(step_distances(latitude, longitude, part_starts, vectorized))
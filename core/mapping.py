@@ -0,0 +1,110 @@
+# built in libraries
+import os
+from typing import TYPE_CHECKING
+
+# third-party libraries
+import folium
+import numpy as np
+
+from .profile import lttb_indices
+
+if TYPE_CHECKING:
+    from core.trail import Trail
+
+
+def render_trail_map(
+    trail: "Trail", include_segments: bool = True, include_difficulty: bool = True
+) -> str:
+    """Uses the folium library to create an HTML map visualization"""
+    # get values needed for map
+    map_center = trail.find_center()
+    zoom = trail.calculate_zoom()
+
+    # create map
+    map = folium.Map(location=map_center, zoom_start=zoom)
+
+    # ensure we have the full path
+    if not os.path.isabs(trail.file):
+        from utils import get_trail_files
+
+        full_path = os.path.join(get_trail_files(), trail.file)
+    else:
+        full_path = trail.file
+
+    # add the basic trail
+    folium.GeoJson(
+        full_path,
+        name=trail.name,
+        style_function=lambda x: {"color": "blue", "weight": 3},
+    ).add_to(map)
+
+    # add points for elevation visualization (optional)
+    if include_difficulty:
+        # about one vertex in ten, picked to keep the elevation profile's
+        # peaks and dips
+        geometry = trail.geometry
+        markers = lttb_indices(
+            geometry.distance, geometry.elevation, -(-len(geometry) // 10)
+        )
+        for point in (geometry.point(i) for i in markers):
+            folium.CircleMarker(
+                location=[point.latitude, point.longitude],
+                radius=3,
+                color="green",
+                fill=True,
+                popup=f"Elevation: {point.elevation:.1f}m",
+            ).add_to(map)
+
+    # add segment visualization
+    if include_segments and trail.segments:
+        for segment in trail.segments:
+            # color based on slope
+            slope = segment.avg_slope
+            if slope > 15:
+                color = "red"
+            elif slope > 8:
+                color = "orange"
+            else:
+                color = "green"
+
+            # draw segment line
+            points = np.column_stack(
+                (segment.geometry.latitude, segment.geometry.longitude)
+            ).tolist()
+            folium.PolyLine(
+                points,
+                color=color,
+                weight=5,
+                opacity=0.7,
+                popup=f"Segment {segment.segment_id}:<br>"
+                f"Length: {segment.length:.2f} km<br>"
+                f"Elevation Gain: {segment.elevation_gain:.1f}m<br>"
+                f"Avg Slope: {segment.avg_slope:.1f}%",
+            ).add_to(map)
+
+    # add difficulty ratings legend
+    if include_difficulty:
+        report = trail.analyzer.get_difficulty_report(trail)
+        cardio = report.cardio_intensity
+        technical = report.technical_difficulty
+        accessibility = report.accessibility
+        weather = report.weather_vulnerability
+        overall = report.overall_difficulty
+
+        legend_html = f"""
+            <div style="position: fixed; bottom: 50px; right: 50px; width: 200px; 
+            height: 180px; border:2px solid grey; z-index:9999; background-color:white;
+            padding: 10px; font-size: 14px;">
+            <b>Difficulty Ratings</b><br>
+            Cardio Intensity: {cardio}/10<br>
+            Technical Difficulty: {technical}/10<br>
+            Accessibility: {accessibility}/10<br>
+            Weather Vulnerability: {weather}/10<br>
+            <b>Overall: {overall}/10</b>
+            </div>
+        """
+        map.get_root().html.add_child(folium.Element(legend_html))
+
+    # save the map
+    map.save(f"{trail.name}_analyzed.html")
+    return f"{trail.name}_analyzed.html"
@@ -0,0 +1,380 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from .geometry import TrailGeometry
+
+# steps shorter than this (meters) are ignored for the trail-level max slope
+MIN_SLOPE_DISTANCE = 5.0
+
+# above this the trail reports standard deviation instead of variance
+VARIANCE_THRESHOLD = 80
+
+
+@dataclass(frozen=True)
+class SegmentMetrics:
+    """Statistics for one segment, covering vertices start..end (inclusive)"""
+
+    start: int
+    end: int
+    length: float
+    elevation_gain: float
+    elevation_loss: float
+    avg_slope: float
+    max_slope: float
+
+
+@dataclass(frozen=True)
+class TrailMetrics:
+    """Every trail-level and segment-level statistic produced by compute_metrics"""
+
+    length: float
+    elevation_gain: float
+    elevation_loss: float
+    max_elevation: float
+    min_elevation: float
+    elevation_variance: float
+    avg_slope: float
+    max_slope: float
+    segment_length: float
+    segments: Tuple[SegmentMetrics, ...]
+
+
+@dataclass(frozen=True)
+class RangeMetrics:
+    """Statistics for the stretch of a trail from start to end (meters)"""
+
+    start: float
+    end: float
+    length: float
+    elevation_gain: float
+    elevation_loss: float
+    min_elevation: float
+    max_elevation: float
+    avg_slope: float
+    max_slope: float
+
+
+class SparseTable:
+    """
+    Minimum or maximum of any range of a fixed array in O(1), after an
+    O(n log n) build: level k holds the reduction of every run of 2**k
+    values, and a range is covered by two overlapping runs.
+    """
+
+    __slots__ = ("levels", "reduce")
+
+    def __init__(self, values: np.ndarray, reduce: np.ufunc = np.maximum) -> None:
+        self.reduce = reduce
+        self.levels = [np.ascontiguousarray(values, dtype=np.float64)]
+        width = 1
+        while 2 * width <= len(values):
+            previous = self.levels[-1]
+            self.levels.append(reduce(previous[:-width], previous[width:]))
+            width *= 2
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def query(self, start: int, end: int) -> float:
+        """Reduction of values start..end (inclusive)"""
+        k = (end - start + 1).bit_length() - 1
+        level = self.levels[k]
+        return float(self.reduce(level[start], level[end - (1 << k) + 1]))
+
+
+class RangeStats:
+    """
+    Prefix sums and sparse tables over the steps of a geometry, so the
+    statistics of any vertex range, or any stretch between two distances,
+    come from a few lookups instead of a pass over it.
+
+    gain[i] and loss[i] are the totals from the first vertex up to vertex i;
+    step_slope[i] is the slope (percent) of the step from vertex i to i + 1,
+    0 where the step has no length.
+    """
+
+    __slots__ = (
+        "distance",
+        "elevation",
+        "gain",
+        "loss",
+        "step_slope",
+        "min_elevation",
+        "max_elevation",
+        "max_slope",
+    )
+
+    def __init__(
+        self, geometry: TrailGeometry, min_slope_distance: float = MIN_SLOPE_DISTANCE
+    ) -> None:
+        self.distance = geometry.distance
+        self.elevation = geometry.elevation
+        elev_diff = np.diff(geometry.elevation)
+        step = np.diff(geometry.distance)
+
+        self.gain = np.zeros(len(geometry))
+        self.loss = np.zeros(len(geometry))
+        np.cumsum(np.where(elev_diff > 0, elev_diff, 0.0), out=self.gain[1:])
+        np.cumsum(np.where(elev_diff < 0, -elev_diff, 0.0), out=self.loss[1:])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.step_slope = np.where(step != 0, np.abs(elev_diff) / step * 100, 0.0)
+
+        # short steps are left out of the max slope, as for the whole trail
+        self.min_elevation = SparseTable(self.elevation, np.minimum)
+        self.max_elevation = SparseTable(self.elevation, np.maximum)
+        self.max_slope = SparseTable(
+            np.where(step >= min_slope_distance, self.step_slope, 0.0), np.maximum
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.gain.nbytes
+            + self.loss.nbytes
+            + self.step_slope.nbytes
+            + self.min_elevation.nbytes
+            + self.max_elevation.nbytes
+            + self.max_slope.nbytes
+        )
+
+    def _elevation_at(self, position: float, vertex: int, before: bool) -> float:
+        """
+        Elevation at a distance along the trail, given the vertex after
+        (before=False) or before (before=True) it, interpolating inside steps.
+        """
+        other = vertex + (1 if before else -1)
+        if self.distance[vertex] == position or not 0 <= other < len(self.distance):
+            return float(self.elevation[vertex])
+        d0, d1 = self.distance[vertex], self.distance[other]
+        e0, e1 = self.elevation[vertex], self.elevation[other]
+        return float(e0 + (e1 - e0) * (position - d0) / (d1 - d0))
+
+    def between(self, start_m: float, end_m: float) -> RangeMetrics:
+        """
+        Statistics of the stretch from start_m to end_m meters along the
+        trail, clamped to its length. Positions inside a step are
+        interpolated, so the stretch need not start or end on a vertex.
+        """
+        if start_m > end_m:
+            raise ValueError("start must not be after end")
+        if len(self.distance) == 0:
+            return RangeMetrics(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+        total = float(self.distance[-1])
+        start = min(max(float(start_m), 0.0), total)
+        end = min(max(float(end_m), start), total)
+
+        # vertices inside the stretch are first..last; the partial steps
+        # before and after them are interpolated
+        first = int(np.searchsorted(self.distance, start, "left"))
+        last = int(np.searchsorted(self.distance, end, "right")) - 1
+
+        if first > last:
+            # start and end fall inside the same step
+            start_elevation = self._elevation_at(start, first, before=False)
+            end_elevation = self._elevation_at(end, first, before=False)
+            rise = end_elevation - start_elevation
+            gain, loss = max(rise, 0.0), max(-rise, 0.0)
+            low = min(start_elevation, end_elevation)
+            high = max(start_elevation, end_elevation)
+            slopes = (first - 1, first - 1) if end > start else None
+        else:
+            start_elevation = self._elevation_at(start, first, before=False)
+            end_elevation = self._elevation_at(end, last, before=True)
+            head = float(self.elevation[first]) - start_elevation
+            tail = end_elevation - float(self.elevation[last])
+            gain = (
+                max(head, 0.0)
+                + float(self.gain[last] - self.gain[first])
+                + max(tail, 0.0)
+            )
+            loss = (
+                max(-head, 0.0)
+                + float(self.loss[last] - self.loss[first])
+                + max(-tail, 0.0)
+            )
+            low = min(
+                self.min_elevation.query(first, last), start_elevation, end_elevation
+            )
+            high = max(
+                self.max_elevation.query(first, last), start_elevation, end_elevation
+            )
+
+            # steps the stretch touches, including partial ones at either end
+            low_step = first - 1 if start < self.distance[first] else first
+            high_step = last if end > self.distance[last] else last - 1
+            slopes = (low_step, high_step) if low_step <= high_step else None
+
+        length = end - start
+        return RangeMetrics(
+            start=start,
+            end=end,
+            length=length / 1000.0,
+            elevation_gain=gain,
+            elevation_loss=loss,
+            min_elevation=low,
+            max_elevation=high,
+            avg_slope=(gain / length) * 100 if length else 0.0,
+            max_slope=max(0.0, self.max_slope.query(*slopes)) if slopes else 0.0,
+        )
+
+    def segment(self, start: int, end: int) -> SegmentMetrics:
+        """Metrics of the segment covering vertices start..end (inclusive)"""
+        if end <= start:
+            return SegmentMetrics(start, end, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+        # distance from the trail start at the segment's last vertex, as
+        # compute_metrics reports it
+        length = float(self.distance[end]) / 1000.0
+        gain = float(self.gain[end] - self.gain[start])
+        return SegmentMetrics(
+            start=start,
+            end=end,
+            length=length,
+            elevation_gain=gain,
+            elevation_loss=float(self.loss[end] - self.loss[start]),
+            avg_slope=(gain / (length * 1000)) * 100 if length else 0.0,
+            max_slope=max(0.0, float(self.step_slope[start:end].max())),
+        )
+
+
+def segment_bounds(
+    distance: np.ndarray, segment_length: float
+) -> List[Tuple[int, int]]:
+    """
+    Vertex index ranges (start, end) for each segment of the trail.
+
+    A segment closes at the first vertex at least segment_length km past its
+    start, or at the last vertex, and the next segment starts on that vertex.
+    Each boundary is found with a binary search, so this is O(segments log n).
+    """
+    last = len(distance) - 1
+    bounds = []
+    start = 0
+
+    while start < last:
+        start_distance = distance[start]
+        end = int(
+            np.searchsorted(distance, start_distance + segment_length * 1000.0, "left")
+        )
+
+        # the search works on a sum, so settle the boundary with the same test
+        # the per-vertex loop used to avoid off-by-one rounding differences
+        end = max(end, start + 1)
+        while end - 1 > start and (
+            (distance[end - 1] - start_distance) / 1000.0 >= segment_length
+        ):
+            end -= 1
+        while end < last and (distance[end] - start_distance) / 1000.0 < segment_length:
+            end += 1
+        end = min(end, last)
+
+        bounds.append((start, end))
+        start = end
+
+    return bounds
+
+
+def compute_metrics(
+    geometry: TrailGeometry,
+    segment_length: float,
+    min_slope_distance: float = MIN_SLOPE_DISTANCE,
+) -> TrailMetrics:
+    """
+    Compute all trail and segment statistics in one sweep over the vertices.
+
+    The elevation and distance differences are taken once and every metric
+    (gain, loss, range, variance, slopes and the per-segment reductions) is
+    derived from those shared arrays.
+    """
+    n = len(geometry)
+    if n == 0:
+        return TrailMetrics(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, segment_length, ())
+
+    elevation = geometry.elevation
+    distance = geometry.distance
+    length = float(distance[-1]) / 1000.0
+    max_elevation = float(elevation.max())
+    min_elevation = float(elevation.min())
+
+    if n == 1:
+        return TrailMetrics(
+            length,
+            0.0,
+            0.0,
+            max_elevation,
+            min_elevation,
+            0.0,
+            0.0,
+            0.0,
+            segment_length,
+            (),
+        )
+
+    # shared per-step arrays
+    elev_diff = np.diff(elevation)
+    step = np.diff(distance)
+    gain_steps = np.where(elev_diff > 0, elev_diff, 0.0)
+    loss_steps = np.where(elev_diff < 0, -elev_diff, 0.0)
+
+    moving = step != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        step_slope = np.where(moving, np.abs(elev_diff) / step * 100, 0.0)
+
+    elevation_gain = float(gain_steps.sum())
+    elevation_loss = float(loss_steps.sum())
+
+    # sample variance (same definition as statistics.variance)
+    variance = float(np.var(elevation, ddof=1))
+    elevation_variance = (
+        float(np.sqrt(variance)) if variance > VARIANCE_THRESHOLD else variance
+    )
+
+    avg_slope = (elevation_gain / (length * 1000)) * 100 if length != 0 else 0.0
+
+    usable = step >= min_slope_distance
+    max_slope = max(0.0, float(step_slope[usable].max())) if usable.any() else 0.0
+
+    # segments are contiguous, so each one reduces steps start..end-1
+    bounds = segment_bounds(distance, segment_length)
+    segments = ()
+    if bounds:
+        starts = np.fromiter((s for s, _ in bounds), dtype=np.intp, count=len(bounds))
+        seg_gain = np.add.reduceat(gain_steps, starts)
+        seg_loss = np.add.reduceat(loss_steps, starts)
+        seg_max_slope = np.maximum.reduceat(step_slope, starts)
+
+        segment_list = []
+        for i, (start, end) in enumerate(bounds):
+            # distance from the trail start at the segment's last vertex
+            seg_length = float(distance[end]) / 1000.0
+            gain = float(seg_gain[i])
+            segment_list.append(
+                SegmentMetrics(
+                    start=start,
+                    end=end,
+                    length=seg_length,
+                    elevation_gain=gain,
+                    elevation_loss=float(seg_loss[i]),
+                    avg_slope=(gain / (seg_length * 1000)) * 100 if seg_length else 0.0,
+                    max_slope=max(0.0, float(seg_max_slope[i])),
+                )
+            )
+        segments = tuple(segment_list)
+
+    return TrailMetrics(
+        length,
+        elevation_gain,
+        elevation_loss,
+        max_elevation,
+        min_elevation,
+        elevation_variance,
+        avg_slope,
+        max_slope,
+        segment_length,
+        segments,
+    )
@@ -0,0 +1,246 @@
+# built in libraries
+import math
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# third-party libraries
+import numpy as np
+
+from .geometry import WEB_MERCATOR_RADIUS, to_web_mercator
+
+# Mapbox Vector Tile (spec version 2) encoding for line features. Only the
+# parts of protobuf the spec uses are written (varints, zigzag integers,
+# doubles and length-delimited fields), so no protobuf package is needed.
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+# integer coordinate range of a tile, and the margin drawn around it so
+# lines crossing a tile edge are stroked without seams
+EXTENT = 4096
+BUFFER = 64
+
+# protobuf wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+# geometry commands and types
+MOVE_TO = 1
+LINE_TO = 2
+LINESTRING = 2
+
+# half the Web Mercator world width in meters
+ORIGIN_SHIFT = math.pi * WEB_MERCATOR_RADIUS
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _message(field: int, payload: bytes) -> bytes:
+    return _key(field, LENGTH_DELIMITED) + _varint(len(payload)) + payload
+
+
+def _packed(field: int, values: Sequence[int]) -> bytes:
+    return _message(field, b"".join(_varint(value) for value in values))
+
+
+def _value(value) -> bytes:
+    """Encode a feature attribute as a Value message"""
+    if isinstance(value, str):
+        return _message(1, value.encode("utf-8"))
+    if isinstance(value, bool):
+        return _key(7, VARINT) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _key(6, VARINT) + _varint(_zigzag(int(value)))
+    return _key(3, FIXED64) + struct.pack("<d", float(value))
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min longitude, min latitude, max longitude, max latitude) of a tile"""
+    n = 2**z
+    min_lon = x / n * 360 - 180
+    max_lon = (x + 1) / n * 360 - 180
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
+def buffered_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """tile_bounds grown by BUFFER, for finding the features to draw"""
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+    margin = BUFFER / EXTENT
+    dlon = (max_lon - min_lon) * margin
+    dlat = (max_lat - min_lat) * margin
+    return (
+        max(min_lon - dlon, -180.0),
+        max(min_lat - dlat, -90.0),
+        min(max_lon + dlon, 180.0),
+        min(max_lat + dlat, 90.0),
+    )
+
+
+def tile_coordinates(coordinates: np.ndarray, z: int, x: int, y: int) -> np.ndarray:
+    """(n, 2) tile-space positions of [longitude, latitude, ...] coordinates"""
+    mx, my = to_web_mercator(coordinates[:, 1], coordinates[:, 0])
+    scale = 2**z / (2 * ORIGIN_SHIFT)
+    px = ((mx + ORIGIN_SHIFT) * scale - x) * EXTENT
+    py = ((ORIGIN_SHIFT - my) * scale - y) * EXTENT
+    return np.column_stack((px, py))
+
+
+def _clip_segment(
+    a: np.ndarray, b: np.ndarray, low: float, high: float
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Liang-Barsky clip of segment a-b to the square [low, high]"""
+    t0, t1 = 0.0, 1.0
+    delta = b - a
+    for axis in (0, 1):
+        for p, q in ((-delta[axis], a[axis] - low), (delta[axis], high - a[axis])):
+            if p == 0:
+                if q < 0:
+                    return None
+                continue
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return None
+    return a + t0 * delta, a + t1 * delta
+
+
+def clip_line(points: np.ndarray, low: float, high: float) -> List[np.ndarray]:
+    """Pieces of a polyline inside the square [low, high], in order"""
+    if len(points) < 2:
+        return []
+    inside = np.all((points >= low) & (points <= high), axis=1)
+    if inside.all():
+        return [points]
+
+    # only segments whose bounding box touches the square need clipping
+    a, b = points[:-1], points[1:]
+    touching = np.all((np.maximum(a, b) >= low) & (np.minimum(a, b) <= high), axis=1)
+
+    parts, current = [], []
+    for i in np.flatnonzero(touching):
+        if inside[i] and inside[i + 1]:
+            start, end = points[i], points[i + 1]
+        else:
+            clipped = _clip_segment(points[i], points[i + 1], low, high)
+            if clipped is None:
+                continue
+            start, end = clipped
+
+        # a gap since the previous piece starts a new part
+        if not current or not np.array_equal(current[-1], start):
+            if len(current) > 1:
+                parts.append(np.array(current))
+            current = [start]
+        current.append(end)
+
+    if len(current) > 1:
+        parts.append(np.array(current))
+    return parts
+
+
+def encode_line_geometry(parts: List[np.ndarray]) -> List[int]:
+    """
+    Geometry commands for a (multi) linestring, rounding to whole tile units.
+    Repeated points are dropped, as are parts that collapse to one point.
+    """
+    commands = []
+    cursor_x, cursor_y = 0, 0
+    for part in parts:
+        part = np.rint(part).astype(np.int64)
+        keep = np.ones(len(part), dtype=bool)
+        keep[1:] = np.any(part[1:] != part[:-1], axis=1)
+        part = part[keep]
+        if len(part) < 2:
+            continue
+
+        deltas = np.diff(part, axis=0, prepend=[[cursor_x, cursor_y]])
+        zigzag = (deltas << 1) ^ (deltas >> 63)
+        commands.append((MOVE_TO & 0x7) | (1 << 3))
+        commands.extend(zigzag[0].tolist())
+        commands.append((LINE_TO & 0x7) | ((len(part) - 1) << 3))
+        commands.extend(zigzag[1:].ravel().tolist())
+        cursor_x, cursor_y = (int(value) for value in part[-1])
+    return commands
+
+
+class TileLayer:
+    """
+    One named layer of a vector tile. Features are added with their
+    attributes; keys and values are shared between features as the spec
+    requires.
+    """
+
+    def __init__(self, name: str, extent: int = EXTENT) -> None:
+        self.name = name
+        self.extent = extent
+        self._features: List[bytes] = []
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, object], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def add_line(
+        self, feature_id: int, geometry: List[int], attributes: Dict[str, object]
+    ) -> None:
+        """Add a line feature from encode_line_geometry commands"""
+        if not geometry:
+            return
+        tags = []
+        for key, value in attributes.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            tags.append(self._keys.setdefault(key, len(self._keys)))
+            tags.append(
+                self._values.setdefault((type(value), value), len(self._values))
+            )
+
+        self._features.append(
+            _key(1, VARINT)
+            + _varint(feature_id)
+            + _packed(2, tags)
+            + _key(3, VARINT)
+            + _varint(LINESTRING)
+            + _packed(4, geometry)
+        )
+
+    def encode(self) -> bytes:
+        payload = (
+            _key(15, VARINT)
+            + _varint(2)
+            + _message(1, self.name.encode("utf-8"))
+            + b"".join(_message(2, feature) for feature in self._features)
+            + b"".join(_message(3, key.encode("utf-8")) for key in self._keys)
+            + b"".join(_message(4, _value(value)) for _, value in self._values)
+            + _key(5, VARINT)
+            + _varint(self.extent)
+        )
+        return _message(3, payload)
+
+
+def encode_tile(layers: List[TileLayer]) -> bytes:
+    """A tile holding the non-empty layers"""
+    return b"".join(layer.encode() for layer in layers if len(layer))
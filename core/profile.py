@@ -0,0 +1,67 @@
+# built in libraries
+from typing import Dict
+
+# third-party libraries
+import numpy as np
+
+from .geometry import TrailGeometry
+
+# elevation profile sizes stored at ingest; other sizes are downsampled
+# when requested
+PROFILE_RESOLUTIONS = (100, 300, 1000)
+DEFAULT_PROFILE_POINTS = 300
+MAX_PROFILE_POINTS = 5000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of threshold points
+    of the series (x, y) that keep its visual shape.
+
+    The first and last points are always kept. The points in between are
+    split into threshold - 2 buckets, and from each bucket the point forming
+    the largest triangle with the previously kept point and the average of
+    the next bucket is kept, so peaks and dips survive.
+    """
+    n = len(x)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold <= 2:
+        return np.array([0, n - 1])
+
+    # bucket i covers points edges[i]..edges[i + 1] - 1; the last point is
+    # a bucket of its own
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.intp), n)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+
+    kept = 0
+    for i in range(threshold - 2):
+        start, end, next_end = edges[i], edges[i + 1], edges[i + 2]
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        # twice the triangle area; the constant factor does not change argmax
+        area = np.abs(
+            (x[kept] - next_x) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (next_y - y[kept])
+        )
+        kept = start + int(np.argmax(area))
+        selected[i + 1] = kept
+    return selected
+
+
+def elevation_profile(geometry: TrailGeometry, points: int) -> np.ndarray:
+    """
+    (k, 2) array of [distance from the start (m), elevation (m)] with at
+    most points rows, downsampled with lttb_indices
+    """
+    indices = lttb_indices(geometry.distance, geometry.elevation, points)
+    return np.column_stack((geometry.distance[indices], geometry.elevation[indices]))
+
+
+def standard_profiles(geometry: TrailGeometry) -> Dict[int, np.ndarray]:
+    """elevation_profile at every size in PROFILE_RESOLUTIONS"""
+    return {
+        points: elevation_profile(geometry, points) for points in PROFILE_RESOLUTIONS
+    }
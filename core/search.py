@@ -0,0 +1,141 @@
+# built in libraries
+import difflib
+import sqlite3
+from typing import List, Sequence, Tuple
+
+# shortest query the trigram index can match; shorter ones scan names by prefix
+MIN_TRIGRAM_QUERY = 3
+
+# trigram candidates scored for a typo-tolerant search
+FUZZY_CANDIDATES = 100
+
+# lowest similarity (0 to 1) for a fuzzy match to be returned
+MIN_FUZZY_SIMILARITY = 0.7
+
+# bm25 weights of the trail_search columns: name, notes
+SEARCH_WEIGHTS = (10.0, 1.0)
+
+# how a query matched; results are ordered by this first
+MATCH_KINDS = ("exact", "prefix", "substring", "notes", "fuzzy")
+
+
+def escape_like(text: str) -> str:
+    """Escape LIKE wildcards, for patterns used with ESCAPE '\\'"""
+    for char in ("\\", "%", "_"):
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def fts_string(text: str) -> str:
+    """Quote text as an FTS5 string, so it is matched literally"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def trigrams(text: str) -> List[str]:
+    """Distinct three-character substrings of text, in order"""
+    text = text.lower()
+    seen = {}
+    for i in range(len(text) - 2):
+        seen.setdefault(text[i : i + 3], None)
+    return list(seen)
+
+
+def name_similarity(query: str, name: str) -> float:
+    """
+    How closely query matches the best run of words in name (0 to 1), so a
+    misspelled word still scores highly against a long trail name.
+    """
+    query = query.lower()
+    words = name.lower().split()
+    width = max(1, len(query.split()))
+    best = 0.0
+    for i in range(max(1, len(words) - width + 1)):
+        window = " ".join(words[i : i + width])
+        best = max(best, difflib.SequenceMatcher(None, query, window).ratio())
+    return best
+
+
+def search_trails(
+    cursor: sqlite3.Cursor,
+    query: str,
+    limit: int,
+    condition: str = "",
+    params: Sequence = (),
+) -> List[Tuple[int, str]]:
+    """
+    Trails matching query as (trail_id, match kind), best first.
+
+    Names equal to, starting with or containing the query come first, then
+    trails whose notes contain it, each ranked by bm25. Only if nothing
+    contains the query are names sharing enough trigrams with it to be a
+    likely misspelling returned instead. condition (with params) is an
+    extra SQL condition on rowid, which is the trail_id.
+    """
+    query = query.strip()
+    if not query or limit <= 0:
+        return []
+    extra = f"AND ({condition})" if condition else ""
+
+    if len(query) < MIN_TRIGRAM_QUERY:
+        # too short for trigrams, only name prefixes are worth returning;
+        # a range on the case-insensitive name index finds them
+        cursor.execute(
+            f"""
+            SELECT rowid FROM trails
+            WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE {extra}
+            ORDER BY name COLLATE NOCASE
+            LIMIT ?
+        """,
+            (query, query + "\U0010ffff", *params, limit),
+        )
+        return [(row[0], "prefix") for row in cursor.fetchall()]
+
+    pattern = escape_like(query)
+    cursor.execute(
+        f"""
+        SELECT rowid,
+            CASE
+                WHEN name LIKE ? ESCAPE '\\' THEN 0
+                WHEN name LIKE ? ESCAPE '\\' THEN 1
+                WHEN name LIKE ? ESCAPE '\\' THEN 2
+                ELSE 3
+            END AS kind
+        FROM trail_search
+        WHERE trail_search MATCH ? {extra}
+        ORDER BY kind, bm25(trail_search, ?, ?), rowid
+        LIMIT ?
+    """,
+        (
+            pattern,
+            pattern + "%",
+            "%" + pattern + "%",
+            fts_string(query),
+            *params,
+            *SEARCH_WEIGHTS,
+            limit,
+        ),
+    )
+    results = [(row[0], MATCH_KINDS[row[1]]) for row in cursor.fetchall()]
+    if results:
+        return results
+
+    # typo tolerance: any shared trigram makes a candidate, then the closest
+    # names by edit similarity win
+    grams = " OR ".join(fts_string(gram) for gram in trigrams(query))
+    cursor.execute(
+        f"""
+        SELECT rowid, name FROM trail_search
+        WHERE trail_search MATCH ? {extra}
+        ORDER BY bm25(trail_search, ?, ?)
+        LIMIT ?
+    """,
+        (f"name : ({grams})", *params, *SEARCH_WEIGHTS, FUZZY_CANDIDATES),
+    )
+    scored = []
+    for trail_id, name in cursor.fetchall():
+        similarity = name_similarity(query, name)
+        if similarity >= MIN_FUZZY_SIMILARITY:
+            scored.append((-similarity, name, trail_id))
+
+    scored.sort()
+    return [(trail_id, "fuzzy") for _, _, trail_id in scored[:limit]]
@@ -1,84 +1,95 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Union
+
 from .point import Point
+from .geometry import TrailGeometry
+from .metrics import RangeStats, SegmentMetrics
 
 
 class TrailSegment:
-    """Represents a segement of a trail with analysis metrics"""
+    """
+    Represents a segement of a trail with analysis metrics.
+
+    A segment is a view of vertices start..end (inclusive) of the trail's
+    geometry: it holds the indices, not the vertices, and its metrics are
+    looked up from the trail's RangeStats the first time they are read.
+    """
+
+    __slots__ = ("segment_id", "start", "end", "_parent", "_stats", "_metrics")
+
+    def __init__(
+        self,
+        geometry: Union[TrailGeometry, List[Point]],
+        segment_id: int,
+        metrics: Optional[SegmentMetrics] = None,
+        start: int = 0,
+        end: Optional[int] = None,
+        stats: Optional[RangeStats] = None,
+    ):
+        # older callers pass a list of Point objects
+        if not isinstance(geometry, TrailGeometry):
+            geometry = TrailGeometry.from_points(geometry)
+
+        # Trail passes in metrics it already computed in its single sweep,
+        # which also say which vertices the segment covers
+        if metrics is not None:
+            start, end = metrics.start, metrics.end
+        elif end is None:
+            end = max(len(geometry) - 1, 0)
 
-    def __init__(self, points: List[Point], segment_id: int):
         self.segment_id = segment_id
-        self.points = points
-        self.start_point = points[0]
-        self.end_point = points[-1]
-        self.length = self._calculate_length()
-        self.elevation_gain = self._calculate_elevation_gain()
-        self.elevation_loss = self._calculate_elevation_loss()
-        self.avg_slope = self._calculate_avg_slope()
-        self.max_slope = self._calculate_max_slope()
-
-    def _calculate_length(self) -> float:
-        """Calculate the length of a segment in kilometers"""
-        if len(self.points) <= 1:
-            return 0.0
-
-        # distance is already calculated and stored in the last point
-        return self.points[-1].distance_from_start / 1000.0  # m to km
-
-    def _calculate_elevation_gain(self) -> float:
-        """Calculate total elevation gain in the segment"""
-        if len(self.points) <= 1:
-            return 0.0
-
-        gain = 0.0
-        for i in range(1, len(self.points)):
-            elev_diff = self.points[i].elevation - self.points[i - 1].elevation
-            if elev_diff > 0:
-                gain += elev_diff
-        return gain
-
-    def _calculate_elevation_loss(self) -> float:
-        """Calculate total elevation loss in the segment"""
-        if len(self.points) <= 1:
-            return 0.0
-
-        loss = 0.0
-        for i in range(1, len(self.points)):
-            elev_diff = self.points[i - 1].elevation - self.points[i].elevation
-            if elev_diff > 0:
-                loss += elev_diff
-        return loss
-
-    def _calculate_avg_slope(self) -> float:
-        """Calculate average slope percentage of the segment"""
-        if self.length == 0:
-            return 0.0
-
-        # convert elevation gain to meters, length to meters
-        length_m = self.length * 1000
-        avg_slope_pct = (self.elevation_gain / length_m) * 100
-        return avg_slope_pct
-
-    def _calculate_max_slope(self) -> float:
-        """Calculate maximum slope percentage between any two points"""
-        if len(self.points) <= 1:
-            return 0.0
-
-        max_slope = 0.0
-        for i in range(1, len(self.points)):
-            p1 = self.points[i - 1]
-            p2 = self.points[i]
-
-            # distance between p1 and p2 in meters
-            distance = p2.distance_from_start - p1.distance_from_start
-
-            if distance == 0:
-                continue
-
-            elev_diff = abs(p2.elevation - p1.elevation)
-            slope_pct = (elev_diff / distance) * 100
-            max_slope = max(max_slope, slope_pct)
-
-        return max_slope
+        self.start = start
+        self.end = end
+        self._parent = geometry
+        self._stats = stats
+        self._metrics = metrics
+
+    @property
+    def metrics(self) -> SegmentMetrics:
+        if self._metrics is None:
+            if self._stats is None:
+                self._stats = RangeStats(self._parent)
+            self._metrics = self._stats.segment(self.start, self.end)
+        return self._metrics
+
+    @property
+    def geometry(self) -> TrailGeometry:
+        """Segment vertices (numpy views of the trail's arrays)"""
+        return self._parent[self.start : self.end + 1]
+
+    @property
+    def length(self) -> float:
+        """Distance from the trail start to the segment's end, in kilometers"""
+        return self.metrics.length
+
+    @property
+    def elevation_gain(self) -> float:
+        return self.metrics.elevation_gain
+
+    @property
+    def elevation_loss(self) -> float:
+        return self.metrics.elevation_loss
+
+    @property
+    def avg_slope(self) -> float:
+        return self.metrics.avg_slope
+
+    @property
+    def max_slope(self) -> float:
+        """Maximum slope percentage between any two consecutive points"""
+        return self.metrics.max_slope
+
+    @property
+    def points(self) -> List[Point]:
+        """Segment vertices as Point objects (built on demand)"""
+        return self.geometry.to_points()
+
+    @property
+    def start_point(self) -> Point:
+        return self._parent.point(self.start)
+
+    @property
+    def end_point(self) -> Point:
+        return self._parent.point(self.end)
 
     def get_terrain_type(self) -> str:
         """Placeholder for terrain type detection"""
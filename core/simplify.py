@@ -0,0 +1,102 @@
+# third-party libraries
+import numpy as np
+
+from .geometry import EARTH_RADIUS, WEB_MERCATOR_RADIUS
+
+# simplified paths stay within this many screen pixels of the original
+PIXEL_TOLERANCE = 0.5
+
+# web map tiles are 256 pixels wide
+TILE_SIZE = 256
+
+MAX_ZOOM = 22
+
+
+def local_meters(latitude, longitude):
+    """
+    Project degrees onto a flat plane in meters, centered on the mean
+    latitude. Accurate enough for simplifying a single trail.
+    """
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    if len(latitude) == 0:
+        return latitude, longitude
+
+    scale = np.cos(np.radians(np.nanmean(latitude)))
+    x = EARTH_RADIUS * np.radians(longitude) * scale
+    y = EARTH_RADIUS * np.radians(latitude)
+    return x, y
+
+
+def simplification_importance(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Douglas-Peucker run once for every tolerance.
+
+    Returns, for each vertex, the largest tolerance at which Douglas-Peucker
+    still keeps it: its distance from the chord it was split on, capped by
+    the value of the vertex that split the enclosing range. The endpoints
+    are always kept (inf), so simplifying at tolerance t is just
+    importance > t, and one array stores every level of detail.
+    """
+    n = len(x)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+
+    # explicit stack, long trails would overflow recursion
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, cap = stack.pop()
+        if last - first < 2:
+            continue
+
+        distances = _segment_distances(x, y, first, last)
+        offset = int(np.argmax(distances))
+        index = first + 1 + offset
+        importance[index] = min(distances[offset], cap)
+
+        stack.append((first, index, importance[index]))
+        stack.append((index, last, importance[index]))
+
+    return importance
+
+
+def _segment_distances(x: np.ndarray, y: np.ndarray, first: int, last: int):
+    """Distance from each vertex strictly between first and last to that chord"""
+    px = x[first + 1 : last] - x[first]
+    py = y[first + 1 : last] - y[first]
+    dx = x[last] - x[first]
+    dy = y[last] - y[first]
+
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        # closed loop, measure from the shared endpoint
+        return np.hypot(px, py)
+
+    t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def simplify_mask(importance: np.ndarray, tolerance: float) -> np.ndarray:
+    """Boolean mask of the vertices kept at tolerance (meters)"""
+    if tolerance <= 0:
+        return np.ones(len(importance), dtype=bool)
+    return importance > tolerance
+
+
+def tolerance_for_zoom(
+    zoom: float, latitude: float, pixels: float = PIXEL_TOLERANCE
+) -> float:
+    """Ground distance in meters covered by `pixels` screen pixels at a zoom level"""
+    zoom = min(max(zoom, 0), MAX_ZOOM)
+    meters_per_pixel = (
+        2 * np.pi * WEB_MERCATOR_RADIUS * np.cos(np.radians(latitude))
+    ) / (TILE_SIZE * 2**zoom)
+    return float(pixels * meters_per_pixel)
+
+
+def path_importance(coordinates: np.ndarray) -> np.ndarray:
+    """simplification_importance of an (n, dims) [longitude, latitude, ...] array"""
+    x, y = local_meters(coordinates[:, 1], coordinates[:, 0])
+    return simplification_importance(x, y)
@@ -0,0 +1,185 @@
+# built in libraries
+import math
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+# third-party libraries
+import numpy as np
+
+from .encoding import unpack_coordinates
+from .geometry import EARTH_RADIUS, haversine_distances
+
+# (min longitude, min latitude, max longitude, max latitude), like GeoJSON
+BBox = Tuple[float, float, float, float]
+
+# first search radius for nearest-trail queries, doubled until k are found
+INITIAL_SEARCH_RADIUS = 2000.0
+
+# half the earth's circumference, no trail can be further away
+MAX_SEARCH_RADIUS = math.pi * EARTH_RADIUS
+
+
+def coordinate_bounds(coordinates: np.ndarray) -> Optional[BBox]:
+    """Bounding box of an (n, dims) [longitude, latitude, ...] array"""
+    if len(coordinates) == 0:
+        return None
+    longitude, latitude = coordinates[:, 0], coordinates[:, 1]
+    return (
+        float(np.nanmin(longitude)),
+        float(np.nanmin(latitude)),
+        float(np.nanmax(longitude)),
+        float(np.nanmax(latitude)),
+    )
+
+
+def bbox_condition(bbox: BBox, alias: str = "r") -> Tuple[str, List[float]]:
+    """
+    SQL condition (and parameters) for trail_rtree rows intersecting bbox.
+    A box whose min longitude is east of its max crosses the antimeridian
+    and is split in two.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    latitude = f"{alias}.max_lat >= ? AND {alias}.min_lat <= ?"
+    longitude = f"{alias}.max_lon >= ? AND {alias}.min_lon <= ?"
+
+    if min_lon <= max_lon:
+        return f"({latitude} AND {longitude})", [min_lat, max_lat, min_lon, max_lon]
+    return (
+        f"({latitude} AND (({longitude}) OR ({longitude})))",
+        [min_lat, max_lat, min_lon, 180.0, -180.0, max_lon],
+    )
+
+
+def search_window(latitude: float, longitude: float, radius: float) -> BBox:
+    """Box around a point containing everything within radius meters of it"""
+    dlat = math.degrees(radius / EARTH_RADIUS)
+    if latitude + dlat >= 90 or latitude - dlat <= -90:
+        # reaches a pole, every longitude is in range
+        return (-180.0, max(latitude - dlat, -90.0), 180.0, min(latitude + dlat, 90.0))
+
+    # longitude degrees shrink towards the poles; use the widest row of the box
+    scale = math.cos(math.radians(abs(latitude) + dlat))
+    dlon = math.degrees(radius / EARTH_RADIUS) / scale
+    if dlon >= 180:
+        return (-180.0, latitude - dlat, 180.0, latitude + dlat)
+
+    min_lon = (longitude - dlon + 180) % 360 - 180
+    max_lon = (longitude + dlon + 180) % 360 - 180
+    return (min_lon, latitude - dlat, max_lon, latitude + dlat)
+
+
+def distance_to_path(
+    latitude: float, longitude: float, lats: np.ndarray, lons: np.ndarray
+) -> float:
+    """
+    Meters from a point to the closest point of a path, vertices or the
+    segments between them.
+
+    Each segment's closest point is found in an equirectangular projection
+    centred on the query point, then measured with the haversine formula, so
+    the result is the distance to a point on the path: exact for the short
+    segments of a trail near the point, never less than the true distance
+    for distant ones.
+    """
+    best = float(
+        np.nanmin(
+            haversine_distances(
+                np.full(len(lats), latitude), np.full(len(lons), longitude), lats, lons
+            )
+        )
+    )
+    scale = math.cos(math.radians(latitude))
+    if len(lats) < 2 or scale < 1e-9:
+        # at a pole every direction is south, the vertices are enough
+        return best
+
+    # degrees east (shrunk to match north) and north of the query point,
+    # wrapped so a path across the antimeridian stays continuous
+    x = ((lons - longitude + 180) % 360 - 180) * scale
+    y = lats - latitude
+    x0, y0, dx, dy = x[:-1], y[:-1], np.diff(x), np.diff(y)
+    length2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = -(x0 * dx + y0 * dy) / length2
+    inside = (t > 0) & (t < 1)
+    if not inside.any():
+        return best
+
+    t = t[inside]
+    foot_x = x0[inside] + t * dx[inside]
+    foot_y = y0[inside] + t * dy[inside]
+    feet = haversine_distances(
+        np.full(len(t), latitude),
+        np.full(len(t), longitude),
+        latitude + foot_y,
+        longitude + foot_x / scale,
+    )
+    return min(best, float(np.nanmin(feet)))
+
+
+def path_distances(
+    cursor: sqlite3.Cursor, latitude: float, longitude: float, trail_ids: List[int]
+) -> Dict[int, float]:
+    """
+    Meters from a point to the closest point of each trail's stored path,
+    drawn as one line through its vertices (see distance_to_path). Trails
+    without a stored path are measured to their location instead.
+    """
+    distances = {}
+    if not trail_ids:
+        return distances
+
+    placeholders = ", ".join("?" * len(trail_ids))
+    cursor.execute(
+        f"""
+        SELECT t.trail_id, t.location_lat, t.location_long, g.dims, g.coordinates
+        FROM trails t
+        LEFT JOIN trail_geometry g ON g.trail_id = t.trail_id
+        WHERE t.trail_id IN ({placeholders})
+    """,
+        trail_ids,
+    )
+
+    for trail_id, location_lat, location_long, dims, blob in cursor.fetchall():
+        if blob is not None and len(blob):
+            coordinates = unpack_coordinates(dims, blob)
+            lons, lats = coordinates[:, 0], coordinates[:, 1]
+        elif location_lat is not None:
+            lons, lats = np.array([location_long]), np.array([location_lat])
+        else:
+            continue
+
+        distances[trail_id] = distance_to_path(latitude, longitude, lats, lons)
+    return distances
+
+
+def nearest_trails(
+    cursor: sqlite3.Cursor,
+    latitude: float,
+    longitude: float,
+    k: int,
+    max_radius: float = MAX_SEARCH_RADIUS,
+) -> List[Tuple[int, float]]:
+    """
+    The k trails closest to a point as (trail_id, meters), nearest first.
+
+    Searches the R*Tree in a window that doubles in size until k trails are
+    known to lie within its radius; a trail outside the window is further
+    away than the radius, so nothing closer can have been missed.
+    """
+    radius = INITIAL_SEARCH_RADIUS
+    distances: Dict[int, float] = {}
+
+    while True:
+        condition, params = bbox_condition(
+            search_window(latitude, longitude, radius), alias="trail_rtree"
+        )
+        cursor.execute(f"SELECT trail_id FROM trail_rtree WHERE {condition}", params)
+        found = [row[0] for row in cursor.fetchall() if row[0] not in distances]
+        distances.update(path_distances(cursor, latitude, longitude, found))
+
+        ranked = sorted(distances.items(), key=lambda item: (item[1], item[0]))
+        within = [item for item in ranked if item[1] <= radius]
+        if len(within) >= k or radius >= max_radius:
+            return (within if radius < max_radius else ranked)[:k]
+        radius *= 2
@@ -2,19 +2,26 @@
 import json
 import math
 import os
-from typing import List, Tuple, Dict, Optional, Any
-import statistics
+from functools import cached_property
+from typing import List, Tuple, Dict, Optional, Any, TYPE_CHECKING
 import sqlite3
 
 # third-party libraries
-import geopandas as gpd
-import folium
+# geopandas and folium are slow to import, so they are only loaded by the
+# features that need them (Trail.gdf and core.mapping)
+import numpy as np
 
 # internal imports
 from .point import Point
+from .geometry import TrailGeometry, cumulative_distance
+from .metrics import RangeMetrics, RangeStats, compute_metrics, segment_bounds
 from .analysis import TrailAnalyzer
+from .dem import default_elevation_model
 from .segment import TrailSegment
 
+if TYPE_CHECKING:
+    import geopandas as gpd
+
 
 class Trail:
     """Enhanced Trail class with analysis capabilities"""
@@ -24,6 +31,7 @@ class Trail:
         filepath: str,
         segment_length: float = 0.5,
         analyzer: Optional["TrailAnalyzer"] = None,
+        resample_spacing: Optional[float] = None,
     ) -> None:
         # store original path (might be full path or just filename)
         self.file = filepath
@@ -39,16 +47,20 @@ class Trail:
         # basic trail data
         self.name = self.get_map_name()
         self.segment_length = segment_length
+        self.resample_spacing = resample_spacing
+
+        # extract vertices from GeoJSON into columnar arrays
+        self.geometry = self.extract_geometry()
 
-        # GeoDataFrame Related Functions
-        self.gdf = gpd.read_file(
-            filepath
-        )  # this gets initialized since it's used a lot
+        # optionally put a vertex every resample_spacing meters, so slopes and
+        # analysis cost no longer depend on how densely the trail was recorded
+        if resample_spacing:
+            self.geometry = self.geometry.resample(resample_spacing)
 
-        # extract points from GeoJSON
-        self.points = self.extract_points()
+        # calculate every trail and segment statistic in one sweep
+        self.metrics = compute_metrics(self.geometry, segment_length)
 
-        # calculate basic metrics
+        # basic metrics
         self.length = self.calculate_trail_length()
         self.elevation_gain, self.elevation_loss = self.calculate_elevation_up_down()
         self.max_elevation = self.calculate_max_elevation()
@@ -63,6 +75,23 @@ class Trail:
         # analyzer for difficulty ratings
         self.analyzer = analyzer if analyzer else TrailAnalyzer()
 
+    @cached_property
+    def gdf(self) -> "gpd.GeoDataFrame":
+        """GeoDataFrame of the trail file, only read when something needs it"""
+        import geopandas as gpd
+
+        return gpd.read_file(self.file)
+
+    @property
+    def points(self) -> List[Point]:
+        """Trail vertices as Point objects (built on demand from the geometry)"""
+        return self.geometry.to_points()
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of the trail's vertices, used to key cached analysis results"""
+        return self.geometry.content_hash()
+
     def __str__(self) -> str:
         return (
             f"Trail: {self.name}\n"
@@ -85,24 +114,15 @@ class Trail:
         return center[0], center[1]
 
     def find_center(self) -> list[float]:
-        """opens a file and finds the latitude and longitude of the center of all data points"""
-        gdf_projected = self.gdf.to_crs(
-            epsg=3857
-        )  # Convert to a projected CRS (e.g., EPSG:3857 for Web Mercator)
-        centroid = (
-            gdf_projected.geometry.centroid
-        )  # Compute the centroid in projected CRS
-        centroid_latlon = centroid.to_crs(
-            epsg=4326
-        )  # Convert back to latitude/longitude
-        return [
-            float(centroid_latlon.y.mean()),
-            float(centroid_latlon.x.mean()),
-        ]  # return latitude and longitude
+        """finds the latitude and longitude of the center of all data points"""
+        # computed from the parsed vertices, same result as the projected
+        # GeoDataFrame centroid without reading the file a second time
+        latitude, longitude = self.geometry.centroid()
+        return [latitude, longitude]  # return latitude and longitude
 
     def calculate_zoom(self) -> int:
         """Calculate an appropriate zoom level based on dataset extent."""
-        minx, miny, maxx, maxy = self.gdf.total_bounds  # Bounding box
+        minx, miny, maxx, maxy = self.geometry.bounds()  # Bounding box
         lat_diff = maxy - miny
         lon_diff = maxx - minx
         zoom = max(
@@ -114,89 +134,10 @@ class Trail:
         self, include_segments: bool = True, include_difficulty: bool = True
     ) -> str:
         """Uses the folium library to create an HTML map visualization"""
-        # get values needed for map
-        map_center = self.find_center()
-        zoom = self.calculate_zoom()
+        # folium is only imported when a map is actually rendered
+        from .mapping import render_trail_map
 
-        # create map
-        map = folium.Map(location=map_center, zoom_start=zoom)
-
-        # ensure we have the full path
-        if not os.path.isabs(self.file):
-            from utils import get_trail_files
-
-            full_path = os.path.join(get_trail_files(), self.file)
-        else:
-            full_path = self.file
-
-        # add the basic trail
-        folium.GeoJson(
-            self.file,
-            name=self.name,
-            style_function=lambda x: {"color": "blue", "weight": 3},
-        ).add_to(map)
-
-        # add points for elevation visualization (optional)
-        if include_difficulty:
-            for point in self.points[::10]:  # sample points for readability
-                folium.CircleMarker(
-                    location=[point.latitude, point.longitude],
-                    radius=3,
-                    color="green",
-                    fill=True,
-                    popup=f"Elevation: {point.elevation:.1f}m",
-                ).add_to(map)
-
-        # add segment visualization
-        if include_segments and self.segments:
-            for segment in self.segments:
-                # color based on slope
-                slope = segment.avg_slope
-                if slope > 15:
-                    color = "red"
-                elif slope > 8:
-                    color = "orange"
-                else:
-                    color = "green"
-
-                # draw segment line
-                points = [[p.latitude, p.longitude] for p in segment.points]
-                folium.PolyLine(
-                    points,
-                    color=color,
-                    weight=5,
-                    opacity=0.7,
-                    popup=f"Segment {segment.segment_id}:<br>"
-                    f"Length: {segment.length:.2f} km<br>"
-                    f"Elevation Gain: {segment.elevation_gain:.1f}m<br>"
-                    f"Avg Slope: {segment.avg_slope:.1f}%",
-                ).add_to(map)
-
-        # add difficulty ratings legend
-        if include_difficulty:
-            cardio = self.analyzer.calculate_cardio_intensity(self)
-            technical = self.analyzer.calculate_technical_difficulty(self)
-            accessibility = self.analyzer.calculate_accessibility(self)
-            weather = self.analyzer.calculate_weather_vulnerability(self)
-            overall = self.analyzer.calculate_overall_difficulty(self)
-
-            legend_html = f"""
-                <div style="position: fixed; bottom: 50px; right: 50px; width: 200px; 
-                height: 180px; border:2px solid grey; z-index:9999; background-color:white;
-                padding: 10px; font-size: 14px;">
-                <b>Difficulty Ratings</b><br>
-                Cardio Intensity: {cardio}/10<br>
-                Technical Difficulty: {technical}/10<br>
-                Accessibility: {accessibility}/10<br>
-                Weather Vulnerability: {weather}/10<br>
-                <b>Overall: {overall}/10</b>
-                </div>
-            """
-            map.get_root().html.add_child(folium.Element(legend_html))
-
-        # save the map
-        map.save(f"{self.name}_analyzed.html")
-        return f"{self.name}_analyzed.html"
+        return render_trail_map(self, include_segments, include_difficulty)
 
     def haversine_distance(
         self, lat1: float, lon1: float, lat2: float, lon2: float
@@ -227,9 +168,15 @@ class Trail:
 
     def extract_points(self) -> list[Point]:
         """Extract all points from .geojson file"""
-        points = []
-        distance_so_far = 0.0
+        return self.extract_geometry().to_points()
 
+    def extract_geometry(self, vectorized: bool = True) -> TrailGeometry:
+        """
+        Extract all vertices from .geojson file into a TrailGeometry
+
+        Step distances are computed for the whole file in one batched pass;
+        vectorized=False swaps in the pure-Python kernel for validation.
+        """
         # ensure we have the full path
         if not os.path.isabs(self.file):
             from utils import get_trail_files
@@ -243,70 +190,62 @@ class Trail:
             with open(full_path, "r") as f:
                 data = json.load(f)
 
-            prev_lat, prev_lon = None, None
+            # one (n, 3) array of [longitude, latitude, elevation] per line
+            parts = []
+            line_starts, line_features = [], []
+            waypoints = []
+            vertex_count = 0
 
             # Process each feature
-            for feature in data.get("features", []):
+            for feature_index, feature in enumerate(data.get("features", [])):
                 geometry = feature.get("geometry", {})
                 geo_type = geometry.get("type", "")
 
-                # Process MultiLineString type
+                # flatten both geometry types into a list of lines
                 if geo_type == "MultiLineString":
-                    for line in geometry.get("coordinates", []):
-                        for coords in line:
-                            if len(coords) >= 3:
-                                # GeoJSON standard: [longitude, latitude, elevation]
-                                lon, lat, ele = coords[:3]
-
-                                # Calculate distance from previous point
-                                if prev_lat is not None and prev_lon is not None:
-                                    dist = self.haversine_distance(
-                                        prev_lat, prev_lon, lat, lon
-                                    )
-                                    distance_so_far += dist
-
-                                # Create and store point
-                                points.append(
-                                    Point(
-                                        latitude=lat,
-                                        longitude=lon,
-                                        elevation=ele,
-                                        distance_from_start=distance_so_far,
-                                    )
-                                )
-
-                                # Update previous coordinates
-                                prev_lat, prev_lon = lat, lon
-
-                # Process LineString type
+                    lines = geometry.get("coordinates", [])
                 elif geo_type == "LineString":
-                    for coords in geometry.get("coordinates", []):
-                        if len(coords) >= 3:
-                            lon, lat, ele = coords[:3]
-
-                            if prev_lat is not None and prev_lon is not None:
-                                dist = self.haversine_distance(
-                                    prev_lat, prev_lon, lat, lon
-                                )
-                                distance_so_far += dist
-
-                            points.append(
-                                Point(
-                                    latitude=lat,
-                                    longitude=lon,
-                                    elevation=ele,
-                                    distance_from_start=distance_so_far,
-                                )
-                            )
-
-                            prev_lat, prev_lon = lat, lon
+                    lines = [geometry.get("coordinates", [])]
+                elif geo_type == "Point":
+                    # markers such as trailheads, kept for centering the map
+                    try:
+                        lon, lat = map(float, geometry.get("coordinates", [])[:2])
+                    except (TypeError, ValueError):
+                        # one bad marker should not send the file to the
+                        # (much slower) GeoDataFrame fallback
+                        print(
+                            f"Skipping malformed waypoint in feature "
+                            f"{feature_index} of {full_path}"
+                        )
+                        continue
+                    waypoints.append((lat, lon))
+                    continue
+                else:
+                    continue
+
+                for line in lines:
+                    part = _line_coordinates(line)
+                    if len(part):
+                        parts.append(part)
+                        line_starts.append(vertex_count)
+                        line_features.append(feature_index)
+                        vertex_count += len(part)
+
+            coords = np.concatenate(parts) if parts else np.empty((0, 3))
+
+            # consecutive lines are treated as one continuous path
+            lons, lats, elevations = coords[:, 0], coords[:, 1], coords[:, 2]
+            distances = cumulative_distance(lats, lons, vectorized=vectorized)
 
         except Exception as e:
             print(f"Error extracting points directly from GeoJSON: {e}")
 
             # Fall back to the original extraction method if direct parsing fails
+            lats, lons, elevations = [], [], []
+            line_starts, line_features = [], []
+            waypoints = []
             try:
-                for _, feature in self.gdf.iterrows():
+                for feature_index, (_, feature) in enumerate(self.gdf.iterrows()):
                     geom = feature.geometry
 
                     # handle LineString
@@ -314,192 +253,129 @@ class Trail:
                         coords = list(geom.coords)
 
                         # extract elevation from properties if available
-                        elevations = []
+                        line_elevations = []
                         if "ele" in feature or "elevation" in feature:
                             ele_key = "ele" if "ele" in feature else "elevation"
-                            elevations = feature[ele_key]
+                            line_elevations = feature[ele_key]
 
                             # handle different elevation data formats
-                            if isinstance(elevations, (int, float)):
-                                elevations = [elevations] * len(coords)
-                            elif isinstance(elevations, str):
+                            if isinstance(line_elevations, (int, float)):
+                                line_elevations = [line_elevations] * len(coords)
+                            elif isinstance(line_elevations, str):
                                 try:
-                                    elevations = float(elevations)
-                                    elevations = [elevations] * len(coords)
+                                    line_elevations = float(line_elevations)
+                                    line_elevations = [line_elevations] * len(coords)
                                 except:
-                                    elevations = []
-
-                        # fill missing elevations (would use DEM in real implementation)
-                        if not elevations or len(elevations) != len(coords):
-                            elevations = [0] * len(coords)
-
-                        # create Point objects
-                        prev_lat, prev_lon = None, None
-                        for i, (lon, lat) in enumerate(coords):
-                            if prev_lat is not None and prev_lon is not None:
-                                distance_so_far += self.haversine_distance(
-                                    prev_lat, prev_lon, lat, lon
-                                )
-
-                            points.append(
-                                Point(
-                                    latitude=lat,
-                                    longitude=lon,
-                                    elevation=(
-                                        elevations[i] if i < len(elevations) else 0
-                                    ),
-                                    distance_from_start=distance_so_far,
-                                )
-                            )
-
-                            prev_lat, prev_lon = lat, lon
+                                    line_elevations = []
+
+                        # fill missing elevations from the DEM, 0 where it has none
+                        if not line_elevations or len(line_elevations) != len(coords):
+                            line_elevations = _dem_elevations(coords)
+
+                        lines = [(coords, line_elevations)]
 
                     # handle MultiLineString
                     elif geom.geom_type == "MultiLineString":
+                        # elevations come from the DEM, 0 where it has none
+                        lines = []
                         for line in geom.geoms:
                             coords = list(line.coords)
-
-                            # For now, assume constant elevation for MultiLineString
-                            # In real implementation, would use elevation service
-                            prev_lat, prev_lon = None, None
-                            for lon, lat in coords:
-                                if prev_lat is not None and prev_lon is not None:
-                                    distance_so_far += self.haversine_distance(
-                                        prev_lat, prev_lon, lat, lon
-                                    )
-
-                                points.append(
-                                    Point(
-                                        latitude=lat,
-                                        longitude=lon,
-                                        elevation=0,  # Would use DEM in real implementation
-                                        distance_from_start=distance_so_far,
-                                    )
-                                )
-
-                                prev_lat, prev_lon = lat, lon
+                            lines.append((coords, _dem_elevations(coords)))
+                    elif geom.geom_type == "Point":
+                        waypoints.append((geom.y, geom.x))
+                        continue
+                    else:
+                        continue
+
+                    # each line starts fresh, so no distance is added between lines
+                    for coords, line_elevations in lines:
+                        if not coords:
+                            continue
+                        line_starts.append(len(lats))
+                        line_features.append(feature_index)
+                        for i, coord in enumerate(coords):
+                            lons.append(coord[0])
+                            lats.append(coord[1])
+                            elevations.append(line_elevations[i])
             except Exception as inner_e:
                 print(f"Fallback extraction also failed: {inner_e}")
 
-        return points
+            distances = cumulative_distance(
+                lats, lons, part_starts=line_starts, vectorized=vectorized
+            )
+
+        return TrailGeometry(
+            lats, lons, elevations, distances, line_starts, line_features, waypoints
+        )
 
     def calculate_trail_length(self) -> float:
         """Calculates the total length of the trail in km"""
-        if not self.points:
-            return 0.0
-
-        # use the distance stored in the last point
-        return self.points[-1].distance_from_start / 1000.0  # convert to km
+        return self.metrics.length
 
     def calculate_elevation_up_down(self) -> Tuple[float, float]:
         """Returns the total increase and decrease in elevation"""
-        increase = 0.0
-        decrease = 0.0
-
-        if len(self.points) <= 1:
-            return increase, decrease
-
-        for i in range(1, len(self.points)):
-            elev_diff = self.points[i].elevation - self.points[i - 1].elevation
-            if elev_diff > 0:
-                increase += elev_diff
-            else:
-                decrease += elev_diff
-
-        return increase, abs(decrease)
+        return self.metrics.elevation_gain, self.metrics.elevation_loss
 
     def calculate_elevation_variance(trail):
         """
         Returns the standard deviation instead of variance for high values
         """
-        if len(trail.points) <= 1:
-            return 0.0
-
-        elevations = [p.elevation for p in trail.points]
-
-        # Calculate variance
-        variance = statistics.variance(elevations) if len(elevations) > 1 else 0.0
-
-        # If variance is above threshold, return standard deviation instead
-        if variance > 80:
-            return statistics.stdev(elevations)
-        else:
-            return variance
+        return trail.metrics.elevation_variance
 
     def calculate_max_elevation(self) -> float:
         """Get the maximum elevation point"""
-        if not self.points:
-            return 0.0
-
-        return max(p.elevation for p in self.points)
+        return self.metrics.max_elevation
 
     def calculate_min_elevation(self) -> float:
         """Get the minimum elevation point"""
-        if not self.points:
-            return 0.0
-
-        return min(p.elevation for p in self.points)
+        return self.metrics.min_elevation
 
     def calculate_avg_slope(self) -> float:
         """Calculate the average slope percentage of the entire trail"""
-        if self.length == 0 or len(self.points) <= 1:
-            return 0.0
-
-        # use total elevation gain for average uphill slope
-        return (self.elevation_gain / (self.length * 1000)) * 100
+        return self.metrics.avg_slope
 
     def calculate_max_slope(self) -> float:
         """Calculate the maximum slope percentage between any two points"""
-        if len(self.points) <= 1:
-            return 0.0
-
-        max_slope = 0.0
-        min_horizontal_distance = 5.0
-        for i in range(1, len(self.points)):
-            p1 = self.points[i - 1]
-            p2 = self.points[i]
+        return self.metrics.max_slope
 
-            # calculate horizontal distance between points
-            distance = p2.distance_from_start - p1.distance_from_start
-
-            if distance < min_horizontal_distance or distance == 0:
-                continue
-
-            # calculate slope as rise/run * 100
-            slope_pct = abs((p2.elevation - p1.elevation) / distance) * 100
-            max_slope = max(max_slope, slope_pct)
-
-        return max_slope
-
-    def create_segments(self) -> List[TrailSegment]:
-        """Divide the trail into segments for analysis"""
-        if not self.points or len(self.points) < 2:
-            return []
-
-        segments = []
-        segment_points = []
-        segment_id = 0
-        segment_start_distance = 0
-
-        for i, point in enumerate(self.points):
-            segment_points.append(point)
+    @cached_property
+    def range_stats(self) -> RangeStats:
+        """
+        Prefix sums and sparse tables of the trail's steps, shared by every
+        segment view and range query
+        """
+        return RangeStats(self.geometry)
 
-            # check if we've reached the target segment length or if we're at the end of the trail
-            current_segment_length = (
-                point.distance_from_start - segment_start_distance
-            ) / 1000.0
-            is_last_point = i == len(self.points) - 1
+    def stats_between(self, start_m: float, end_m: float) -> RangeMetrics:
+        """Length, gain, loss, elevation range and slopes from start_m to end_m"""
+        return self.range_stats.between(start_m, end_m)
 
-            if current_segment_length >= self.segment_length or is_last_point:
-                if len(segment_points) >= 2:
-                    segments.append(TrailSegment(segment_points, segment_id))
-                    segment_id += 1
+    def create_segments(
+        self, segment_length: Optional[float] = None
+    ) -> List[TrailSegment]:
+        """
+        Divide the trail into segments for analysis, of self.segment_length
+        km unless another length is given. Segments are views of the trail's
+        geometry; at a new length only the boundaries are searched for and
+        each segment's metrics are looked up when first read.
+        """
+        if segment_length is None:
+            segment_length = self.segment_length
 
-                # start a new segment, but keep the last point as the first point of the new segment
-                segment_start_distance = point.distance_from_start
-                segment_points = [point]
+        if segment_length == self.metrics.segment_length:
+            return [
+                TrailSegment(self.geometry, segment_id, metrics=seg)
+                for segment_id, seg in enumerate(self.metrics.segments)
+            ]
 
-        return segments
+        return [
+            TrailSegment(
+                self.geometry, segment_id, start=start, end=end, stats=self.range_stats
+            )
+            for segment_id, (start, end) in enumerate(
+                segment_bounds(self.geometry.distance, segment_length)
+            )
+        ]
 
     def analyze_trail(self) -> Dict[str, Any]:
         """
@@ -507,12 +383,8 @@ class Trail:
         """
         # calculate all metrics (already done in init)
 
-        # calculate difficulty ratings
-        cardio_intensity = self.analyzer.calculate_cardio_intensity(self)
-        technical_difficulty = self.analyzer.calculate_technical_difficulty(self)
-        accessibility = self.analyzer.calculate_accessibility(self)
-        weather_vulnerability = self.analyzer.calculate_weather_vulnerability(self)
-        overall_difficulty = self.analyzer.calculate_overall_difficulty(self)
+        # calculate difficulty ratings (cached per trail by the analyzer)
+        report = self.analyzer.get_difficulty_report(self)
 
         # return analysis results
         return {
@@ -524,13 +396,7 @@ class Trail:
             "avg_slope": self.avg_slope,
             "max_slope": self.max_slope,
             "segment_count": len(self.segments),
-            "difficulty_ratings": {
-                "cardio_intensity": cardio_intensity,
-                "technical_difficulty": technical_difficulty,
-                "accessibility": accessibility,
-                "weather_vulnerability": weather_vulnerability,
-                "overall_difficulty": overall_difficulty,
-            },
+            "difficulty_ratings": report.to_dict(),
         }
 
     def save_to_database(self, db_connection: sqlite3.Connection) -> bool:
@@ -544,3 +410,43 @@ class Trail:
 
         # store results
         return self.analyzer.store_analysis_results(self)
+
+
+def _line_coordinates(line: List[List[float]]) -> np.ndarray:
+    """
+    Convert one GeoJSON line to an (n, 3) array. Missing elevations are
+    sampled from the local DEM; vertices it has no data for are skipped.
+    """
+    try:
+        coords = np.asarray(line, dtype=np.float64)
+        if coords.ndim != 2 or coords.shape[1] < 2:
+            raise ValueError("not a list of positions")
+        if coords.shape[1] == 2:
+            coords = np.column_stack((coords, np.full(len(coords), np.nan)))
+        coords = coords[:, :3]
+    except (TypeError, ValueError):
+        # ragged line, some vertices are missing elevation
+        coords = np.asarray(
+            [
+                (vertex[0], vertex[1], vertex[2] if len(vertex) >= 3 else np.nan)
+                for vertex in line
+                if len(vertex) >= 2
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 3)
+
+    missing = np.isnan(coords[:, 2])
+    if not missing.any():
+        return coords
+    default_elevation_model().fill_missing(coords)
+    return coords[~np.isnan(coords[:, 2])]
+
+
+def _dem_elevations(coords: List[Tuple[float, ...]]) -> List[float]:
+    """DEM elevation of each (longitude, latitude) vertex, 0 where unknown"""
+    if not coords:
+        return []
+    lons = [coord[0] for coord in coords]
+    lats = [coord[1] for coord in coords]
+    elevations = default_elevation_model().sample(lats, lons)
+    return np.nan_to_num(elevations, nan=0.0).tolist()
@@ -1,66 +1,458 @@
-import json
+import argparse
+import hashlib
 import sys
 import os
 import sqlite3
-from datetime import datetime
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_dir)
 
-from utils import get_db_path, get_trail_files
+from utils import get_db_path, get_trail_files, resolve_trail_path
 from core.trail import Trail
+from core.dem import default_elevation_model
+from core.encoding import load_line_coordinates, pack_coordinates, pack_importance
+from core.profile import standard_profiles
+from core.simplify import path_importance
+from core.analysis import (
+    ANALYZER_VERSION,
+    BulkTrailWriter,
+    TrailRecord,
+    delete_trail,
+)
+from data.init_db import migrate
 
 """
 run using py -m data.add_trails
 -m runs from root directory
+
+pass --workers 1 to parse and analyze in this process instead of a pool
+
+trails stream through the pipeline: at most --max-in-flight are being
+analyzed or waiting to be written at any time, so memory use does not
+grow with the number of files
+
+runs are incremental: the ingest_manifest table records each file's size,
+mtime, content hash and the analyzer version that rated it, so only new or
+changed files are analyzed and trails whose files were removed from the
+scanned directory are deleted (pass --no-prune to keep them); trails from
+other directories are left alone
 """
 
+# trails written per transaction
+COMMIT_BATCH_SIZE = 100
 
-def get_trails(directory=None):
-    """Returns a list of all .geojson files in the specified directory with full paths."""
+
+def iter_trails(directory=None) -> Iterator[str]:
+    """Yields the full path of each .geojson file in the directory, lazily."""
     if directory is None:
         directory = get_trail_files()
 
     if not os.path.exists(directory):
         raise FileNotFoundError(f"Directory '{directory}' does not exist.")
 
-    return [
-        os.path.join(directory, f)
-        for f in os.listdir(directory)
-        if f.endswith(".geojson")
-    ]
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".geojson"):
+                yield os.path.join(directory, entry.name)
 
 
-def main():
-    conn = sqlite3.connect(get_db_path())
-    cursor = conn.cursor()
+def get_trails(directory=None):
+    """Returns a list of all .geojson files in the specified directory with full paths."""
+    return list(iter_trails(directory))
 
-    trail_paths = get_trails()
-    trails = []
 
-    for filepath in trail_paths:
-        trails.append(Trail(filepath))
+class IngestJob(NamedTuple):
+    """A file that needs to be (re-)analyzed, with its manifest details"""
 
-    for t in trails:
-        name = t.name  # get map name
-        path = t.file  # get path
+    filepath: str  # resolved path, the file's manifest key
+    geojson_path: str  # file name as stored in trails.geojson_path
+    size: int
+    mtime_ns: int
+    content_hash: str
+    trail_id: Optional[int]  # existing trail to replace, if any
 
-        # Check if trail already exists - look for basename only
-        basename = os.path.basename(path)
-        cursor.execute(
-            "SELECT 1 FROM trails WHERE geojson_path = ? OR geojson_path = ?",
-            (basename, path),
+
+class ManifestEntry(NamedTuple):
+    size: int
+    mtime_ns: int
+    content_hash: str
+    analyzer_version: int
+    trail_id: Optional[int]
+
+
+def file_content_hash(filepath: str) -> str:
+    """SHA-256 of a file's bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(cursor: sqlite3.Cursor) -> Dict[str, ManifestEntry]:
+    cursor.execute(
+        """
+        SELECT geojson_path, size, mtime_ns, content_hash, analyzer_version, trail_id
+        FROM ingest_manifest
+    """
+    )
+    return {row[0]: ManifestEntry(*row[1:]) for row in cursor.fetchall()}
+
+
+class IngestPlan:
+    """
+    Decides which discovered files need analysis.
+
+    Unchanged files (same size, mtime and analyzer version) are skipped on a
+    stat alone; files whose stat changed are hashed, and only analyzed if
+    their content changed too. Files are keyed on their resolved path, and
+    only trails from the scanned directory can be found to be removed.
+    """
+
+    def __init__(
+        self,
+        manifest: Dict[str, ManifestEntry],
+        existing: Dict[str, int],
+        directory: str,
+    ) -> None:
+        self.manifest = manifest
+        self.existing = existing
+        self.directory = os.path.realpath(directory)
+        self.trail_files = os.path.realpath(get_trail_files())
+        self.seen: Set[str] = set()
+        self.unchanged = 0
+        # (size, mtime_ns, filepath) for files whose content did not change
+        self.touched: List[Tuple[int, int, str]] = []
+
+    def jobs(self, paths: Iterable[str]) -> Iterator[IngestJob]:
+        for filepath in paths:
+            filepath = resolve_trail_path(os.path.abspath(filepath))
+            # files outside storage/trail_files are stored by their full path
+            geojson_path = filepath
+            if os.path.dirname(filepath) == self.trail_files:
+                geojson_path = os.path.basename(filepath)
+            self.seen.add(filepath)
+
+            stat = os.stat(filepath)
+            entry = self.manifest.get(filepath)
+            current = entry is not None and entry.analyzer_version == ANALYZER_VERSION
+
+            if (
+                current
+                and entry.size == stat.st_size
+                and entry.mtime_ns == stat.st_mtime_ns
+            ):
+                self.unchanged += 1
+                continue
+
+            content_hash = file_content_hash(filepath)
+            if current and entry.content_hash == content_hash:
+                # touched but not edited, just remember the new stat
+                self.touched.append((stat.st_size, stat.st_mtime_ns, filepath))
+                self.unchanged += 1
+                continue
+
+            # rows stored before the manifest existed are replaced in place
+            trail_id = entry.trail_id if entry is not None else None
+            if trail_id is None:
+                trail_id = self.existing.get(filepath)
+
+            yield IngestJob(
+                filepath,
+                geojson_path,
+                stat.st_size,
+                stat.st_mtime_ns,
+                content_hash,
+                trail_id,
+            )
+
+    def removed(self) -> List[Tuple[str, Optional[int]]]:
+        """
+        (filepath, trail_id) of trails in the scanned directory whose files
+        were not found in this run, including trails stored before the
+        manifest existed
+        """
+        removed = [
+            (filepath, entry.trail_id)
+            for filepath, entry in self.manifest.items()
+            if self._missing(filepath)
+        ]
+        tracked = {entry.trail_id for entry in self.manifest.values()}
+        removed += [
+            (filepath, trail_id)
+            for filepath, trail_id in self.existing.items()
+            if trail_id not in tracked and self._missing(filepath)
+        ]
+        return removed
+
+    def _missing(self, filepath: str) -> bool:
+        return os.path.dirname(filepath) == self.directory and filepath not in self.seen
+
+
+def analyze_trail_file(
+    job: IngestJob,
+) -> Tuple[IngestJob, Optional[TrailRecord], str]:
+    """
+    Parse and analyze one trail file (runs in a worker process).
+    Returns (job, record, error) with record None if analysis failed.
+    """
+    try:
+        trail = Trail(job.filepath)
+        record = trail.analyzer.build_record(trail)
+        record.trail_row = (*record.trail_row[:-1], job.geojson_path)
+
+        # packed once here so the API never has to parse the file. Read from
+        # the file rather than taken from trail.geometry, which leaves out
+        # vertices without an elevation: the served path keeps every vertex
+        coordinates = load_line_coordinates(job.filepath)
+        if coordinates.shape[1] >= 3:
+            # vertices saved without elevation get it from the local DEM
+            default_elevation_model().fill_missing(coordinates)
+        record.geometry_row = (
+            *pack_coordinates(coordinates),
+            job.size,
+            job.mtime_ns,
         )
-        exists = cursor.fetchone()
+        record.lod_row = (pack_importance(path_importance(coordinates)),)
+        record.profile_rows = [
+            (points, pack_coordinates(series)[2])
+            for points, series in standard_profiles(trail.geometry).items()
+        ]
+        return job, record, ""
+    except Exception as e:
+        return job, None, str(e)
+
+
+def analyze_trail_files(
+    jobs: Iterable[IngestJob], workers: int, max_in_flight: int
+) -> Iterator[Tuple[IngestJob, Optional[TrailRecord], str]]:
+    """
+    Analyze trail files in a process pool, yielding results in input order.
+    No more than max_in_flight files are submitted and not yet consumed.
+    """
+    if workers <= 1:
+        yield from map(analyze_trail_file, jobs)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(analyze_trail_file, job))
 
-        if not exists:
-            # use save_to_database to store all trail data including difficulty ratings
-            t.save_to_database(conn)
-            print(f"Added trail: {name}, Length: {t.length:.2f} km")
+            # wait for the oldest result before submitting more work
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+class StageCounter:
+    """Counts items pulled through an iterator and the time spent producing them"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+    def wrap(self, iterable: Iterable) -> Iterator:
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.seconds += time.perf_counter() - start
+                return
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            yield item
+
+
+def existing_trail_paths(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """
+    Resolved path of every trail file already stored, loaded once instead of
+    per trail
+    """
+    cursor.execute(
+        "SELECT geojson_path, trail_id FROM trails WHERE geojson_path IS NOT NULL"
+    )
+    return {resolve_trail_path(row[0]): row[1] for row in cursor.fetchall()}
+
+
+def write_records(
+    conn: sqlite3.Connection,
+    results: Iterable[Tuple[IngestJob, Optional[TrailRecord], str]],
+    batch_size: int = COMMIT_BATCH_SIZE,
+    tune: bool = False,
+) -> Tuple[int, int, float]:
+    """
+    Single writer: stores records and their manifest entries as they arrive,
+    committing batch_size trails per transaction. A trail that fails to store
+    is logged and skipped.
+    Returns (trails written, segments written, seconds spent writing).
+    """
+    write_time = 0.0
+
+    with BulkTrailWriter(conn, batch_size=batch_size, tune=tune) as writer:
+        for job, record, error in results:
+            if record is None:
+                print(f"Error analyzing trail {job.filepath}: {error}")
+                continue
+
+            start = time.perf_counter()
+            try:
+                if job.trail_id is not None:
+                    trail_id = writer.replace(job.trail_id, record)
+                else:
+                    trail_id = writer.add(record)
+            except sqlite3.Error as e:
+                # only this trail's rows were undone, keep going
+                write_time += time.perf_counter() - start
+                print(f"Error storing trail {job.filepath}: {e}")
+                continue
+
+            # same transaction as the trail rows
+            writer.cursor.execute(
+                """
+                INSERT OR REPLACE INTO ingest_manifest (
+                    geojson_path, size, mtime_ns, content_hash,
+                    analyzer_version, trail_id, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """,
+                (
+                    job.filepath,
+                    job.size,
+                    job.mtime_ns,
+                    job.content_hash,
+                    ANALYZER_VERSION,
+                    trail_id,
+                ),
+            )
+            write_time += time.perf_counter() - start
+
+            action = "Updated" if job.trail_id is not None else "Added"
+            print(f"{action} trail: {record.name}, Length: {record.length:.2f} km")
+
+        start = time.perf_counter()
+        writer.flush()
+        write_time += time.perf_counter() - start
+
+    return writer.trails_written, writer.segments_written, write_time
+
+
+def apply_manifest_changes(
+    conn: sqlite3.Connection, plan: IngestPlan, prune: bool
+) -> int:
+    """Record new stats for touched files and drop trails whose files are gone"""
+    cursor = conn.cursor()
+    cursor.executemany(
+        "UPDATE ingest_manifest SET size = ?, mtime_ns = ? WHERE geojson_path = ?",
+        plan.touched,
+    )
+
+    removed = plan.removed() if prune else []
+    for filepath, trail_id in removed:
+        if trail_id is not None:
+            delete_trail(cursor, trail_id)
+        cursor.execute(
+            "DELETE FROM ingest_manifest WHERE geojson_path = ?", (filepath,)
+        )
+        print(f"Removed trail: {os.path.splitext(os.path.basename(filepath))[0]}")
 
     conn.commit()
+    return len(removed)
+
+
+def report_throughput(stage: str, count: int, unit: str, seconds: float) -> None:
+    """Print how long a stage took and how many items per second it handled"""
+    rate = count / seconds if seconds > 0 else float("inf")
+    print(f"{stage:<10} {count:>7} {unit:<9} {seconds:8.2f}s  {rate:10.1f} {unit}/s")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Add new trail files to the database")
+    parser.add_argument(
+        "--directory",
+        default=None,
+        help="directory of .geojson files (defaults to storage/trail_files)",
+    )
+    parser.add_argument(
+        "--db", default=None, help="database path (defaults to data/trails.db)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes for parsing and analysis (default: CPU count)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=COMMIT_BATCH_SIZE,
+        help=f"trails written per transaction (default: {COMMIT_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--tune-pragmas",
+        action="store_true",
+        help="use WAL, synchronous=NORMAL and a larger cache while loading",
+    )
+    parser.add_argument(
+        "--no-prune",
+        dest="prune",
+        action="store_false",
+        help="keep trails whose files were removed from the directory",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="trails analyzed ahead of the writer (default: 2 per worker)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    max_in_flight = args.max_in_flight or 2 * max(1, args.workers)
+
+    conn = sqlite3.connect(args.db or get_db_path())
+    migrate(conn)
+    cursor = conn.cursor()
+    directory = args.directory or get_trail_files()
+    plan = IngestPlan(load_manifest(cursor), existing_trail_paths(cursor), directory)
+
+    # stage 1: discover files that are new or changed since the last run
+    discovered = StageCounter()
+    jobs = StageCounter()
+    jobs_iter = jobs.wrap(plan.jobs(discovered.wrap(iter_trails(directory))))
+
+    # stage 2 and 3: analyze in the pool while the writer stores results,
+    # one trail at a time
+    start = time.perf_counter()
+    results = analyze_trail_files(jobs_iter, args.workers, max_in_flight)
+    trails_written, segments_written, write_time = write_records(
+        conn, results, args.batch_size, args.tune_pragmas
+    )
+    total_time = time.perf_counter() - start
+
+    removed = apply_manifest_changes(conn, plan, args.prune)
     conn.close()
 
+    analyze_time = total_time - write_time - discovered.seconds
+    print()
+    report_throughput("discover", discovered.count, "files", discovered.seconds)
+    report_throughput("analyze", jobs.count, "trails", analyze_time)
+    report_throughput("write", trails_written + segments_written, "rows", write_time)
+    print(
+        f"workers: {args.workers}, max in flight: {max_in_flight}, "
+        f"unchanged: {plan.unchanged}, written: {trails_written}, "
+        f"removed: {removed}"
+    )
+
 
 if __name__ == "__main__":
     main()
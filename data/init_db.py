@@ -7,7 +7,9 @@ import sqlite3
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(parent_dir)
 
-from utils import get_db_path
+from core.encoding import load_line_coordinates, unpack_coordinates
+from core.spatial import coordinate_bounds
+from utils import get_db_path, get_full_trail_path, resolve_trail_path
 
 """
 This file creates the database
@@ -87,10 +89,251 @@ def main():
     """
     )
 
+    # tables and indexes added after the original schema
+    migrate(conn)
+
     # Commit changes and close connection
     conn.commit()
     conn.close()
 
 
+def migrate(conn):
+    """
+    Bring an existing database up to the current schema.
+    Every statement is idempotent, so this is safe to run on each start.
+    """
+    cursor = conn.cursor()
+    cursor.executescript(
+        """
+    -- one entry per ingested file, keyed on its resolved path
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        geojson_path TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime_ns INTEGER,
+        content_hash TEXT,
+        analyzer_version INTEGER,
+        trail_id INTEGER,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (trail_id) REFERENCES trails(trail_id) ON DELETE CASCADE
+    );
+
+    -- path coordinates packed by core.encoding, with the stat of the file
+    -- they were read from so readers can tell when they are stale
+    CREATE TABLE IF NOT EXISTS trail_geometry (
+        trail_id INTEGER PRIMARY KEY,
+        dims INTEGER NOT NULL,
+        point_count INTEGER NOT NULL,
+        coordinates BLOB NOT NULL,
+        source_size INTEGER,
+        source_mtime_ns INTEGER,
+        FOREIGN KEY (trail_id) REFERENCES trails(trail_id) ON DELETE CASCADE
+    );
+
+    -- per-vertex Douglas-Peucker tolerances for the trail_geometry path
+    -- (see core.simplify), which encode every level of detail at once
+    CREATE TABLE IF NOT EXISTS trail_geometry_lod (
+        trail_id INTEGER PRIMARY KEY,
+        importance BLOB NOT NULL,
+        FOREIGN KEY (trail_id) REFERENCES trails(trail_id) ON DELETE CASCADE
+    );
+
+    -- elevation profiles of the trail_geometry path downsampled by
+    -- core.profile, packed as [distance, elevation] rows, one per size
+    CREATE TABLE IF NOT EXISTS trail_profile (
+        trail_id INTEGER NOT NULL,
+        points INTEGER NOT NULL,
+        series BLOB NOT NULL,
+        PRIMARY KEY (trail_id, points),
+        FOREIGN KEY (trail_id) REFERENCES trails(trail_id) ON DELETE CASCADE
+    );
+
+    -- bounding box of each trail's path, for viewport and nearest queries
+    CREATE VIRTUAL TABLE IF NOT EXISTS trail_rtree USING rtree(
+        trail_id, min_lon, max_lon, min_lat, max_lat
+    );
+
+    -- trigram index over trail names and their notes for /api/search,
+    -- one row per trail with rowid = trail_id, kept current by triggers
+    CREATE VIRTUAL TABLE IF NOT EXISTS trail_search USING fts5(
+        name, notes, tokenize = 'trigram'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trail_search_insert AFTER INSERT ON trails
+    BEGIN
+        INSERT OR REPLACE INTO trail_search (rowid, name, notes)
+        VALUES (NEW.trail_id, NEW.name, '');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trail_search_rename AFTER UPDATE OF name ON trails
+    BEGIN
+        UPDATE trail_search SET name = NEW.name WHERE rowid = NEW.trail_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trail_search_delete AFTER DELETE ON trails
+    BEGIN
+        DELETE FROM trail_search WHERE rowid = OLD.trail_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trail_search_note_insert AFTER INSERT ON trail_notes
+    BEGIN
+        UPDATE trail_search SET notes = (
+            SELECT IFNULL(group_concat(note_text, ' '), '') FROM trail_notes
+            WHERE trail_id = NEW.trail_id
+        ) WHERE rowid = NEW.trail_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trail_search_note_update AFTER UPDATE ON trail_notes
+    BEGIN
+        UPDATE trail_search SET notes = (
+            SELECT IFNULL(group_concat(note_text, ' '), '') FROM trail_notes
+            WHERE trail_id = trail_search.rowid
+        ) WHERE rowid IN (OLD.trail_id, NEW.trail_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trail_search_note_delete AFTER DELETE ON trail_notes
+    BEGIN
+        UPDATE trail_search SET notes = (
+            SELECT IFNULL(group_concat(note_text, ' '), '') FROM trail_notes
+            WHERE trail_id = OLD.trail_id
+        ) WHERE rowid = OLD.trail_id;
+    END;
+
+    -- child rows are always looked up by their trail
+    CREATE INDEX IF NOT EXISTS idx_trail_segments_trail_id
+        ON trail_segments(trail_id, segment_order);
+    CREATE INDEX IF NOT EXISTS idx_difficulty_ratings_trail_id
+        ON difficulty_ratings(trail_id);
+    CREATE INDEX IF NOT EXISTS idx_terrain_data_trail_id
+        ON terrain_data(trail_id);
+    CREATE INDEX IF NOT EXISTS idx_trail_notes_trail_id
+        ON trail_notes(trail_id);
+    CREATE INDEX IF NOT EXISTS idx_ingest_manifest_trail_id
+        ON ingest_manifest(trail_id);
+    -- case-insensitive name prefixes, for searches too short for trigrams
+    CREATE INDEX IF NOT EXISTS idx_trails_name_nocase
+        ON trails(name COLLATE NOCASE);
+    """
+    )
+    create_name_index(cursor)
+    resolve_manifest_paths(cursor)
+    backfill_trail_bounds(cursor)
+    rebuild_search_index(cursor)
+    conn.commit()
+
+
+def create_name_index(cursor):
+    """
+    Trails are looked up by name, which should be unique. Databases that
+    already hold duplicate names get a plain index until they are cleaned up;
+    the next migrate after that upgrades it to a unique one.
+    """
+    cursor.execute("PRAGMA index_list(trails)")
+    existing = {row[1]: bool(row[2]) for row in cursor.fetchall()}
+    if existing.get("idx_trails_name"):
+        return
+
+    cursor.execute(
+        "SELECT name FROM trails GROUP BY name HAVING COUNT(*) > 1 AND name IS NOT NULL"
+    )
+    duplicates = [row[0] for row in cursor.fetchall()]
+    if duplicates:
+        print(
+            f"Warning: duplicate trail names ({', '.join(duplicates)}), "
+            "trails.name is indexed but not unique"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trails_name ON trails(name)")
+        return
+
+    cursor.execute("DROP INDEX IF EXISTS idx_trails_name")
+    cursor.execute("CREATE UNIQUE INDEX idx_trails_name ON trails(name)")
+
+
+def resolve_manifest_paths(cursor):
+    """
+    The ingest manifest used to be keyed on file names in storage/trail_files;
+    key those entries on the file's resolved path like new ones.
+    """
+    cursor.execute("SELECT geojson_path FROM ingest_manifest")
+    renamed = []
+    for (geojson_path,) in cursor.fetchall():
+        resolved = resolve_trail_path(geojson_path)
+        if resolved != geojson_path:
+            renamed.append((resolved, geojson_path))
+    cursor.executemany(
+        "UPDATE OR REPLACE ingest_manifest SET geojson_path = ? WHERE geojson_path = ?",
+        renamed,
+    )
+
+
+def backfill_trail_bounds(cursor):
+    """
+    Index trails stored before trail_rtree existed, using their packed path,
+    else their GeoJSON file, else just their location.
+    """
+    cursor.execute(
+        """
+        SELECT t.trail_id, t.location_lat, t.location_long, t.geojson_path,
+               g.dims, g.coordinates
+        FROM trails t
+        LEFT JOIN trail_geometry g ON g.trail_id = t.trail_id
+        WHERE t.trail_id NOT IN (SELECT trail_id FROM trail_rtree)
+    """
+    )
+    rows = []
+    for row in cursor.fetchall():
+        trail_id, location_lat, location_long, geojson_path, dims, blob = row
+        bounds = None
+        if blob:
+            bounds = coordinate_bounds(unpack_coordinates(dims, blob))
+        elif geojson_path:
+            try:
+                coordinates = load_line_coordinates(get_full_trail_path(geojson_path))
+                bounds = coordinate_bounds(coordinates)
+            except (OSError, ValueError):
+                pass
+        if bounds is None and location_lat is not None:
+            bounds = (location_long, location_lat, location_long, location_lat)
+        if bounds is not None:
+            rows.append((trail_id, *bounds))
+
+    cursor.executemany(
+        """
+        INSERT INTO trail_rtree (trail_id, min_lon, min_lat, max_lon, max_lat)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+        rows,
+    )
+
+
+def rebuild_search_index(cursor, force=False):
+    """
+    Refill trail_search from trails and trail_notes. Only done when the
+    index is missing trails (it was just created, or trails were written
+    without the triggers), unless force is set.
+    """
+    if not force:
+        cursor.execute(
+            """
+            SELECT (SELECT COUNT(*) FROM trails),
+                   (SELECT COUNT(*) FROM trail_search)
+        """
+        )
+        trail_count, indexed_count = cursor.fetchone()
+        if trail_count == indexed_count:
+            return
+
+    cursor.execute("DELETE FROM trail_search")
+    cursor.execute(
+        """
+        INSERT INTO trail_search (rowid, name, notes)
+        SELECT t.trail_id, t.name, IFNULL((
+            SELECT group_concat(note_text, ' ') FROM trail_notes
+            WHERE trail_id = t.trail_id
+        ), '')
+        FROM trails t
+    """
+    )
+
+
 if __name__ == "__main__":
     main()
@@ -8,63 +8,220 @@ document.addEventListener("DOMContentLoaded", function () {
         attribution: "&copy; OpenStreetMap contributors",
     }).addTo(hikingMap);
 
+    // every trail line, drawn from the API's vector tiles and colored by difficulty
+    L.vectorGrid.protobuf("http://localhost:8000/tiles/{z}/{x}/{y}", {
+        rendererFactory: L.canvas.tile,
+        maxNativeZoom: 18,
+        vectorTileLayerStyles: {
+            trails: properties => ({
+                color: difficultyColor(properties.difficulty),
+                weight: 3,
+                opacity: 0.8,
+            }),
+        },
+    }).addTo(hikingMap);
+
     let allTrails = [];
+    let visibleTrails = [];
     let trailMarkers = [];
     let activeMarker = null;
+    let activeLocation = null;
+
+    // only the fields each view renders: the list, and the map markers
+    const LIST_FIELDS = "name,location_lat,location_long,length,difficulty_rating,cardio_intensity,technical_difficulty";
+    const MAP_FIELDS = "name,location_lat,location_long,length,difficulty";
+    const PAGE_SIZE = 100;
+    let latestLoad = 0;
+    let nextCursor = null;
+    let loadingPage = false;
+
+    // the catalogue is fetched a page at a time: the next page only when the
+    // end of the list scrolls into view, appended below the ones shown
+    const listEnd = document.createElement("div");
+    listEnd.className = "trail-list-end";
+    trailListContainer.appendChild(listEnd);
+
+    const listEndObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreTrails();
+        }
+    }, { root: trailListContainer, rootMargin: "200px" });
+
+    // (re)start watching the end of the list, which reports right away
+    // whether it is still in view
+    function watchListEnd() {
+        listEndObserver.unobserve(listEnd);
+        if (nextCursor !== null && searchResults === null) {
+            listEndObserver.observe(listEnd);
+        }
+    }
 
-    async function loadTrails() {
-        try {
-            const response = await fetch("http://localhost:8000/api/trails"); // Assuming API runs on port 5000
-            allTrails = await response.json();
+    // start over from the first page; the difficulty filter is applied by the API
+    function loadTrails() {
+        const loadId = ++latestLoad;
+        allTrails = [];
+        nextCursor = null;
+        if (searchResults === null) {
             displayTrails(allTrails);
-            addTrailsToMap(allTrails);
+        }
+        fetchTrailPage(loadId);
+    }
+
+    function loadMoreTrails() {
+        if (!loadingPage && nextCursor !== null && searchResults === null) {
+            fetchTrailPage(latestLoad);
+        }
+    }
+
+    async function fetchTrailPage(loadId) {
+        loadingPage = true;
+        const params = new URLSearchParams({ limit: PAGE_SIZE, fields: LIST_FIELDS });
+        if (filterActive) {
+            params.set("min_difficulty", minDifficulty);
+            params.set("max_difficulty", maxDifficulty);
+        }
+        if (nextCursor) {
+            params.set("cursor", nextCursor);
+        }
+
+        try {
+            const response = await fetch(`http://localhost:8000/api/trails?${params}`);
+            const page = await response.json();
+
+            // a newer load (e.g. a changed filter) replaced this one
+            if (loadId !== latestLoad) {
+                return;
+            }
+
+            allTrails = allTrails.concat(page.trails);
+            nextCursor = page.next_cursor;
+            if (searchResults === null) {
+                appendTrails(page.trails);
+            }
         } catch (error) {
             console.error("Error loading trails:", error);
+        } finally {
+            if (loadId === latestLoad) {
+                loadingPage = false;
+                watchListEnd();
+            }
         }
     }
 
-    function displayTrails(trails) {
-        trailListContainer.innerHTML = ""; 
+    // map markers only for the trails in view, fetched again after each pan or zoom
+    let latestViewport = 0;
+
+    // Leaflet bounds as the API's bbox, with longitudes wrapped into -180..180
+    function viewportBBox() {
+        const bounds = hikingMap.getBounds();
+        let west = bounds.getWest();
+        let east = bounds.getEast();
+        if (east - west >= 360) {
+            west = -180;
+            east = 180;
+        } else {
+            west = ((west + 180) % 360 + 360) % 360 - 180;
+            east = ((east + 180) % 360 + 360) % 360 - 180;
+        }
+        const south = Math.max(bounds.getSouth(), -90);
+        const north = Math.min(bounds.getNorth(), 90);
+        return [west, south, east, north].join(",");
+    }
 
-        trails.forEach(trail => {
-            // create difficulty color indicator with a gradient from green (1) to red (10)
-            let difficultyColor = "#aaaaaa"; // default gray for unknown
-            if (trail.difficulty_rating) {
-                const rating = trail.difficulty_rating;
-                // generate color on a gradient from green (1) to yellow (5) to red (10)
-                switch(rating) {
-                    case 1:
-                    case 2:
-                    case 3:
-                        difficultyColor = 'rgb(0, 128, 0)';
-                        break;
-                    case 4:
-                        difficultyColor = 'rgb(191, 223, 0)'
-                        break;
-                    case 5:
-                        difficultyColor = 'rgb(255, 235, 0)'
-                        break;
-                    case 6:
-                        difficultyColor = 'rgb(255, 190, 0)'
-                        break;
-                    case 7:
-                        difficultyColor = 'rgb(255, 145, 0)'
-                        break;
-                    case 8:
-                        difficultyColor = 'rgb(255, 102, 0)'
-                        break;
-                    case 9:
-                        difficultyColor = 'rgb(255, 0, 0)'
-                        break;
-                    case 10:
-                        difficultyColor = 'rgb(255,0,0)'
-                        break;
-                }   
+    async function loadVisibleTrails() {
+        const loadId = ++latestViewport;
+        const params = new URLSearchParams({ bbox: viewportBBox(), fields: MAP_FIELDS });
+        if (filterActive) {
+            params.set("min_difficulty", minDifficulty);
+            params.set("max_difficulty", maxDifficulty);
+        }
+
+        try {
+            const response = await fetch(`http://localhost:8000/api/trails/within?${params}`);
+            const result = await response.json();
+
+            // the map moved again while this request was in flight
+            if (loadId !== latestViewport) {
+                return;
             }
 
+            visibleTrails = result.trails;
+            addTrailsToMap(searchTrails(visibleTrails));
+        } catch (error) {
+            console.error("Error loading visible trails:", error);
+        }
+    }
+
+    hikingMap.on("moveend", loadVisibleTrails);
+
+    const DEFAULT_ICON = L.icon({
+        iconUrl: 'https://unpkg.com/leaflet@1.7.1/dist/images/marker-icon.png',
+        shadowUrl: 'https://unpkg.com/leaflet@1.7.1/dist/images/marker-shadow.png',
+        iconSize: [25, 41],
+        iconAnchor: [12, 41],
+        popupAnchor: [1, -34],
+        shadowSize: [41, 41]
+    });
+
+    const ACTIVE_ICON = L.icon({
+        iconUrl: 'https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png',
+        shadowUrl: 'https://unpkg.com/leaflet@1.7.1/dist/images/marker-shadow.png',
+        iconSize: [25, 41],
+        iconAnchor: [12, 41],
+        popupAnchor: [1, -34],
+        shadowSize: [41, 41]
+    });
+
+    function isActiveTrail(trail) {
+        return activeLocation !== null
+            && trail.location_lat === activeLocation[0]
+            && trail.location_long === activeLocation[1];
+    }
+
+    // difficulty color with a gradient from green (1) to red (10)
+    function difficultyColor(rating) {
+        // default gray for unknown
+        if (!rating) {
+            return "#aaaaaa";
+        }
+        // generate color on a gradient from green (1) to yellow (5) to red (10)
+        switch(rating) {
+            case 1:
+            case 2:
+            case 3:
+                return 'rgb(0, 128, 0)';
+            case 4:
+                return 'rgb(191, 223, 0)';
+            case 5:
+                return 'rgb(255, 235, 0)';
+            case 6:
+                return 'rgb(255, 190, 0)';
+            case 7:
+                return 'rgb(255, 145, 0)';
+            case 8:
+                return 'rgb(255, 102, 0)';
+            case 9:
+                return 'rgb(255, 0, 0)';
+            case 10:
+                return 'rgb(255,0,0)';
+        }
+        return "#aaaaaa";
+    }
+
+    // replace the list with these trails
+    function displayTrails(trails) {
+        trailListContainer.innerHTML = "";
+        trailListContainer.appendChild(listEnd);
+        appendTrails(trails);
+        watchListEnd();
+    }
+
+    // add trails to the end of the list, leaving the ones shown in place
+    function appendTrails(trails) {
+        trails.forEach(trail => {
             // format trail difficulty with color coding and numeric display
             let difficultyDisplay = `
-                <div class="difficulty-indicator" style="background-color: ${difficultyColor}; 
+                <div class="difficulty-indicator" style="background-color: ${difficultyColor(trail.difficulty_rating)}; 
                         display: inline-block; width: 35px; height: 35px; border-radius: 50%; 
                         margin-right: 140px; color: white; font-weight: bold; line-height: 35px;
                         text-align: center; font-size: 22px;">
@@ -123,38 +280,26 @@ document.addEventListener("DOMContentLoaded", function () {
                     <button class="view-path" data-trail="${encodeURIComponent(trail.name)}">View Trail Path</button>
                 </div>
             `;
-            trailListContainer.appendChild(trailItem);
-        });
+            trailListContainer.insertBefore(trailItem, listEnd);
 
-        document.querySelectorAll(".view-trail").forEach(button => {
-            button.addEventListener("click", function () {
+            trailItem.querySelector(".view-trail").addEventListener("click", function () {
                 const lat = parseFloat(this.dataset.lat);
                 const lng = parseFloat(this.dataset.lng);
 
                 // reset previous active marker
                 if (activeMarker) {
-                    activeMarker.setIcon(L.icon({
-                        iconUrl: 'https://unpkg.com/leaflet@1.7.1/dist/images/marker-icon.png',
-                        shadowUrl: 'https://unpkg.com/leaflet@1.7.1/dist/images/marker-shadow.png',
-                        iconSize: [25, 41],
-                        iconAnchor: [12, 41],
-                        popupAnchor: [1, -34],
-                        shadowSize: [41, 41]
-                    }));
+                    activeMarker.setIcon(DEFAULT_ICON);
+                    activeMarker = null;
                 }
 
+                // remembered so the highlight survives the markers being reloaded
+                activeLocation = [lat, lng];
+
                 // find marker for selected trail and highlight it
                 for (let marker of trailMarkers) {
-                    if (marker.trailData.location_lat === lat && marker.trailData.location_long === lng) {
+                    if (isActiveTrail(marker.trailData)) {
                         // Set to red marker icon
-                        marker.setIcon(L.icon({
-                            iconUrl: 'https://raw.githubusercontent.com/pointhi/leaflet-color-markers/master/img/marker-icon-red.png',
-                            shadowUrl: 'https://unpkg.com/leaflet@1.7.1/dist/images/marker-shadow.png',
-                            iconSize: [25, 41],
-                            iconAnchor: [12, 41],
-                            popupAnchor: [1, -34],
-                            shadowSize: [41, 41]
-                        }));
+                        marker.setIcon(ACTIVE_ICON);
                         activeMarker = marker;
                         break;
                     }
@@ -162,10 +307,8 @@ document.addEventListener("DOMContentLoaded", function () {
 
                 hikingMap.setView([lat, lng], 13);
             });
-        });
 
-        document.querySelectorAll(".view-path").forEach(button => {
-            button.addEventListener("click", function () {
+            trailItem.querySelector(".view-path").addEventListener("click", function () {
                 const trailName = this.dataset.trail;
                 window.location.href = `/trail_path/${trailName}`; // Redirect to trail path page
             });
@@ -175,6 +318,7 @@ document.addEventListener("DOMContentLoaded", function () {
     function addTrailsToMap(trails) {
         trailMarkers.forEach(marker => hikingMap.removeLayer(marker));
         trailMarkers = [];
+        activeMarker = null;
 
         trails.forEach(trail => {
             let marker = L.marker([trail.location_lat, trail.location_long])
@@ -189,6 +333,10 @@ document.addEventListener("DOMContentLoaded", function () {
                     window.location.href = `/trail_path/${encodeURIComponent(trail.name)}`;
                 })
             marker.trailData = trail;
+            if (isActiveTrail(trail)) {
+                marker.setIcon(ACTIVE_ICON);
+                activeMarker = marker;
+            }
             marker.addTo(hikingMap);
             trailMarkers.push(marker);
 
@@ -196,10 +344,6 @@ document.addEventListener("DOMContentLoaded", function () {
         });
     }
 
-    searchInput.addEventListener("input", applyFilters);
-
-    loadTrails();
-
     // Hamburger menu functionality
     const menuButton = document.getElementById('menu-button');
     if (menuButton) {
@@ -300,8 +444,10 @@ document.addEventListener("DOMContentLoaded", function () {
             filterActive = true;
             filterPopup.classList.add('hidden');
             
-            // Apply filters and update display
-            applyFilters();
+            // Reload the trails that match the new difficulty range
+            loadTrails();
+            loadVisibleTrails();
+            runSearch();
         });
     }
 
@@ -316,52 +462,79 @@ document.addEventListener("DOMContentLoaded", function () {
             updateDifficultyDisplay();
             
             // Reset and show all trails
-            applyFilters();
+            loadTrails();
+            loadVisibleTrails();
+            runSearch();
         });
     }
 
-    // Function to apply all filters (search and difficulty)
-    function applyFilters() {
-        const searchQuery = searchInput.value.toLowerCase();
-        
-        const filteredTrails = allTrails.filter(trail => {
-            // Text search filter
-            const matchesSearch = trail.name.toLowerCase().includes(searchQuery);
-            
-            // Difficulty filter
-            let matchesDifficulty = true;
-            if (filterActive) {
-                // Calculate display difficulty (same as in displayTrails)
-                let calculatedDifficulty = null;
-                if (trail.cardio_intensity && trail.technical_difficulty) {
-                    calculatedDifficulty = Math.round(trail.cardio_intensity * 0.6 + trail.technical_difficulty * 0.4);
-                } else if (trail.cardio_intensity) {
-                    calculatedDifficulty = trail.cardio_intensity;
-                } else if (trail.technical_difficulty) {
-                    calculatedDifficulty = trail.technical_difficulty;
-                } else if (trail.difficulty_rating) {
-                    calculatedDifficulty = trail.difficulty_rating;
-                }
-                
-                // If no difficulty available, exclude if filtering is active
-                if (calculatedDifficulty === null) {
-                    matchesDifficulty = false;
-                } else {
-                    matchesDifficulty = calculatedDifficulty >= minDifficulty && calculatedDifficulty <= maxDifficulty;
-                }
+    // results of the API search for the text in the search box, null when empty
+    let searchResults = null;
+    let latestSearch = 0;
+    let searchTimer = null;
+    const SEARCH_DELAY = 150;
+    const SEARCH_LIMIT = 50;
+
+    async function runSearch() {
+        const searchId = ++latestSearch;
+        const query = searchInput.value.trim();
+        if (!query) {
+            searchResults = null;
+            applyFilters();
+            return;
+        }
+
+        const params = new URLSearchParams({ q: query, limit: SEARCH_LIMIT, fields: LIST_FIELDS });
+        if (filterActive) {
+            params.set("min_difficulty", minDifficulty);
+            params.set("max_difficulty", maxDifficulty);
+        }
+
+        try {
+            const response = await fetch(`http://localhost:8000/api/search?${params}`);
+            const result = await response.json();
+
+            // the text changed again while this request was in flight
+            if (searchId !== latestSearch) {
+                return;
             }
-            
-            return matchesSearch && matchesDifficulty;
-        });
-        
-        displayTrails(filteredTrails);
-        addTrailsToMap(filteredTrails);
+
+            searchResults = result.results;
+            applyFilters();
+        } catch (error) {
+            console.error("Error searching trails:", error);
+        }
+    }
+
+    // search once typing pauses, not on every key
+    function scheduleSearch() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(runSearch, SEARCH_DELAY);
     }
 
-    // Update search input to use applyFilters
-    searchInput.addEventListener("input", applyFilters);
+    // Text search filter: keep the trails the API search returned
+    function searchTrails(trails) {
+        if (searchResults === null) {
+            return trails;
+        }
+        const names = new Set(searchResults.map(trail => trail.name));
+        return trails.filter(trail => names.has(trail.name));
+    }
+
+    // Function to apply the search to the loaded trails; the list shows the
+    // ranked search results while there is a query
+    // (difficulty is already filtered by the API in loadTrails, loadVisibleTrails and runSearch)
+    function applyFilters() {
+        displayTrails(searchResults === null ? allTrails : searchResults);
+        addTrailsToMap(searchTrails(visibleTrails));
+    }
+
+    searchInput.addEventListener("input", scheduleSearch);
 
     // Initialize difficulty display
     updateDifficultyDisplay();
 
+    loadTrails();
+    loadVisibleTrails();
+
 });
@@ -14,7 +14,7 @@ let editMode = false;  // Track edit mode status
 
 map.on('click', async function (e) {
     if (!editMode) {
-        const elevation = await fetchElevation(e.latlng.lat, e.latlng.lng);
+        const [elevation] = await fetchElevations([e.latlng]);
         const newMarker = addDraggableMarker(e.latlng);
 
         // Store elevation in (longitude, latitude, elevation) format
@@ -27,15 +27,43 @@ map.on('click', async function (e) {
     }
 });
 
-async function fetchElevation(lat, lng) {
-    const url = `https://api.open-elevation.com/api/v1/lookup?locations=${lat},${lng}`;
+// Look up the elevations of many points in one request to the local DEM,
+// asking open-elevation for any the DEM has no tile for
+async function fetchElevations(latlngs) {
+    let elevations = latlngs.map(() => null);
+    try {
+        const response = await fetch("http://localhost:8000/api/elevation", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ locations: latlngs.map(latlng => [latlng.lat, latlng.lng]) })
+        });
+        const data = await response.json();
+        if (Array.isArray(data.elevations)) {
+            elevations = data.elevations;
+        }
+    } catch (error) {
+        console.error("Error fetching elevation:", error);
+    }
+
+    const missing = latlngs.map((_, i) => i).filter(i => elevations[i] == null);
+    if (missing.length > 0) {
+        const fallback = await fetchOpenElevations(missing.map(i => latlngs[i]));
+        missing.forEach((index, i) => { elevations[index] = fallback[i]; });
+    }
+    return elevations;
+}
+
+// Elevations from the public open-elevation service, in one request
+async function fetchOpenElevations(latlngs) {
+    const locations = latlngs.map(latlng => `${latlng.lat},${latlng.lng}`).join("|");
+    const url = `https://api.open-elevation.com/api/v1/lookup?locations=${locations}`;
     try {
         const response = await fetch(url);
         const data = await response.json();
-        return data.results[0].elevation;
+        return data.results.map(result => result.elevation);
     } catch (error) {
         console.error("Error fetching elevation:", error);
-        return null;  // Return null if the API fails
+        return latlngs.map(() => null);  // Return nulls if the API fails
     }
 }
 
@@ -48,11 +76,9 @@ function addDraggableMarker(latlng) {
 
 // Update route when a marker is dragged
 async function updateRouteFromMarkers() {
-    routePoints = await Promise.all(markers.map(async marker => {
-        const latlng = marker.getLatLng();
-        const elevation = await fetchElevation(latlng.lat, latlng.lng);
-        return [normalizeLongitude(latlng.lng), latlng.lat, elevation];
-    }));
+    const latlngs = markers.map(marker => marker.getLatLng());
+    const elevations = await fetchElevations(latlngs);
+    routePoints = latlngs.map((latlng, i) => [normalizeLongitude(latlng.lng), latlng.lat, elevations[i]]);
     updateRoute();
 }
 
@@ -111,8 +137,11 @@ function exportGeoJSON() {
         return;
     }
 
-    // Keep elevation data in the GeoJSON format
-    const lineCoordinates = routePoints.map(point => [point[0], point[1], point[2]]);
+    // Keep elevation data in the GeoJSON format; a point whose elevation is
+    // unknown is saved as [lng, lat] so analysis can fill it from the DEM
+    const lineCoordinates = routePoints.map(point =>
+        point[2] == null ? [point[0], point[1]] : [point[0], point[1], point[2]]
+    );
 
     const geojson = {
         type: "FeatureCollection",
@@ -49,9 +49,21 @@ document.addEventListener("DOMContentLoaded", async function () {
     const detailsContainer = document.getElementById("trail-details");
     const difficultyContainer = document.getElementById("difficulty-ratings");
 
+    // the API simplifies the path to what is visible at the given zoom level,
+    // and sends it as an encoded polyline instead of coordinate arrays
+    const trailPathUrl = `http://localhost:8000/api/trail_path/${encodeURIComponent(trailName)}`;
+    const fetchTrailPath = async (zoom) => {
+        const response = await fetch(`${trailPathUrl}?zoom=${zoom}&format=polyline`);
+        const data = await response.json();
+        if (data && data.path) {
+            data.coordinates = decodeTrailPath(data.path);
+        }
+        return data;
+    };
+    const initialZoom = trailMap.getZoom();
+
     try {
-        const response = await fetch(`http://localhost:8000/api/trail_path/${encodeURIComponent(trailName)}`);
-        const trailData = await response.json();
+        const trailData = await fetchTrailPath(initialZoom);
 
         if (!trailData || !trailData.coordinates) {
             detailsContainer.innerHTML = `<p><strong>Error:</strong> Trail details not found.</p>`;
@@ -150,7 +162,25 @@ document.addEventListener("DOMContentLoaded", async function () {
         const trailCoords = trailData.coordinates.map(coord => [coord[1], coord[0]]); // Convert [lon, lat] to [lat, lon]
 
         // Draw trail path on the map
-        L.polyline(trailCoords, { color: "blue", weight: 4 }).addTo(trailMap);
+        const trailLine = L.polyline(trailCoords, { color: "blue", weight: 4 }).addTo(trailMap);
+
+        // fetch a more (or less) detailed path whenever the zoom level changes
+        const pathsByZoom = new Map([[initialZoom, trailCoords]]);
+        trailMap.on("zoomend", async function () {
+            const zoom = trailMap.getZoom();
+            try {
+                if (!pathsByZoom.has(zoom)) {
+                    const zoomData = await fetchTrailPath(zoom);
+                    pathsByZoom.set(zoom, zoomData.coordinates.map(coord => [coord[1], coord[0]]));
+                }
+                // ignore responses that arrive after the user zoomed again
+                if (zoom === trailMap.getZoom()) {
+                    trailLine.setLatLngs(pathsByZoom.get(zoom));
+                }
+            } catch (error) {
+                console.error("Error fetching simplified trail path:", error);
+            }
+        });
 
         // add elevation marker points if elevation data is available
         if (trailData.coordinates.some(coord => coord.length > 2)) {
@@ -175,7 +205,7 @@ document.addEventListener("DOMContentLoaded", async function () {
         // add elevation profile if the container exists
         const elevationProfileContainer = document.getElementById("elevation-profile");
         if (elevationProfileContainer && trailData.coordinates.some(coord => coord.length > 2)) {
-            createElevationProfile(trailData.coordinates, elevationProfileContainer);
+            createElevationProfile(trailPathUrl, elevationProfileContainer);
         }
 
     } catch (error) {
@@ -184,35 +214,112 @@ document.addEventListener("DOMContentLoaded", async function () {
     }
 });
 
-// function to create elevation profile chart
-function createElevationProfile(coordinates, container) {
-    // extract distances and elevations
-    const elevations = [];
-    const distances = [];
-    let totalDistance = 0;
-    
-    for (let i = 0; i < coordinates.length; i++) {
-        const coord = coordinates[i];
-        if (coord.length > 2) {
-            elevations.push(coord[2]);
-            
-            // calculate distance (simple accumulation for visualization purposes)
-            if (i > 0) {
-                const prevCoord = coordinates[i-1];
-                // simple euclidean distance for demonstration
-                const dist = Math.sqrt(
-                    Math.pow(coord[0] - prevCoord[0], 2) + 
-                    Math.pow(coord[1] - prevCoord[1], 2)
-                ) * 111000; // very rough conversion to meters (111km per degree)
-                totalDistance += dist;
-            }
-            distances.push(totalDistance / 1000); // convert to km
+// decode a Google encoded polyline into rows of `dims` numbers
+function decodePolyline(encoded, dims, precision) {
+    const factor = Math.pow(10, precision);
+    const rows = [];
+    const current = new Array(dims).fill(0);
+    let column = 0;
+    let index = 0;
+
+    while (index < encoded.length) {
+        let result = 0;
+        let shift = 0;
+        let byte;
+        do {
+            byte = encoded.charCodeAt(index++) - 63;
+            result += (byte & 0x1f) * Math.pow(2, shift); // avoids 32-bit overflow
+            shift += 5;
+        } while (byte >= 0x20);
+
+        current[column] += (result % 2) ? -(result + 1) / 2 : result / 2;
+        column++;
+        if (column === dims) {
+            rows.push(current.map(value => value / factor));
+            column = 0;
         }
     }
-    
+    return rows;
+}
+
+// undo delta encoding: a first value followed by differences
+function decodeDeltas(deltas, precision) {
+    const factor = Math.pow(10, precision);
+    let value = 0;
+    return deltas.map(delta => (value += delta) / factor);
+}
+
+// turn a compact "path" from the API back into [lon, lat, ele] coordinates
+function decodeTrailPath(path) {
+    let longitudes, latitudes, elevations = null;
+
+    if (path.format === "polyline") {
+        const points = decodePolyline(path.points, 2, path.precision);
+        latitudes = points.map(point => point[0]);
+        longitudes = points.map(point => point[1]);
+        if (path.elevation !== undefined) {
+            elevations = decodePolyline(path.elevation, 1, path.elevation_precision).map(row => row[0]);
+        }
+    } else if (path.format === "delta") {
+        longitudes = decodeDeltas(path.longitude, path.precision);
+        latitudes = decodeDeltas(path.latitude, path.precision);
+        if (path.elevation !== undefined) {
+            elevations = decodeDeltas(path.elevation, path.elevation_precision);
+        }
+    } else {
+        throw new Error(`Unknown path format: ${path.format}`);
+    }
+
+    return longitudes.map((lon, i) => elevations ? [lon, latitudes[i], elevations[i]] : [lon, latitudes[i]]);
+}
+
+// show the statistics of the stretch between two distances (km) on the trail;
+// the API answers from precomputed prefix sums, so this is cheap to repeat
+async function showRangeStats(trailPathUrl, startKm, endKm) {
+    const container = document.getElementById("range-stats");
+    if (!container) return;
+
+    const params = new URLSearchParams({ start: startKm * 1000, end: endKm * 1000 });
+    try {
+        const response = await fetch(`${trailPathUrl}/range?${params}`);
+        const stats = await response.json();
+        container.innerHTML = `
+            <p><strong>Stretch:</strong> ${startKm.toFixed(2)} - ${endKm.toFixed(2)} km</p>
+            <p><strong>Length:</strong> ${stats.length.toFixed(2)} km</p>
+            <p><strong>Elevation Gain:</strong> ${stats.elevation_gain.toFixed(0)} m</p>
+            <p><strong>Elevation Loss:</strong> ${stats.elevation_loss.toFixed(0)} m</p>
+            <p><strong>Elevation Range:</strong> ${stats.min_elevation.toFixed(0)} - ${stats.max_elevation.toFixed(0)} m</p>
+            <p><strong>Max Slope:</strong> ${stats.max_slope.toFixed(1)}%</p>
+        `;
+    } catch (error) {
+        console.error("Error fetching trail range stats:", error);
+    }
+}
+
+// points requested for the elevation profile, plenty for a sidebar chart
+const PROFILE_POINTS = 300;
+
+// function to create elevation profile chart
+async function createElevationProfile(trailPathUrl, container) {
+    // the API sends a distance/elevation series already downsampled to keep
+    // the profile's shape, instead of the chart deriving it from the path
+    let profile;
+    try {
+        const response = await fetch(`${trailPathUrl}/profile?points=${PROFILE_POINTS}`);
+        profile = await response.json();
+    } catch (error) {
+        console.error("Error fetching elevation profile:", error);
+        return;
+    }
+    const distances = profile.distance.map(distance => distance / 1000); // convert to km
+    const elevations = profile.elevation;
+
     // create the chart
     const ctx = document.createElement('canvas');
     container.appendChild(ctx);
+
+    // clicking two points on the profile selects the stretch between them
+    let rangeStart = null;
     
     new Chart(ctx, {
         type: 'line',
@@ -230,6 +337,18 @@ function createElevationProfile(coordinates, container) {
         options: {
             responsive: true,
             maintainAspectRatio: false,
+            onClick: (event, elements, chart) => {
+                const points = chart.getElementsAtEventForMode(event, 'index', { intersect: false }, true);
+                if (!points.length) return;
+
+                const distance = distances[points[0].index];
+                if (rangeStart === null) {
+                    rangeStart = distance;
+                } else {
+                    showRangeStats(trailPathUrl, Math.min(rangeStart, distance), Math.max(rangeStart, distance));
+                    rangeStart = null;
+                }
+            },
             scales: {
                 x: {
                     title: {
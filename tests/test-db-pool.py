@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Test for the API's pooled read-only SQLite connections.
+This script:
+1. Copies data/trails.db to a temporary directory and switches it to WAL
+2. Checks connections are reused, read-only, and dropped when the file
+   is replaced
+3. Times a trail lookup with a new connection per request vs the pool
+4. Checks the API migrates a database that was never migrated before its
+   first request, so the index-backed endpoints work when it is imported
+
+Usage:
+    python test-db-pool.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from utils import get_db_path
+from utils.db_pool import ConnectionPool, enable_wal
+from utils.tile_cache import DiskTileCache
+
+REQUESTS = 2000
+QUERY = "SELECT * FROM trails t JOIN difficulty_ratings d USING (trail_id) WHERE t.trail_id = ?"
+
+
+def check_pool(db_path):
+    pool = ConnectionPool(db_path)
+
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA mmap_size").fetchone()[0] > 0
+    pool.release(conn)
+    assert pool.acquire() is conn, "idle connection was not reused"
+
+    try:
+        conn.execute("DELETE FROM trails")
+        raise AssertionError("pooled connection accepted a write")
+    except sqlite3.OperationalError:
+        pass
+    pool.release(conn)
+
+    # a rebuilt database is a new file, old connections must not be reused
+    shutil.copy(db_path, db_path + ".new")
+    os.replace(db_path + ".new", db_path)
+    assert pool.acquire() is not conn, "connection to a replaced file was reused"
+    print("Pool OK")
+
+
+def time_lookups(db_path):
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute(QUERY, (i % 40 + 1,)).fetchone()
+        conn.close()
+    connect_time = time.perf_counter() - start
+
+    pool = ConnectionPool(db_path)
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        conn = pool.acquire()
+        conn.execute(QUERY, (i % 40 + 1,)).fetchone()
+        pool.release(conn)
+    pool_time = time.perf_counter() - start
+    pool.close_all()
+
+    print(f"{REQUESTS} lookups")
+    print(f"Connect per request: {connect_time:.3f}s")
+    print(f"Pooled connections:  {pool_time:.3f}s")
+    print(f"Speedup:             {connect_time / pool_time:.1f}x")
+
+
+def check_api_migrates(tmp):
+    db_path = os.path.join(tmp, "unmigrated.db")
+    shutil.copy(get_db_path(), db_path)
+    api.api.get_db_path = lambda: db_path
+    api.api.tile_cache = DiskTileCache(os.path.join(tmp, "tiles"))
+    client = api.api.app.test_client()
+
+    for url in (
+        "/api/search?q=butte",
+        "/api/trails/within?bbox=-124,43,-122,45",
+        "/api/trails/nearest?lat=44&lon=-123",
+        "/tiles/10/162/372",
+    ):
+        response = client.get(url)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+    print("API migrates the database before its first request")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        assert enable_wal(db_path) == "wal"
+
+        check_pool(db_path)
+        time_lookups(db_path)
+        check_api_migrates(tmp)
+
+
+if __name__ == "__main__":
+    main()
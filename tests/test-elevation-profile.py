@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Test for the downsampled elevation profile.
+This script:
+1. Checks lttb_indices keeps the endpoints and returns the requested number
+   of increasing indices
+2. Checks LTTB keeps a trail's highest and lowest points better than taking
+   every n-th vertex
+3. Checks /api/trail_path/<name>/profile on a migrated copy of data/trails.db,
+   before and after add_trails stores the standard profiles
+4. Prints the size of a profile response vs the full trail path
+
+Usage:
+    python test-elevation-profile.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from urllib.parse import quote
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from core.profile import PROFILE_RESOLUTIONS, elevation_profile, lttb_indices
+from core.trail import Trail
+from data import add_trails
+from data.init_db import migrate
+from utils import get_db_path, get_trail_files
+from utils.cache import LRUCache
+
+POINTS = 300
+
+
+def trail_files():
+    directory = get_trail_files()
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".geojson")
+    )
+
+
+def check_lttb():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(0.5, 2.0, 1000))
+    y = np.cumsum(rng.normal(size=1000))
+    for threshold in (2, 3, 10, 100, 999):
+        indices = lttb_indices(x, y, threshold)
+        assert len(indices) == threshold, threshold
+        assert indices[0] == 0 and indices[-1] == len(x) - 1
+        assert np.all(np.diff(indices) > 0), threshold
+
+    # short series are returned whole
+    assert list(lttb_indices(x[:5], y[:5], 10)) == list(range(5))
+    assert list(lttb_indices(x[:2], y[:2], 2)) == [0, 1]
+    assert len(lttb_indices(x[:0], y[:0], 10)) == 0
+
+    # a single spike survives heavy downsampling
+    spike = np.zeros(1000)
+    spike[437] = 50.0
+    assert 437 in lttb_indices(x, spike, 20)
+    print("lttb_indices keeps endpoints and spikes")
+
+
+def check_shape(trails):
+    lttb_error = stride_error = 0.0
+    for trail in trails:
+        geometry = trail.geometry
+        if len(geometry) <= POINTS:
+            continue
+        profile = elevation_profile(geometry, POINTS)
+        assert len(profile) == POINTS, trail.name
+        assert np.all(np.diff(profile[:, 0]) >= 0), trail.name
+        assert profile[0, 0] == geometry.distance[0]
+        assert profile[-1, 0] == geometry.distance[-1]
+
+        stride = geometry.elevation[:: -(-len(geometry) // POINTS)]
+        span = np.ptp(geometry.elevation)
+        lttb_error += span - np.ptp(profile[:, 1])
+        stride_error += span - np.ptp(stride)
+    assert lttb_error <= stride_error
+    print(
+        f"Elevation range lost over {len(trails)} trails: "
+        f"LTTB {lttb_error:.1f}m, every n-th vertex {stride_error:.1f}m"
+    )
+
+
+def fetch_profiles(client, trails, points):
+    profiles = {}
+    for trail in trails:
+        response = client.get(
+            f"/api/trail_path/{quote(trail.name)}/profile?points={points}"
+        )
+        assert response.status_code == 200, trail.name
+        profiles[trail.name] = response.get_json()
+    return profiles
+
+
+def check_endpoint(trails):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        conn.close()
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+
+        # without stored profiles every size is built from the path
+        built = fetch_profiles(client, trails, POINTS)
+        for trail in trails:
+            data = built[trail.name]
+            assert data["name"] == trail.name
+            assert data["points"] == min(POINTS, len(trail.geometry))
+            assert len(data["distance"]) == len(data["elevation"]) == data["points"]
+            assert np.all(np.diff(data["distance"]) >= 0), trail.name
+            assert abs(data["distance"][-1] - trail.geometry.distance[-1]) < 0.1
+
+        # after ingest the standard sizes are read back from trail_profile
+        with contextlib.redirect_stdout(io.StringIO()):
+            add_trails.main(["--db", db_path, "--workers", "1"])
+        conn = sqlite3.connect(db_path)
+        stored = conn.execute("SELECT COUNT(*) FROM trail_profile").fetchone()[0]
+        conn.close()
+        assert stored == len(trails) * len(PROFILE_RESOLUTIONS)
+        api.api.profile_cache = LRUCache(8 * 1024 * 1024)
+        load_trail_path = api.api.load_trail_path
+        api.api.load_trail_path = None  # fails if a profile is built instead
+        assert fetch_profiles(client, trails, POINTS) == built
+        api.api.load_trail_path = load_trail_path
+
+        name = quote(trails[0].name)
+        url = f"/api/trail_path/{name}/profile"
+        response = client.get(url)
+        repeat = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        assert repeat.status_code == 304
+
+        assert client.get(url + "?points=1").get_json()["points"] == 2
+        assert client.get(url + "?points=abc").status_code == 400
+        missing = client.get("/api/trail_path/No%20Such%20Trail/profile")
+        assert missing.status_code == 404
+
+        longest = max(trails, key=lambda trail: len(trail.geometry))
+        name = quote(longest.name)
+        profile = client.get(f"/api/trail_path/{name}/profile?points={POINTS}")
+        path = client.get(f"/api/trail_path/{name}")
+        print(
+            f"{longest.name} ({len(longest.geometry)} vertices): profile "
+            f"{len(profile.data)} bytes, trail path {len(path.data)} bytes"
+        )
+    print(f"/api/trail_path/<name>/profile checked for {len(trails)} trails")
+
+
+def main():
+    check_lttb()
+    trails = [Trail(path) for path in trail_files()]
+    check_shape(trails)
+    check_endpoint(trails)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+Test for the local DEM elevation lookups and the /api/elevation endpoint.
+This script:
+1. Writes synthetic SRTM .hgt tiles to a temporary directory
+2. Checks bilinear samples against the known surface, including void cells
+   and points outside every tile
+3. Checks samples are memoized and open tiles are bounded by max_tiles
+4. Checks /api/elevation answers a batch in order and rejects bad input
+5. Checks GeoJSON vertices saved without elevation are filled from the DEM
+6. Prints the time taken for one batched request vs one request per point
+
+Usage:
+    python test-elevation.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+import core.dem
+from core.dem import HGT_DTYPE, HGT_VOID, ElevationModel, tile_name
+from core.trail import Trail
+from utils import get_db_path
+
+# cells per tile side; real 3 arc-second tiles have 1201
+SIDE = 121
+
+
+def plane(lat, lon):
+    """The surface written to the N44W124 tile, exact at every cell"""
+    return 500 + 1200 * (lat - 44) + 120 * (lon + 124)
+
+
+def write_tiles(directory):
+    rows, cols = np.mgrid[0:SIDE, 0:SIDE]
+    lat = 45 - rows / (SIDE - 1)
+    lon = -124 + cols / (SIDE - 1)
+    np.rint(plane(lat, lon)).astype(HGT_DTYPE).tofile(
+        os.path.join(directory, tile_name(44, -124))
+    )
+
+    # a flat tile to the east with a void block near its south-west corner
+    flat = np.full((SIDE, SIDE), 2000, dtype=HGT_DTYPE)
+    flat[-3:, :3] = HGT_VOID
+    flat.tofile(os.path.join(directory, tile_name(44, -123)))
+
+    # files that are not tiles are ignored
+    open(os.path.join(directory, "readme.txt"), "w").close()
+
+
+def check_sampling(directory):
+    model = ElevationModel(directory)
+    assert set(model.available_tiles()) == {(44, -124), (44, -123)}
+
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(44, 45, 1000)
+    lons = rng.uniform(-124, -123, 1000)
+    sampled = model.sample(lats, lons)
+    assert np.allclose(sampled, plane(lats, lons), atol=1e-6)
+
+    # cells around the void block renormalize, inside it nothing is known
+    step = 1 / (SIDE - 1)
+    near_void = model.sample([44 + 2.5 * step], [-123 + 2.5 * step])
+    assert near_void[0] == 2000
+    assert np.isnan(model.sample([44 + 0.5 * step], [-123 + 0.5 * step])[0])
+
+    # outside every tile
+    assert np.isnan(model.sample([10.5, 44.5], [10.5, -100.5])).all()
+    error = np.abs(sampled - plane(lats, lons)).max()
+    print(f"Sampled {len(lats)} points, max error {error:.2e}m")
+
+
+def check_caches(directory):
+    model = ElevationModel(directory, max_tiles=1, memo_size=100)
+    lats = np.linspace(44.1, 44.9, 50)
+
+    model.sample(lats, np.full(50, -123.5))
+    assert len(model._memo) == 50 and len(model._tiles) == 1
+    model.sample(lats, np.full(50, -122.5))
+    assert len(model._tiles) == 1, "more tiles open than max_tiles"
+    assert len(model._memo) == 100
+
+    # memoized samples need no tile at all
+    model._available = {}
+    again = model.sample(lats, np.full(50, -122.5))
+    assert np.all(again == 2000)
+
+    coords = np.array([[-123.5, 44.5, np.nan], [-123.5, 44.5, 123.0]])
+    ElevationModel(directory).fill_missing(coords)
+    assert np.isclose(coords[0, 2], plane(44.5, -123.5)) and coords[1, 2] == 123.0
+    print("Memo and tile caches stay within their limits")
+
+
+def check_endpoint(client):
+    locations = [[44.5, -123.5], [44.5, -122.5], [10.0, 10.0]]
+    response = client.post("/api/elevation", json={"locations": locations})
+    assert response.status_code == 200
+    assert response.get_json()["elevations"] == [
+        round(plane(44.5, -123.5), 1),
+        2000.0,
+        None,
+    ]
+
+    empty = client.post("/api/elevation", json={"locations": []})
+    assert empty.get_json() == {"elevations": []}
+
+    for body in (
+        {},
+        [1],
+        "x",
+        None,
+        {"locations": "44,-123"},
+        {"locations": [[44.5]]},
+        {"locations": [[44.5, -123.5, 10]]},
+        {"locations": [["a", "b"]]},
+        {"locations": [[91, 0]]},
+        {"locations": [[0, 181]]},
+        {"locations": [[0, 0]] * (api.api.MAX_ELEVATION_POINTS + 1)},
+    ):
+        assert client.post("/api/elevation", json=body).status_code == 400, body
+    print("/api/elevation answers batches and rejects bad input")
+
+
+def check_trail(tmp):
+    lons = np.linspace(-123.9, -123.1, 20)
+    lats = np.linspace(44.1, 44.9, 20)
+    line = [[lon, lat] for lon, lat in zip(lons, lats)]
+    line[5].append(42.0)  # one vertex already has an elevation
+    line.append([0.5, 0.5])  # outside every tile, dropped
+    path = os.path.join(tmp, "flat_trail.geojson")
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "geometry": {"type": "LineString", "coordinates": line},
+                        "properties": {},
+                    }
+                ],
+            },
+            f,
+        )
+
+    trail = Trail(path)
+    expected = plane(lats, lons)
+    expected[5] = 42.0
+    assert len(trail.geometry) == 20
+    assert np.allclose(trail.geometry.elevation, expected, atol=1e-6)
+    assert trail.elevation_gain > 0
+    print(f"2D trail filled from the DEM, gain {trail.elevation_gain:.0f}m")
+
+
+def compare_batching(client, directory, count=200):
+    lats = np.linspace(44.1, 44.9, count)
+    lons = np.linspace(-123.9, -123.1, count)
+    locations = [[lat, lon] for lat, lon in zip(lats, lons)]
+
+    core.dem._default_model = ElevationModel(directory)
+    start = time.perf_counter()
+    for location in locations:
+        client.post("/api/elevation", json={"locations": [location]})
+    single = time.perf_counter() - start
+
+    core.dem._default_model = ElevationModel(directory)
+    start = time.perf_counter()
+    response = client.post("/api/elevation", json={"locations": locations})
+    batched = time.perf_counter() - start
+    assert len(response.get_json()["elevations"]) == count
+    print(
+        f"{count} points: one request each {single * 1000:.1f}ms, "
+        f"one batch {batched * 1000:.1f}ms"
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, "dem")
+        os.makedirs(directory)
+        write_tiles(directory)
+
+        check_sampling(directory)
+        check_caches(directory)
+
+        # the API migrates the database it serves, so leave data/trails.db be
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        api.api.get_db_path = lambda: db_path
+
+        core.dem._default_model = ElevationModel(directory)
+        client = api.api.app.test_client()
+        check_endpoint(client)
+        check_trail(tmp)
+        compare_batching(client, directory)
+        core.dem._default_model = None
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Test for HTTP caching and compression on the API.
+This script:
+1. Requests /api/trails and a trail path with gzip accepted
+2. Checks the bodies are compressed and carry ETag, Last-Modified and
+   Cache-Control headers
+3. Checks repeating a request with If-None-Match or If-Modified-Since
+   returns an empty 304
+4. Checks a different representation of the same trail gets a new ETag
+5. Checks a 304 repeats the ETag of the 200 it validates, for compressed
+   and uncompressed bodies alike
+
+Usage:
+    python test-http-cache.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from utils import get_db_path
+
+
+def check_revalidation(client, url):
+    first = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200, f"{url}: {first.status_code}"
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert first.headers["Cache-Control"] == "public, no-cache"
+    assert "Accept-Encoding" in first.headers["Vary"]
+    json.loads(gzip.decompress(first.data))
+
+    etag = first.headers["ETag"]
+    repeat = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert repeat.status_code == 304 and repeat.data == b"", url
+    assert repeat.headers["ETag"] == etag
+
+    since = client.get(
+        url, headers={"If-Modified-Since": first.headers["Last-Modified"]}
+    )
+    assert since.status_code == 304, url
+
+    print(
+        f"{url}: {len(gzip.decompress(first.data))} bytes, "
+        f"{len(first.data)} gzipped, 304 on repeat"
+    )
+    return etag
+
+
+def check_validator_echo(client, name):
+    """A 304 carries the ETag of the 200 it validates, whatever the encoding"""
+    # too small to compress, so the 200 has the bare ETag
+    small = f"/api/trail_path/{name}/range?start=0&end=100"
+    first = client.get(small, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in first.headers
+    repeat = client.get(
+        small,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["ETag"]},
+    )
+    assert repeat.status_code == 304
+    assert repeat.headers["ETag"] == first.headers["ETag"], small
+
+    # compressed, revalidated by a client that no longer asks for gzip
+    large = f"/api/trail_path/{name}"
+    first = client.get(large, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == "gzip"
+    repeat = client.get(large, headers={"If-None-Match": first.headers["ETag"]})
+    assert repeat.status_code == 304
+    assert repeat.headers["ETag"] == first.headers["ETag"], large
+    print("304 responses repeat the validator of their 200")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        # the API migrates the database it serves, so leave data/trails.db be
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+
+        check_revalidation(client, "/api/trails")
+
+        name = client.get("/api/trails").get_json()["trails"][0]["name"]
+        etag = check_revalidation(client, f"/api/trail_path/{name}")
+
+        other = client.get(
+            f"/api/trail_path/{name}?format=polyline",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        )
+        assert other.status_code == 200 and other.headers["ETag"] != etag
+
+        check_validator_echo(client, name)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Import-time benchmark for core.trail.
+This script:
+1. Imports core.trail in fresh interpreters several times
+2. Fails if any slow optional dependency (geopandas, folium, ...) got loaded
+3. Fails if the best cold-start time is over the budget
+4. Fails if a file with a malformed waypoint is parsed with the GeoDataFrame
+   fallback (which loads them) instead of skipping the waypoint
+
+Usage:
+    python test-import-time.py [budget_seconds]
+
+The budget defaults to 0.35s and can also be set with TRAILGRADE_IMPORT_BUDGET.
+Make sure to run this from the tests/ directory.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+RUNS = 5
+DEFAULT_BUDGET = 0.35
+
+# modules that must only be imported by map rendering / CRS reprojection
+HEAVY_MODULES = ["geopandas", "folium", "branca", "pandas", "shapely", "pyogrio"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import core.trail
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+# a trail with a good line, a good waypoint and two malformed ones
+MALFORMED_WAYPOINTS = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[-123.1, 44.0, 100.0], [-123.0, 44.1, 150.0]],
+            }
+        },
+        {"geometry": {"type": "Point", "coordinates": [-123.05, 44.05]}},
+        {"geometry": {"type": "Point", "coordinates": [-123.05]}},
+        {"geometry": {"type": "Point", "coordinates": None}},
+    ],
+}
+
+PARSE_PROBE = """
+import json, sys
+from core.trail import Trail
+trail = Trail({path!r})
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{
+    "vertices": len(trail.geometry),
+    "waypoints": len(trail.geometry.waypoints),
+    "heavy": heavy,
+}}))
+"""
+
+
+def run_probe(probe):
+    """Run a probe script in a new interpreter and return its JSON result."""
+    output = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=project_root,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_import():
+    """Import core.trail in a new interpreter and report time and heavy modules."""
+    return run_probe(PROBE.format(heavy=HEAVY_MODULES))
+
+
+def parse_malformed_waypoints():
+    """Parse a file with bad waypoints in a new interpreter."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "Malformed Waypoints.geojson")
+        with open(path, "w") as f:
+            json.dump(MALFORMED_WAYPOINTS, f)
+        return run_probe(PARSE_PROBE.format(path=path, heavy=HEAVY_MODULES))
+
+
+def main():
+    """Run the benchmark and exit non-zero on a regression."""
+    if len(sys.argv) > 1:
+        budget = float(sys.argv[1])
+    else:
+        budget = float(os.environ.get("TRAILGRADE_IMPORT_BUDGET", DEFAULT_BUDGET))
+
+    results = [measure_import() for _ in range(RUNS)]
+    best = min(r["elapsed"] for r in results)
+    heavy = sorted({m for r in results for m in r["heavy"]})
+
+    print(f"import core.trail: best {best:.3f}s over {RUNS} runs (budget {budget}s)")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if best > budget:
+        print(f"FAIL: cold start is over budget by {best - budget:.3f}s")
+        failed = True
+
+    parsed = parse_malformed_waypoints()
+    if parsed["heavy"] or (parsed["vertices"], parsed["waypoints"]) != (2, 1):
+        print(f"FAIL: malformed waypoints were not skipped on their own: {parsed}")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""
+Test for incremental ingestion with the ingest manifest.
+This script:
+1. Ingests a second directory of trail files into a copy of data/trails.db
+   and checks the trails from storage/trail_files are left alone
+2. Checks unchanged and touched files are skipped and edited files are
+   re-analyzed in place, keeping their notes, and a file edited down to no
+   path loses its stored geometry and R-tree entry
+3. Checks removed files are pruned only from the scanned directory,
+   including trails stored before the manifest existed, and kept with
+   --no-prune
+4. Checks a trail that fails to store is skipped without losing the rest
+   of its batch, and --tune-pragmas leaves the journal mode as it was
+
+Usage:
+    python test-ingest-manifest.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+from data import add_trails
+from data.init_db import migrate
+from utils import get_db_path, get_trail_files, resolve_trail_path
+
+SOURCE_FILES = ["Alton Baker Nature Loop.geojson", "Spencer Butte Trail.geojson"]
+
+
+def ingest(db_path, *args):
+    """Run add_trails and return the numbers from its summary line"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        add_trails.main(["--db", db_path, "--workers", "1", *args])
+    summary = output.getvalue().strip().splitlines()[-1]
+    counts = dict(part.split(": ") for part in summary.split(", "))
+    return {name: int(value) for name, value in counts.items()}
+
+
+def trail_ids(conn):
+    return dict(conn.execute("SELECT name, trail_id FROM trails").fetchall())
+
+
+def note_count(conn, trail_id):
+    return conn.execute(
+        "SELECT COUNT(*) FROM trail_notes WHERE trail_id = ?", (trail_id,)
+    ).fetchone()[0]
+
+
+def add_note(conn, trail_id, text):
+    conn.execute(
+        "INSERT INTO trail_notes (trail_id, note_text) VALUES (?, ?)",
+        (trail_id, text),
+    )
+    conn.commit()
+
+
+def copy_trail(source, directory, name):
+    path = os.path.join(directory, f"{name}.geojson")
+    shutil.copy(os.path.join(get_trail_files(), source), path)
+    return path
+
+
+def child_rows(conn, trail_id):
+    return [
+        conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE trail_id = ?", (trail_id,)
+        ).fetchone()[0]
+        for table in ("trail_geometry", "trail_geometry_lod", "trail_rtree")
+    ]
+
+
+def check_removal():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        other = os.path.join(tmp, "other")
+        os.mkdir(other)
+        first = copy_trail(SOURCE_FILES[0], other, "Manifest Test A")
+        second = copy_trail(SOURCE_FILES[1], other, "Manifest Test B")
+
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        # manifest entries used to be keyed on the file name
+        legacy_name = SOURCE_FILES[0]
+        conn.execute(
+            "INSERT INTO ingest_manifest (geojson_path, size, mtime_ns) VALUES (?, 0, 0)",
+            (legacy_name,),
+        )
+        # a trail stored before the manifest existed, whose file is gone
+        gone = conn.execute(
+            "INSERT INTO trails (name, geojson_path) VALUES (?, ?)",
+            ("Gone Trail", os.path.join(other, "Gone Trail.geojson")),
+        ).lastrowid
+        conn.commit()
+        migrate(conn)
+        keys = [
+            row[0] for row in conn.execute("SELECT geojson_path FROM ingest_manifest")
+        ]
+        assert keys == [resolve_trail_path(legacy_name)], keys
+        conn.execute("DELETE FROM ingest_manifest")
+        conn.commit()
+
+        original = trail_ids(conn)
+        for trail_id in original.values():
+            add_note(conn, trail_id, "user note")
+
+        # a second directory only adds its trails and prunes its own
+        counts = ingest(db_path, "--directory", other)
+        assert (counts["written"], counts["removed"]) == (2, 1), counts
+        ids = trail_ids(conn)
+        assert "Gone Trail" not in ids
+        for name, trail_id in original.items():
+            if trail_id != gone:
+                assert ids[name] == trail_id, name
+                assert note_count(conn, trail_id) == 1, name
+        stored = conn.execute(
+            "SELECT geojson_path FROM trails WHERE trail_id = ?",
+            (ids["Manifest Test A"],),
+        ).fetchone()[0]
+        assert stored == resolve_trail_path(first), stored
+        print("Ingesting another directory leaves other trails alone")
+
+        # unchanged and touched files are skipped
+        counts = ingest(db_path, "--directory", other)
+        assert (counts["unchanged"], counts["written"]) == (2, 0), counts
+        os.utime(first, ns=(0, 1_000_000_000))
+        counts = ingest(db_path, "--directory", other)
+        assert (counts["unchanged"], counts["written"]) == (2, 0), counts
+        mtime_ns = conn.execute(
+            "SELECT mtime_ns FROM ingest_manifest WHERE geojson_path = ?",
+            (resolve_trail_path(first),),
+        ).fetchone()[0]
+        assert mtime_ns == 1_000_000_000
+        print("Unchanged and touched files are skipped")
+
+        # an edited file is re-analyzed under the same trail_id
+        add_note(conn, ids["Manifest Test B"], "keep me")
+        with open(second) as f:
+            data = json.load(f)
+        data["features"][0].setdefault("properties", {})["edited"] = True
+        with open(second, "w") as f:
+            json.dump(data, f)
+        counts = ingest(db_path, "--directory", other)
+        assert (counts["unchanged"], counts["written"]) == (1, 1), counts
+        assert trail_ids(conn)["Manifest Test B"] == ids["Manifest Test B"]
+        assert note_count(conn, ids["Manifest Test B"]) == 1
+        print("Edited files are updated in place")
+
+        # a path emptied by an edit takes the old geometry with it
+        assert child_rows(conn, ids["Manifest Test A"]) == [1, 1, 1]
+        empty = {"type": "LineString", "coordinates": []}
+        with open(first, "w") as f:
+            json.dump(
+                {"type": "FeatureCollection", "features": [{"geometry": empty}]}, f
+            )
+        counts = ingest(db_path, "--directory", other)
+        assert counts["written"] == 1, counts
+        assert trail_ids(conn)["Manifest Test A"] == ids["Manifest Test A"]
+        point_count = conn.execute(
+            "SELECT point_count FROM trail_geometry WHERE trail_id = ?",
+            (ids["Manifest Test A"],),
+        ).fetchone()
+        assert point_count in (None, (0,)), point_count
+        assert child_rows(conn, ids["Manifest Test A"])[2] == 0
+        print("Files edited down to no path lose their geometry")
+
+        # scanning storage/trail_files adopts its trails and keeps the others
+        counts = ingest(db_path)
+        assert (counts["written"], counts["removed"]) == (len(original) - 1, 0)
+        ids = trail_ids(conn)
+        assert {"Manifest Test A", "Manifest Test B"} <= set(ids)
+
+        # removed files are pruned, unless --no-prune is given
+        os.remove(second)
+        counts = ingest(db_path, "--directory", other, "--no-prune")
+        assert counts["removed"] == 0 and "Manifest Test B" in trail_ids(conn)
+        counts = ingest(db_path, "--directory", other)
+        assert counts["removed"] == 1, counts
+        ids = trail_ids(conn)
+        assert "Manifest Test B" not in ids and "Manifest Test A" in ids
+        assert len(ids) == len(original)
+        conn.close()
+        print("Removed files are pruned from the scanned directory only")
+
+
+def check_failed_trail():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        original = trail_ids(conn)
+
+        # the first file's name is already taken by a trail in storage
+        other = os.path.join(tmp, "other")
+        os.mkdir(other)
+        copy_trail(SOURCE_FILES[0], other, os.path.splitext(SOURCE_FILES[0])[0])
+        copy_trail(SOURCE_FILES[1], other, "Manifest Test C")
+        counts = ingest(db_path, "--directory", other, "--tune-pragmas")
+        assert counts["written"] == 1, counts
+
+        ids = trail_ids(conn)
+        assert len(ids) == len(original) + 1 and "Manifest Test C" in ids
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == journal_mode
+        conn.close()
+    print("A trail that fails to store does not lose the rest of its batch")
+
+
+def main():
+    check_removal()
+    check_failed_trail()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
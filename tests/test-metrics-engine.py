@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Benchmark for the single-pass metrics engine.
+This script:
+1. Loads every trail in storage/trail_files
+2. Recomputes each statistic with the original one-loop-per-metric code
+3. Checks the engine in core/metrics.py gives the same output
+4. Prints the time taken by both implementations
+
+Usage:
+    python test-metrics-engine.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import math
+import os
+import statistics
+import sys
+import time
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+from core.metrics import compute_metrics
+from core.trail import Trail
+
+SEGMENT_LENGTHS = [0.1, 0.25, 0.5, 1.0, 2.0]
+REPEATS = 20
+
+
+def legacy_trail_metrics(points, segment_length):
+    """The per-metric loops Trail and TrailSegment used before the engine."""
+    length = points[-1].distance_from_start / 1000.0 if points else 0.0
+
+    increase, decrease = 0.0, 0.0
+    for i in range(1, len(points)):
+        elev_diff = points[i].elevation - points[i - 1].elevation
+        if elev_diff > 0:
+            increase += elev_diff
+        else:
+            decrease += elev_diff
+
+    elevations = [p.elevation for p in points]
+    variance = statistics.variance(elevations) if len(elevations) > 1 else 0.0
+    if variance > 80:
+        variance = statistics.stdev(elevations)
+
+    avg_slope = (increase / (length * 1000)) * 100 if length else 0.0
+
+    max_slope = 0.0
+    for i in range(1, len(points)):
+        distance = points[i].distance_from_start - points[i - 1].distance_from_start
+        if distance < 5.0 or distance == 0:
+            continue
+        slope = abs((points[i].elevation - points[i - 1].elevation) / distance) * 100
+        max_slope = max(max_slope, slope)
+
+    segments = []
+    segment_points = []
+    segment_start_distance = 0
+    for i, point in enumerate(points):
+        segment_points.append(point)
+        current = (point.distance_from_start - segment_start_distance) / 1000.0
+        if current >= segment_length or i == len(points) - 1:
+            if len(segment_points) >= 2:
+                segments.append(legacy_segment_metrics(segment_points))
+            segment_start_distance = point.distance_from_start
+            segment_points = [point]
+
+    return {
+        "length": length,
+        "elevation_gain": increase,
+        "elevation_loss": abs(decrease),
+        "max_elevation": max(elevations),
+        "min_elevation": min(elevations),
+        "elevation_variance": variance,
+        "avg_slope": avg_slope,
+        "max_slope": max_slope,
+        "segments": segments,
+    }
+
+
+def legacy_segment_metrics(points):
+    length = points[-1].distance_from_start / 1000.0
+    gain, loss, max_slope = 0.0, 0.0, 0.0
+    for i in range(1, len(points)):
+        elev_diff = points[i].elevation - points[i - 1].elevation
+        if elev_diff > 0:
+            gain += elev_diff
+        else:
+            loss -= elev_diff
+        distance = points[i].distance_from_start - points[i - 1].distance_from_start
+        if distance != 0:
+            max_slope = max(max_slope, abs(elev_diff) / distance * 100)
+    avg_slope = (gain / (length * 1000)) * 100 if length else 0.0
+    return (length, gain, loss, avg_slope, max_slope)
+
+
+def engine_trail_metrics(geometry, segment_length):
+    metrics = compute_metrics(geometry, segment_length)
+    return {
+        "length": metrics.length,
+        "elevation_gain": metrics.elevation_gain,
+        "elevation_loss": metrics.elevation_loss,
+        "max_elevation": metrics.max_elevation,
+        "min_elevation": metrics.min_elevation,
+        "elevation_variance": metrics.elevation_variance,
+        "avg_slope": metrics.avg_slope,
+        "max_slope": metrics.max_slope,
+        "segments": [
+            (s.length, s.elevation_gain, s.elevation_loss, s.avg_slope, s.max_slope)
+            for s in metrics.segments
+        ],
+    }
+
+
+def assert_same(expected, actual, label):
+    """Compare two results, allowing for floating point summation order."""
+    if isinstance(expected, (list, tuple)):
+        assert len(expected) == len(actual), f"{label}: {expected} != {actual}"
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            assert_same(e, a, f"{label}[{i}]")
+    elif isinstance(expected, dict):
+        for key in expected:
+            assert_same(expected[key], actual[key], f"{label}.{key}")
+    else:
+        assert math.isclose(
+            expected, actual, rel_tol=1e-9, abs_tol=1e-9
+        ), f"{label}: {expected} != {actual}"
+
+
+def main():
+    """Check the engine against the legacy loops and time both."""
+    trail_files_dir = os.path.join(project_root, "storage", "trail_files")
+    trail_files = sorted(
+        os.path.join(trail_files_dir, f)
+        for f in os.listdir(trail_files_dir)
+        if f.endswith(".geojson")
+    )
+
+    trails = [Trail(path) for path in trail_files]
+    legacy_time = 0.0
+    engine_time = 0.0
+
+    for trail in trails:
+        points = trail.points
+        for segment_length in SEGMENT_LENGTHS:
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                expected = legacy_trail_metrics(points, segment_length)
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                actual = engine_trail_metrics(trail.geometry, segment_length)
+            engine_time += time.perf_counter() - start
+
+            assert_same(expected, actual, f"{trail.name} ({segment_length} km)")
+
+    print(f"Checked {len(trails)} trails at {len(SEGMENT_LENGTHS)} segment lengths")
+    print(f"Legacy loops:  {legacy_time:.3f}s")
+    print(f"Metric engine: {engine_time:.3f}s")
+    print(f"Speedup:       {legacy_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+Test for the packed trail path coordinates served by /api/trail_path.
+This script:
+1. Packs and unpacks the path of every trail in storage/trail_files
+2. Checks the result matches the coordinates read straight from the GeoJSON
+3. Checks the compact polyline and delta formats decode to the same path
+4. Checks the LRU cache evicts by size, oldest entry first
+5. Ingests files without elevations into a copy of data/trails.db, with no
+   DEM, and checks /api/trail_path serves every vertex of them
+6. Prints the time taken to parse the files vs unpack the blobs
+
+Usage:
+    python test-path-cache.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+from core.encoding import (
+    DELTA_PRECISION,
+    ELEVATION_PRECISION,
+    POLYLINE_PRECISION,
+    coordinates_to_list,
+    decode_polyline,
+    delta_decode,
+    encode_path,
+    encode_polyline,
+    load_line_coordinates,
+    pack_coordinates,
+    unpack_coordinates,
+)
+import api.api
+import core.dem
+from core.dem import ElevationModel
+from data import add_trails
+from data.init_db import migrate
+from utils import get_db_path
+from utils.cache import LRUCache
+
+
+def raw_coordinates(filepath):
+    """How get_trail_path read coordinates before they were precomputed."""
+    with open(filepath, "r") as f:
+        data = json.load(f)
+
+    coordinates = []
+    for feature in data.get("features", []):
+        if feature["geometry"]["type"] == "MultiLineString":
+            for line in feature["geometry"]["coordinates"]:
+                coordinates.extend(line)
+        elif feature["geometry"]["type"] == "LineString":
+            coordinates.extend(feature["geometry"]["coordinates"])
+    return coordinates
+
+
+def check_round_trip(trail_files):
+    parse_time = 0.0
+    unpack_time = 0.0
+
+    for filepath in trail_files:
+        start = time.perf_counter()
+        expected = raw_coordinates(filepath)
+        parse_time += time.perf_counter() - start
+
+        dims, count, blob = pack_coordinates(load_line_coordinates(filepath))
+        assert count == len(expected), filepath
+
+        start = time.perf_counter()
+        actual = coordinates_to_list(unpack_coordinates(dims, blob))
+        unpack_time += time.perf_counter() - start
+
+        assert actual == expected, f"coordinates differ for {filepath}"
+
+    print(f"Round trip OK for {len(trail_files)} trails")
+    print(f"Parse GeoJSON: {parse_time:.3f}s")
+    print(f"Unpack blobs:  {unpack_time:.3f}s")
+
+
+def check_compact_formats(trail_files):
+    # reference example from the encoded polyline format documentation
+    example = np.array([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+    assert encode_polyline(example) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+    json_bytes, polyline_bytes, delta_bytes = 0, 0, 0
+    for filepath in trail_files:
+        coordinates = load_line_coordinates(filepath)
+        longitude, latitude = coordinates[:, 0], coordinates[:, 1]
+
+        polyline = encode_path(coordinates, "polyline")
+        points = decode_polyline(polyline["points"], 2, POLYLINE_PRECISION)
+        assert np.allclose(points[:, 0], latitude, rtol=0, atol=0.5e-5 + 1e-12)
+        assert np.allclose(points[:, 1], longitude, rtol=0, atol=0.5e-5 + 1e-12)
+
+        delta = encode_path(coordinates, "delta")
+        assert np.allclose(
+            delta_decode(delta["latitude"], DELTA_PRECISION),
+            latitude,
+            rtol=0,
+            atol=0.5e-6 + 1e-12,
+        )
+
+        if "elevation" in polyline:
+            elevation = decode_polyline(polyline["elevation"], 1, ELEVATION_PRECISION)
+            assert np.allclose(elevation[:, 0], coordinates[:, 2], rtol=0, atol=0.05)
+
+        json_bytes += len(json.dumps(coordinates_to_list(coordinates)))
+        polyline_bytes += len(json.dumps(polyline))
+        delta_bytes += len(json.dumps(delta))
+
+    print("Compact formats OK")
+    print(f"JSON arrays:   {json_bytes} bytes")
+    print(f"Polyline:      {polyline_bytes} bytes")
+    print(f"Delta arrays:  {delta_bytes} bytes")
+
+
+def check_lru_cache():
+    cache = LRUCache(max_bytes=100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"  # a is now the most recently used
+
+    cache.put("c", "C", 40)  # over budget, b is evicted
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.current_bytes == 80
+
+    cache.put("big", "X", 101)  # larger than the cache, not stored
+    assert cache.get("big") is None and len(cache) == 2
+
+    cache.put("a", "A2", 10)  # replacing an entry updates its size
+    assert cache.get("a") == "A2" and cache.current_bytes == 50
+    print("LRU cache OK")
+
+
+def write_line(path, coordinates):
+    feature = {
+        "type": "Feature",
+        "properties": {},
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+    }
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": [feature]}, f)
+
+
+def check_ingested_without_elevation():
+    line = [[-123.07, 44.04], [-123.06, 44.05], [-123.05, 44.05], [-123.04, 44.06]]
+    files = {
+        "Flat Test Path": line,
+        "Null Elevation Test Path": [[lon, lat, None] for lon, lat in line],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        conn.close()
+        other = os.path.join(tmp, "other")
+        os.mkdir(other)
+        for name, coordinates in files.items():
+            write_line(os.path.join(other, f"{name}.geojson"), coordinates)
+
+        # a DEM with no tiles leaves every elevation unknown
+        core.dem._default_model = ElevationModel(other)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                add_trails.main(
+                    ["--db", db_path, "--workers", "1", "--directory", other]
+                )
+        finally:
+            core.dem._default_model = None
+
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+        for name in files:
+            response = client.get(f"/api/trail_path/{quote(name)}")
+            assert response.status_code == 200, name
+            path = response.get_json()["coordinates"]
+            assert [vertex[:2] for vertex in path] == line, name
+    print("Paths ingested without elevations keep every vertex")
+
+
+def main():
+    trail_files_dir = os.path.join(project_root, "storage", "trail_files")
+    trail_files = sorted(
+        os.path.join(trail_files_dir, f)
+        for f in os.listdir(trail_files_dir)
+        if f.endswith(".geojson")
+    )
+
+    check_round_trip(trail_files)
+    check_compact_formats(trail_files)
+    check_lru_cache()
+    check_ingested_without_elevation()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""
+Test for range queries on any stretch of a trail.
+This script:
+1. Checks trail.stats_between over the whole trail matches the trail metrics
+2. Checks random stretches of every trail in storage/trail_files against a
+   brute-force walk over the vertices, and that stretches add up
+3. Checks /api/trail_path/<name>/range on a migrated copy of data/trails.db
+4. Prints the time taken by a range query vs walking the stretch's vertices
+
+Usage:
+    python test-range-queries.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from core.metrics import MIN_SLOPE_DISTANCE, SparseTable
+from core.trail import Trail
+from data.init_db import migrate
+from utils import get_db_path, get_trail_files
+
+RANGES_PER_TRAIL = 50
+REPEATS = 1000
+
+
+def trail_files():
+    directory = get_trail_files()
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".geojson")
+    )
+
+
+def assert_close(expected, actual, label):
+    assert math.isclose(
+        expected, actual, rel_tol=1e-9, abs_tol=1e-6
+    ), f"{label}: {expected} != {actual}"
+
+
+def brute_force(geometry, start, end):
+    """Walk the vertices strictly inside the stretch, plus its two ends"""
+    distance, elevation = geometry.distance, geometry.elevation
+    inside = (distance > start) & (distance < end)
+    positions = np.concatenate(([start], distance[inside], [end]))
+    elevations = np.concatenate(
+        (
+            [np.interp(start, distance, elevation)],
+            elevation[inside],
+            [np.interp(end, distance, elevation)],
+        )
+    )
+    rise = np.diff(elevations)
+
+    # every step overlapping the stretch, partial ones included
+    step = np.diff(distance)
+    touched = (distance[1:] > start) & (distance[:-1] < end)
+    touched &= step >= MIN_SLOPE_DISTANCE
+    slopes = np.abs(np.diff(elevation))[touched] / step[touched] * 100
+    max_slope = slopes.max() if len(slopes) else 0.0
+
+    return {
+        "length": (positions[-1] - positions[0]) / 1000.0,
+        "elevation_gain": rise[rise > 0].sum(),
+        "elevation_loss": -rise[rise < 0].sum(),
+        "min_elevation": elevations.min(),
+        "max_elevation": elevations.max(),
+        "max_slope": max_slope,
+    }
+
+
+def check_sparse_table():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=257)
+    low, high = SparseTable(values, np.minimum), SparseTable(values)
+    for _ in range(500):
+        start = int(rng.integers(0, len(values)))
+        end = int(rng.integers(start, len(values)))
+        assert low.query(start, end) == values[start : end + 1].min()
+        assert high.query(start, end) == values[start : end + 1].max()
+
+
+def check_trails(trails):
+    rng = np.random.default_rng(1)
+    checked = 0
+    for trail in trails:
+        whole = trail.stats_between(0, math.inf)
+        for field in ("length", "elevation_gain", "elevation_loss", "avg_slope"):
+            assert_close(getattr(trail, field), getattr(whole, field), trail.name)
+        assert whole.min_elevation == trail.min_elevation
+        assert whole.max_elevation == trail.max_elevation
+        assert whole.max_slope == trail.max_slope
+
+        total = float(trail.geometry.distance[-1])
+        if total == 0:
+            continue
+        for _ in range(RANGES_PER_TRAIL):
+            start, middle, end = np.sort(rng.uniform(0, total, 3))
+            stats = trail.stats_between(start, end)
+            expected = brute_force(trail.geometry, start, end)
+            for field, value in expected.items():
+                assert_close(value, getattr(stats, field), f"{trail.name}.{field}")
+
+            # consecutive stretches add up to the stretch covering both
+            first = trail.stats_between(start, middle)
+            second = trail.stats_between(middle, end)
+            assert_close(
+                stats.elevation_gain,
+                first.elevation_gain + second.elevation_gain,
+                "additive gain",
+            )
+            assert stats.max_slope == max(first.max_slope, second.max_slope)
+            checked += 1
+
+    # out of range positions are clamped, reversed ones are an error
+    trail = trails[0]
+    assert trail.stats_between(-100, 1e9) == trail.stats_between(0, math.inf)
+    assert trail.stats_between(10, 10).length == 0
+    try:
+        trail.stats_between(20, 10)
+        raise AssertionError("reversed stretch accepted")
+    except ValueError:
+        pass
+    print(f"Checked {checked} stretches of {len(trails)} trails")
+
+
+def check_endpoint(trails):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        conn.close()
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+
+        for trail in trails:
+            url = f"/api/trail_path/{quote(trail.name)}/range"
+            total = float(trail.geometry.distance[-1])
+            start, end = total * 0.25, total * 0.75
+            response = client.get(f"{url}?start={start}&end={end}")
+            assert response.status_code == 200, trail.name
+            data = response.get_json()
+            expected = trail.stats_between(start, end)
+            assert data["name"] == trail.name
+            for field in ("length", "elevation_gain", "elevation_loss", "max_slope"):
+                assert_close(getattr(expected, field), data[field], trail.name)
+
+        etag = response.headers["ETag"]
+        repeat = client.get(
+            f"{url}?start={start}&end={end}", headers={"If-None-Match": etag}
+        )
+        assert repeat.status_code == 304
+
+        assert client.get(url).get_json()["end"] == total
+        for query in ("?start=abc", "?start=10&end=5", "?end=nan"):
+            assert client.get(url + query).status_code == 400, query
+        assert client.get("/api/trail_path/No%20Such%20Trail/range").status_code == 404
+    print(f"/api/trail_path/<name>/range matches for {len(trails)} trails")
+
+
+def compare_speed(trail):
+    total = float(trail.geometry.distance[-1])
+    start, end = total * 0.2, total * 0.7
+    trail.range_stats  # built once per trail
+
+    begin = time.perf_counter()
+    for _ in range(REPEATS):
+        trail.stats_between(start, end)
+    query = (time.perf_counter() - begin) / REPEATS
+
+    begin = time.perf_counter()
+    for _ in range(REPEATS // 10):
+        brute_force(trail.geometry, start, end)
+    walk = (time.perf_counter() - begin) / (REPEATS // 10)
+    print(
+        f"{trail.name} ({len(trail.geometry)} vertices): range query "
+        f"{query * 1e6:.1f}us, vertex walk {walk * 1e6:.1f}us"
+    )
+
+
+def main():
+    check_sparse_table()
+    trails = [Trail(path) for path in trail_files()]
+    check_trails(trails)
+    check_endpoint(trails)
+    compare_speed(max(trails, key=lambda trail: len(trail.geometry)))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Test for resampling trails to a uniform vertex spacing before analysis.
+This script:
+1. Resamples every trail in storage/trail_files and checks the length, line
+   ends and spacing of the result
+2. Records each trail sparsely and densely (every 8th vertex vs every
+   vertex, with GPS-like elevation noise) and compares the max slope of
+   both, raw and resampled
+3. Prints the time taken to resample a dense recording and compute its
+   metrics, vs computing the metrics of every raw vertex
+
+Usage:
+    python test-resample.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+from core.geometry import haversine_distances
+from core.metrics import compute_metrics
+from core.trail import Trail
+from utils import get_trail_files
+
+SPACING = 10.0
+SPARSE_STEP = 8
+REPEATS = 50
+
+
+def trail_files():
+    directory = get_trail_files()
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".geojson")
+    )
+
+
+def check_resampled(trail):
+    raw = trail.geometry
+    resampled = raw.resample(SPACING)
+    assert np.isclose(resampled.distance[-1], raw.distance[-1], rtol=0, atol=1e-6)
+    assert len(resampled.line_starts) == len(raw.line_starts)
+    assert np.array_equal(resampled.line_features, raw.line_features)
+
+    raw_ends = np.append(raw.line_starts[1:], len(raw))
+    new_ends = np.append(resampled.line_starts[1:], len(resampled))
+    for (a, b), (c, d) in zip(
+        zip(raw.line_starts, raw_ends), zip(resampled.line_starts, new_ends)
+    ):
+        # line ends are kept, vertices in between are at most SPACING apart
+        for i, j in ((a, c), (b - 1, d - 1)):
+            assert np.isclose(raw.latitude[i], resampled.latitude[j])
+            assert np.isclose(raw.longitude[i], resampled.longitude[j])
+            assert np.isclose(raw.elevation[i], resampled.elevation[j])
+        steps = np.diff(resampled.distance[c:d])
+        assert np.all(steps <= SPACING + 1e-6) and np.all(steps[:-1] > SPACING - 1e-6)
+        chords = haversine_distances(
+            resampled.latitude[c : d - 1],
+            resampled.longitude[c : d - 1],
+            resampled.latitude[c + 1 : d],
+            resampled.longitude[c + 1 : d],
+        )
+        assert np.all(chords <= steps + 1e-3)
+    return len(raw), len(resampled)
+
+
+def write_recording(path, coordinates):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "geometry": {
+                            "type": "LineString",
+                            "coordinates": coordinates.tolist(),
+                        },
+                        "properties": {},
+                    }
+                ],
+            },
+            f,
+        )
+
+
+def recordings(trail, tmp, rng):
+    """A sparse and a dense GPS-like recording of the same trail"""
+    resampled = trail.geometry.resample(2.0)
+    coordinates = np.column_stack(
+        (
+            resampled.longitude,
+            resampled.latitude,
+            resampled.elevation + rng.normal(0, 1.0, len(resampled)),
+        )
+    )
+    sparse = os.path.join(tmp, "sparse.geojson")
+    dense = os.path.join(tmp, "dense.geojson")
+    write_recording(sparse, coordinates[::SPARSE_STEP])
+    write_recording(dense, coordinates)
+    return sparse, dense
+
+
+def compare_sources(paths, tmp):
+    rng = np.random.default_rng(0)
+    raw_gaps, resampled_gaps = [], []
+    for path in paths:
+        trail = Trail(path)
+        if trail.length < 1.0:
+            continue
+        sparse, dense = recordings(trail, tmp, rng)
+        raw_gaps.append(abs(Trail(sparse).max_slope - Trail(dense).max_slope))
+        resampled_gaps.append(
+            abs(
+                Trail(sparse, resample_spacing=SPACING).max_slope
+                - Trail(dense, resample_spacing=SPACING).max_slope
+            )
+        )
+
+    raw_gap, resampled_gap = np.median(raw_gaps), np.median(resampled_gaps)
+    assert resampled_gap < raw_gap
+    print(
+        f"Max slope, sparse vs dense recording (median gap over {len(raw_gaps)} "
+        f"trails): raw {raw_gap:.1f}%, resampled {resampled_gap:.1f}%"
+    )
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / REPEATS
+
+
+def compare_speed(path, tmp):
+    _, dense = recordings(Trail(path), tmp, np.random.default_rng(1))
+    geometry = Trail(dense).geometry
+    _, raw_time = timed(compute_metrics, geometry, 0.5)
+    resampled, resample_time = timed(geometry.resample, SPACING)
+    _, resampled_time = timed(compute_metrics, resampled, 0.5)
+    print(f"Dense recording, {len(geometry)} vertices: metrics {raw_time * 1000:.2f}ms")
+    print(
+        f"Resampled, {len(resampled)} vertices: resample {resample_time * 1000:.2f}ms "
+        f"+ metrics {resampled_time * 1000:.2f}ms"
+    )
+
+
+def main():
+    paths = trail_files()
+    raw_total, resampled_total = 0, 0
+    for path in paths:
+        raw_count, resampled_count = check_resampled(Trail(path))
+        raw_total += raw_count
+        resampled_total += resampled_count
+    print(f"{len(paths)} trails: {raw_total} vertices, {resampled_total} resampled")
+
+    # a non-positive spacing is an error, leaving it out keeps the raw vertices
+    trail = Trail(paths[0])
+    try:
+        trail.geometry.resample(0)
+        raise AssertionError("spacing 0 accepted")
+    except ValueError:
+        pass
+    assert len(Trail(paths[0], resample_spacing=None).geometry) == len(trail.geometry)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        compare_sources(paths, tmp)
+        compare_speed(max(paths, key=os.path.getsize), tmp)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
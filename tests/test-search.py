@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Test for the /api/search trail name and notes index.
+This script:
+1. Copies data/trails.db and migrates it, which builds the trigram index
+2. Checks prefix, substring, notes and misspelled queries, and that the
+   index follows inserted, renamed and deleted trails and notes
+3. Checks the difficulty filters and the result limit
+4. Times search-as-you-type on a catalogue padded with synthetic trails
+
+Usage:
+    python test-search.py [trail_count]
+
+Make sure to run this from the tests/ directory.
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from data.init_db import migrate
+from utils import get_db_path
+
+TYPED = "mount pisgah"
+
+
+def search(client, query, **args):
+    args = "".join(f"&{name}={value}" for name, value in args.items())
+    response = client.get(f"/api/search?q={query}{args}")
+    assert response.status_code == 200, query
+    return response.get_json()["results"]
+
+
+def check_matches(client, conn):
+    # names starting with the query rank above names merely containing it
+    results = search(client, "mount", fields="name", limit=50)
+    matches = [r["match"] for r in results]
+    assert matches == sorted(matches, key=["prefix", "substring"].index)
+    for r in results:
+        assert r["name"].lower().startswith("mount") == (r["match"] == "prefix")
+
+    results = search(client, "pisgah", fields="name", limit=50)
+    expected = conn.execute(
+        "SELECT COUNT(*) FROM trails WHERE name LIKE '%pisgah%'"
+    ).fetchone()[0]
+    assert len(results) == expected, (len(results), expected)
+
+    # misspelled queries still find the trail
+    for typo in ("pisgha", "mount pisgag", "quary road", "spencr butte"):
+        names = [r["name"].lower() for r in search(client, typo, fields="name")]
+        word = typo.split()[-1][:3]
+        assert any(word in name for name in names), (typo, names)
+    print("Prefix, substring and fuzzy matches OK")
+
+    # the index follows writes through its triggers
+    trail_id = conn.execute(
+        "INSERT INTO trails (name, length) VALUES ('Xyzzy Falls Loop', 3.2)"
+    ).lastrowid
+    conn.execute(
+        "INSERT INTO trail_notes (trail_id, note_text) VALUES (?, ?)",
+        (trail_id, "Muddy after rain, bring poles"),
+    )
+    conn.commit()
+    assert [r["match"] for r in search(client, "xyzzy falls")] == ["prefix"]
+    assert [r["name"] for r in search(client, "bring poles")] == ["Xyzzy Falls Loop"]
+
+    conn.execute(
+        "UPDATE trails SET name = 'Plugh Loop' WHERE trail_id = ?", (trail_id,)
+    )
+    conn.commit()
+    assert search(client, "xyzzy") == []
+    assert [r["name"] for r in search(client, "plugh")] == ["Plugh Loop"]
+
+    conn.execute("DELETE FROM trail_notes WHERE trail_id = ?", (trail_id,))
+    conn.execute("DELETE FROM trails WHERE trail_id = ?", (trail_id,))
+    conn.commit()
+    assert search(client, "plugh") == [] and search(client, "bring poles") == []
+    print("Index triggers OK")
+
+    results = search(client, "trail", limit=50, min_difficulty=4, max_difficulty=6)
+    assert results and all(4 <= r["difficulty_rating"] <= 6 for r in results)
+    assert len(search(client, "trail", limit=3)) == 3
+    assert search(client, "") == []
+    assert client.get("/api/search?q=trail&limit=x").status_code == 400
+    assert client.get("/api/search?q=trail&fields=bogus").status_code == 400
+    print("Filters OK")
+
+
+def pad_catalogue(conn, count):
+    """Add synthetically named trails until there are count trails."""
+    words = ["".join(random.choices(string.ascii_lowercase, k=6)) for _ in range(500)]
+    existing = conn.execute("SELECT COUNT(*) FROM trails").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO trails (name, length) VALUES (?, ?)",
+        [
+            (f"{' '.join(random.sample(words, 3)).title()} Trail {i}", 5.0)
+            for i in range(existing, count)
+        ],
+    )
+    conn.commit()
+
+
+def time_typing(client):
+    """Search every prefix of TYPED, as the search box does on each key."""
+    start = time.perf_counter()
+    for end in range(1, len(TYPED) + 1):
+        search(client, TYPED[:end])
+    return (time.perf_counter() - start) / len(TYPED)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+
+        check_matches(client, conn)
+        pad_catalogue(conn, count)
+        elapsed = time_typing(client)
+        conn.close()
+
+    print(f"Search as you type, {count} trails: {elapsed * 1000:.2f}ms per key")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Test for trail segments as views of the trail's geometry.
+This script:
+1. Re-segments every trail in storage/trail_files at several lengths and
+   checks the lazily computed metrics match compute_metrics
+2. Checks segments built from a list of Points still work on their own
+3. Checks segment vertices share memory with the trail and compares the
+   memory held by view segments vs a sliced geometry per segment
+4. Prints the time taken to re-segment a trail vs recomputing its metrics
+
+Usage:
+    python test-segment-views.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+from core.metrics import compute_metrics
+from core.segment import TrailSegment
+from core.trail import Trail
+from utils import get_trail_files
+
+SEGMENT_LENGTHS = [0.1, 0.25, 1.0, 2.0]
+FIELDS = ("length", "elevation_gain", "elevation_loss", "avg_slope", "max_slope")
+REPEATS = 20
+
+
+def trail_files():
+    directory = get_trail_files()
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".geojson")
+    )
+
+
+def assert_segment(expected, segment, label):
+    assert (segment.start, segment.end) == (expected.start, expected.end), label
+    for field in FIELDS:
+        assert math.isclose(
+            getattr(expected, field),
+            getattr(segment, field),
+            rel_tol=1e-9,
+            abs_tol=1e-9,
+        ), f"{label}.{field}"
+
+
+def check_resegmenting(trails):
+    for trail in trails:
+        for segment_length in SEGMENT_LENGTHS:
+            expected = compute_metrics(trail.geometry, segment_length).segments
+            segments = trail.create_segments(segment_length)
+            assert len(segments) == len(expected)
+            for segment, seg in zip(segments, expected):
+                assert segment._metrics is None, "metrics computed eagerly"
+                assert_segment(seg, segment, f"{trail.name} ({segment_length} km)")
+
+        # the trail's own length reuses the metrics from its sweep
+        default = trail.create_segments()
+        assert all(segment._metrics is not None for segment in default)
+        assert [s.to_dict() for s in default] == [s.to_dict() for s in trail.segments]
+    print(f"Re-segmented {len(trails)} trails at {len(SEGMENT_LENGTHS)} lengths")
+
+
+def check_standalone(trail):
+    for seg in compute_metrics(trail.geometry, 0.5).segments[:5]:
+        points = trail.geometry[seg.start : seg.end + 1].to_points()
+        segment = TrailSegment(points, seg.start)
+        assert (segment.start, segment.end) == (0, len(points) - 1)
+        for field in FIELDS:
+            assert math.isclose(
+                getattr(seg, field), getattr(segment, field), rel_tol=1e-9
+            ), field
+
+    single = TrailSegment(trail.points[:1], 0)
+    assert (single.length, single.max_slope) == (0.0, 0.0)
+    print("Segments built from Points match")
+
+
+def check_views(trail):
+    segment = trail.segments[len(trail.segments) // 2]
+    for column in ("latitude", "longitude", "elevation", "distance"):
+        assert np.shares_memory(
+            getattr(segment.geometry, column), getattr(trail.geometry, column)
+        )
+    assert segment.start_point.latitude == trail.geometry.latitude[segment.start]
+    assert segment.end_point.longitude == trail.geometry.longitude[segment.end]
+
+    bounds = [(seg.start, seg.end) for seg in trail.metrics.segments]
+    tracemalloc.start()
+    sliced = [trail.geometry[start : end + 1] for start, end in bounds]
+    sliced_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sliced
+
+    tracemalloc.start()
+    views = trail.create_segments()
+    view_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del views
+    print(
+        f"{len(bounds)} segments: sliced geometries {sliced_bytes} bytes, "
+        f"views {view_bytes} bytes"
+    )
+
+
+def compare_speed(trail, segment_length=0.1):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        compute_metrics(trail.geometry, segment_length)
+    recompute = (time.perf_counter() - start) / REPEATS
+
+    trail.range_stats  # built once per trail
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        trail.create_segments(segment_length)
+    resegment = (time.perf_counter() - start) / REPEATS
+    print(
+        f"Re-segment {trail.name} at {segment_length} km: "
+        f"compute_metrics {recompute * 1000:.2f}ms, views {resegment * 1000:.2f}ms"
+    )
+
+
+def main():
+    trails = [Trail(path) for path in trail_files()]
+    check_resegmenting(trails)
+
+    longest = max(trails, key=lambda trail: len(trail.geometry))
+    check_standalone(longest)
+    check_views(longest)
+    compare_speed(longest)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Test for zoom-dependent trail path simplification.
+This script:
+1. Computes the simplification importance of every trail in storage/trail_files
+2. Checks importance > tolerance keeps exactly the vertices a recursive
+   Douglas-Peucker keeps, at several tolerances
+3. Prints how many vertices are kept at typical zoom levels
+4. Checks /api/trail_path/<name>?zoom= on a migrated copy of data/trails.db
+   and that a zoom or tolerance that is not a finite number is rejected
+
+Usage:
+    python test-simplify.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from urllib.parse import quote
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from core.encoding import load_line_coordinates, pack_importance, unpack_importance
+from core.simplify import (
+    _segment_distances,
+    local_meters,
+    simplification_importance,
+    simplify_mask,
+    tolerance_for_zoom,
+)
+from data.init_db import migrate
+from utils import get_db_path
+
+TOLERANCES = [0.5, 2.0, 10.0, 50.0]
+ZOOMS = [10, 12, 14, 16]
+
+
+def douglas_peucker(x, y, tolerance):
+    """Textbook recursive Douglas-Peucker, returns a mask of kept vertices."""
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    def split(first, last):
+        if last - first < 2:
+            return
+        distances = _segment_distances(x, y, first, last)
+        offset = int(np.argmax(distances))
+        if distances[offset] > tolerance:
+            index = first + 1 + offset
+            keep[index] = True
+            split(first, index)
+            split(index, last)
+
+    split(0, len(x) - 1)
+    return keep
+
+
+def check_endpoint(trail_files):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        conn.close()
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+
+        longest = max(trail_files, key=lambda path: len(load_line_coordinates(path)))
+        name = os.path.splitext(os.path.basename(longest))[0]
+        url = f"/api/trail_path/{quote(name)}"
+        full = client.get(url).get_json()["coordinates"]
+        simplified = client.get(f"{url}?zoom=12").get_json()["coordinates"]
+        assert 2 <= len(simplified) < len(full)
+
+        for query in ("zoom=nan", "zoom=inf", "tolerance=nan", "tolerance=x"):
+            assert client.get(f"{url}?{query}").status_code == 400, query
+    print("/api/trail_path simplifies by zoom and rejects bad tolerances")
+
+
+def main():
+    trail_files_dir = os.path.join(project_root, "storage", "trail_files")
+    trail_files = sorted(
+        os.path.join(trail_files_dir, f)
+        for f in os.listdir(trail_files_dir)
+        if f.endswith(".geojson")
+    )
+
+    total = 0
+    kept = {zoom: 0 for zoom in ZOOMS}
+
+    for filepath in trail_files:
+        coordinates = load_line_coordinates(filepath)
+        if len(coordinates) < 2:
+            continue
+        x, y = local_meters(coordinates[:, 1], coordinates[:, 0])
+        # stored as float32, so check the packed values
+        importance = unpack_importance(pack_importance(simplification_importance(x, y)))
+
+        for tolerance in TOLERANCES:
+            expected = douglas_peucker(x, y, tolerance)
+            actual = simplify_mask(importance, tolerance)
+            assert (expected == actual).all(), f"{filepath} at {tolerance}m"
+
+        total += len(coordinates)
+        latitude = float(np.mean(coordinates[:, 1]))
+        for zoom in ZOOMS:
+            tolerance = tolerance_for_zoom(zoom, latitude)
+            kept[zoom] += int(simplify_mask(importance, tolerance).sum())
+
+    print(f"Matched Douglas-Peucker for {len(trail_files)} trails")
+    print(f"Full resolution: {total} vertices")
+    for zoom in ZOOMS:
+        print(
+            f"Zoom {zoom:>2}: {kept[zoom]:>6} vertices ({total / kept[zoom]:.1f}x fewer)"
+        )
+    check_endpoint(trail_files)
+
+
+if __name__ == "__main__":
+    main()
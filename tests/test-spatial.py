@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+"""
+Test for the trail_rtree viewport and nearest-trail queries.
+This script:
+1. Copies data/trails.db, migrates it and pads it with synthetic trails
+2. Checks /api/trails/within against a brute-force scan of every bounding
+   box, including a box across the antimeridian
+3. Checks /api/trails/nearest against the distance to every trail
+4. Checks a path is measured to its segments, not just its vertices
+5. Checks a trail with no vertices is stored without an R-tree entry
+6. Times viewport queries as the catalogue grows
+
+Usage:
+    python test-spatial.py [trail_count]
+
+Make sure to run this from the tests/ directory.
+"""
+
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from core.analysis import insert_trail_record
+from core.encoding import pack_coordinates
+from core.geometry import haversine_distances
+from core.trail import Trail
+from data.init_db import migrate
+from utils import get_db_path
+
+QUERIES = 200
+
+
+def pad_catalogue(conn, count):
+    """Add synthetic trails scattered over the globe until there are count."""
+    existing = conn.execute("SELECT COUNT(*) FROM trails").fetchone()[0]
+    for i in range(existing, count):
+        lat, lon = random.uniform(-80, 80), random.uniform(-179.9, 179.9)
+        cursor = conn.execute(
+            """
+            INSERT INTO trails (name, location_lat, location_long, length)
+            VALUES (?, ?, ?, ?)
+        """,
+            (f"Synthetic Trail {i}", lat, lon, random.uniform(1, 20)),
+        )
+        conn.execute(
+            """
+            INSERT INTO trail_rtree (trail_id, min_lon, min_lat, max_lon, max_lat)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+            (cursor.lastrowid, lon, lat, lon, lat),
+        )
+    conn.commit()
+
+
+def brute_force_within(conn, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    names = set()
+    for name, lon0, lat0, lon1, lat1 in conn.execute(
+        """
+        SELECT t.name, r.min_lon, r.min_lat, r.max_lon, r.max_lat
+        FROM trails t JOIN trail_rtree r ON r.trail_id = t.trail_id
+    """
+    ):
+        if lat1 < min_lat or lat0 > max_lat:
+            continue
+        if min_lon <= max_lon:
+            hit = lon1 >= min_lon and lon0 <= max_lon
+        else:
+            hit = lon1 >= min_lon or lon0 <= max_lon
+        if hit:
+            names.add(name)
+    return names
+
+
+def brute_force_nearest(conn, lat, lon, k):
+    rows = conn.execute(
+        "SELECT name, location_lat, location_long FROM trails"
+    ).fetchall()
+    lats = np.array([row[1] for row in rows])
+    lons = np.array([row[2] for row in rows])
+    distances = haversine_distances(
+        np.full(len(rows), lat), np.full(len(rows), lon), lats, lons
+    )
+    order = np.argsort(distances, kind="stable")[:k]
+    return [(rows[i][0], distances[i]) for i in order]
+
+
+def random_bbox(size):
+    lat = random.uniform(-80, 80 - size)
+    lon = random.uniform(-180, 180)
+    max_lon = lon + size if lon + size <= 180 else lon + size - 360
+    return (lon, lat, max_lon, lat + size)
+
+
+def check_queries(client, conn):
+    boxes = [random_bbox(random.uniform(0.5, 20)) for _ in range(50)]
+    boxes.append((170.0, -20.0, -170.0, 20.0))  # across the antimeridian
+    for bbox in boxes:
+        url = "/api/trails/within?fields=name&limit=500&bbox=" + ",".join(
+            str(value) for value in bbox
+        )
+        page = client.get(url).get_json()
+        assert not page["truncated"], bbox
+        assert {t["name"] for t in page["trails"]} == brute_force_within(
+            conn, bbox
+        ), bbox
+    print(f"Viewport queries OK ({len(boxes)} boxes)")
+
+    for _ in range(20):
+        lat, lon = random.uniform(-85, 85), random.uniform(-180, 180)
+        url = f"/api/trails/nearest?lat={lat}&lon={lon}&k=10&fields=name"
+        trails = client.get(url).get_json()["trails"]
+        expected = brute_force_nearest(conn, lat, lon, 10)
+        assert [t["name"] for t in trails] == [name for name, _ in expected]
+        for trail, (_, distance) in zip(trails, expected):
+            assert abs(trail["distance"] - distance) < 1
+    print("Nearest queries OK")
+
+    for query in (
+        "bbox=1,2,3",
+        "bbox=a,b,c,d",
+        "bbox=0,10,1,5",
+        "bbox=nan,0,1,1",
+        "limit=3",
+    ):
+        assert client.get(f"/api/trails/within?{query}").status_code == 400, query
+    for query in (
+        "lat=1",
+        "lat=x&lon=1",
+        "lat=91&lon=0",
+        "lat=nan&lon=0",
+        "lat=1&lon=inf",
+        "lat=1&lon=1&k=nan",
+    ):
+        assert client.get(f"/api/trails/nearest?{query}").status_code == 400, query
+
+
+def add_path(conn, name, coordinates):
+    coordinates = np.array(coordinates, dtype=np.float64)
+    lon, lat = coordinates[0]
+    trail_id = conn.execute(
+        "INSERT INTO trails (name, location_lat, location_long) VALUES (?, ?, ?)",
+        (name, lat, lon),
+    ).lastrowid
+    conn.execute(
+        """
+        INSERT INTO trail_geometry (
+            trail_id, dims, point_count, coordinates, source_size, source_mtime_ns
+        ) VALUES (?, ?, ?, ?, 0, 0)
+    """,
+        (trail_id, *pack_coordinates(coordinates)),
+    )
+    conn.execute(
+        """
+        INSERT INTO trail_rtree (trail_id, min_lon, min_lat, max_lon, max_lat)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+        (trail_id, *coordinates.min(axis=0), *coordinates.max(axis=0)),
+    )
+
+
+def check_segment_distance(client, conn):
+    # a hand-drawn trail: one straight 22 km segment, and a trail whose only
+    # vertex is closer than either end of it but further than its middle
+    add_path(conn, "Straight Trail", [[10.0, 0.0], [10.2, 0.0]])
+    add_path(conn, "Point Trail", [[10.1, 0.02]])
+    add_path(conn, "Dateline Trail", [[179.9, 5.0], [-179.9, 5.0]])
+    conn.commit()
+
+    url = "/api/trails/nearest?lat=0.001&lon=10.1&k=2&fields=name"
+    trails = client.get(url).get_json()["trails"]
+    assert [t["name"] for t in trails] == ["Straight Trail", "Point Trail"], trails
+    assert abs(trails[0]["distance"] - 111.2) < 1, trails[0]
+
+    url = "/api/trails/nearest?lat=5.001&lon=180&k=1&fields=name"
+    trail = client.get(url).get_json()["trails"][0]
+    assert trail["name"] == "Dateline Trail" and abs(trail["distance"] - 111.2) < 1
+    print("Nearest distances are measured to path segments")
+
+
+def check_empty_trail(client, conn, tmp):
+    path = os.path.join(tmp, "Empty Trail.geojson")
+    with open(path, "w") as f:
+        line = {"type": "LineString", "coordinates": []}
+        json.dump({"type": "FeatureCollection", "features": [{"geometry": line}]}, f)
+    trail = Trail(path)
+    trail_id = insert_trail_record(conn.cursor(), trail.analyzer.build_record(trail))
+    conn.commit()
+
+    # its location is NaN, which must not put it at 0, 0
+    indexed = conn.execute(
+        "SELECT COUNT(*) FROM trail_rtree WHERE trail_id = ?", (trail_id,)
+    ).fetchone()[0]
+    assert indexed == 0
+    page = client.get("/api/trails/within?fields=name&bbox=-1,-1,1,1").get_json()
+    assert "Empty Trail" not in {t["name"] for t in page["trails"]}
+    nearest = client.get("/api/trails/nearest?lat=0&lon=0&k=50&fields=name")
+    assert "Empty Trail" not in {t["name"] for t in nearest.get_json()["trails"]}
+    print("Trails without vertices are left out of the R-tree")
+
+
+def time_viewports(client):
+    boxes = [random_bbox(0.5) for _ in range(QUERIES)]
+    start = time.perf_counter()
+    for bbox in boxes:
+        client.get("/api/trails/within?fields=name&bbox=" + ",".join(map(str, bbox)))
+    return (time.perf_counter() - start) / QUERIES
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+
+        small = time_viewports(client)
+        pad_catalogue(conn, count)
+        large = time_viewports(client)
+        check_queries(client, conn)
+        check_segment_distance(client, conn)
+        check_empty_trail(client, conn, tmp)
+        conn.close()
+
+    print(f"Viewport query, 40 trails:     {small * 1000:.2f}ms")
+    print(f"Viewport query, {count} trails: {large * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Test for the paginated /api/trails catalogue.
+This script:
+1. Walks every sort order page by page with a small page size
+2. Checks each walk returns every trail exactly once, in sorted order
+3. Checks the difficulty, length and name prefix filters against the database
+4. Checks fields= limits the returned keys and bad arguments return 400
+5. Walks every sort order again with trails missing their name, length
+   and ratings
+
+Everything runs against a copy of data/trails.db.
+
+Usage:
+    python test-trail-catalogue.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from utils import get_db_path
+
+PAGE_SIZE = 7
+
+SORT_FIELDS = {
+    "name": "name",
+    "length": "length",
+    "difficulty": "difficulty_rating",
+    "cardio": "cardio_intensity",
+    "technical": "technical_difficulty",
+}
+
+
+def fetch_all(client, query):
+    """Follow next_cursor until the last page; returns (trails, page count)."""
+    trails, pages, cursor = [], 0, None
+    while True:
+        url = f"/api/trails?limit={PAGE_SIZE}&{query}"
+        if cursor:
+            url += f"&cursor={cursor}"
+        response = client.get(url)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+
+        page = response.get_json()
+        trails.extend(page["trails"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return trails, pages
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        api.api.get_db_path = lambda: db_path
+        client = api.api.app.test_client()
+
+        check_catalogue(client, db_path)
+        check_null_keys(client, db_path)
+    print("OK")
+
+
+def check_catalogue(client, db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        """
+        SELECT t.name, t.length, d.overall_difficulty
+        FROM trails t LEFT JOIN difficulty_ratings d ON d.trail_id = t.trail_id
+    """
+    ).fetchall()
+    conn.close()
+    names = sorted(row[0] for row in rows)
+
+    for sort, field in SORT_FIELDS.items():
+        for order in ("", "-"):
+            trails, pages = fetch_all(client, f"sort={order}{sort}")
+            assert sorted(t["name"] for t in trails) == names, f"{order}{sort}"
+
+            keys = [-1 if t[field] is None else t[field] for t in trails]
+            assert keys == sorted(keys, reverse=bool(order)), f"{order}{sort}"
+        print(f"sort={sort}: {len(trails)} trails in {pages} pages")
+
+    trails, _ = fetch_all(client, "min_difficulty=4&max_difficulty=6")
+    expected = [r for r in rows if r[2] is not None and 4 <= r[2] <= 6]
+    assert len(trails) == len(expected)
+
+    trails, _ = fetch_all(client, "min_length=5&max_length=10")
+    assert len(trails) == len([r for r in rows if 5 <= r[1] <= 10])
+
+    trails, _ = fetch_all(client, "name_prefix=mount")
+    assert len(trails) == len([n for n in names if n.lower().startswith("mount")])
+    print("Filters OK")
+
+    page = client.get("/api/trails?fields=name,length").get_json()
+    assert all(set(t) == {"name", "length"} for t in page["trails"])
+
+    for query in (
+        "fields=bogus",
+        "sort=elevation",
+        "cursor=abc",
+        "min_length=x",
+        "min_length=nan",
+    ):
+        assert client.get(f"/api/trails?{query}").status_code == 400, query
+
+
+def check_null_keys(client, db_path):
+    """NULL sort keys come first ascending and last descending, each once"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO trails (name, length) VALUES (?, ?)",
+        [(None, None), (None, 3.0), ("Unmeasured Trail", None)],
+    )
+    conn.commit()
+    trail_count = conn.execute("SELECT COUNT(*) FROM trails").fetchone()[0]
+    conn.close()
+
+    for sort, field in SORT_FIELDS.items():
+        for order in ("", "-"):
+            trails, _ = fetch_all(client, f"sort={order}{sort}")
+            assert len(trails) == trail_count, f"{order}{sort}"
+            nulls = [t[field] is None for t in trails]
+            assert nulls == sorted(nulls, reverse=not order), f"{order}{sort}"
+            keys = [t[field] for t in trails if t[field] is not None]
+            assert keys == sorted(keys, reverse=bool(order)), f"{order}{sort}"
+    print("NULL sort keys are paged once each")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Benchmark for trail detail lookups on a large catalogue.
+This script:
+1. Copies data/trails.db and pads it with synthetic trails
+2. Times the old three-query detail lookup and the single joined query,
+   before and after data/init_db.migrate adds the indexes
+3. Checks both lookups return the same values
+
+Usage:
+    python test-trail-lookup.py [trail_count]
+
+Make sure to run this from the tests/ directory.
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+from data.init_db import migrate
+from utils import get_db_path
+
+LOOKUPS = 500
+
+JOINED_QUERY = """
+    SELECT t.trail_id, t.geojson_path, t.length, t.max_elevation,
+           t.min_elevation, t.elevation_gain, t.elevation_loss,
+           d.rating_id, d.overall_difficulty, d.cardio_intensity,
+           d.technical_difficulty, d.accessibility, d.weather_vulnerability
+    FROM trails t
+    LEFT JOIN difficulty_ratings d ON d.trail_id = t.trail_id
+    WHERE t.name = ?
+    ORDER BY d.rating_id
+    LIMIT 1
+"""
+
+
+def pad_catalogue(conn, count):
+    """Add synthetic trails (with ratings) until there are count trails."""
+    existing = conn.execute("SELECT COUNT(*) FROM trails").fetchone()[0]
+    for i in range(existing, count):
+        cursor = conn.execute(
+            "INSERT INTO trails (name, length, geojson_path) VALUES (?, ?, ?)",
+            (f"Synthetic Trail {i}", random.uniform(1, 20), f"synthetic_{i}.geojson"),
+        )
+        conn.execute(
+            "INSERT INTO difficulty_ratings (trail_id, overall_difficulty) VALUES (?, ?)",
+            (cursor.lastrowid, random.randint(1, 10)),
+        )
+    conn.commit()
+
+
+def three_queries(conn, name):
+    """How get_trail_path used to look up a trail."""
+    conn.execute("SELECT geojson_path FROM trails WHERE name = ?", (name,)).fetchone()
+    trail = conn.execute(
+        """
+        SELECT trail_id, length, max_elevation, min_elevation,
+               elevation_gain, elevation_loss
+        FROM trails WHERE name = ?
+    """,
+        (name,),
+    ).fetchone()
+    rating = conn.execute(
+        "SELECT * FROM difficulty_ratings WHERE trail_id = ?", (trail[0],)
+    ).fetchone()
+    return trail[1], rating[6] if rating else None
+
+
+def joined_query(conn, name):
+    row = conn.execute(JOINED_QUERY, (name,)).fetchone()
+    return row[2], row[8]
+
+
+def time_lookups(conn, names, lookup):
+    start = time.perf_counter()
+    results = [lookup(conn, name) for name in names]
+    return time.perf_counter() - start, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        pad_catalogue(conn, count)
+
+        names = [row[0] for row in conn.execute("SELECT name FROM trails")]
+        names = random.sample(names, min(LOOKUPS, len(names)))
+
+        print(f"{len(names)} lookups in {count} trails")
+        old_time, expected = time_lookups(conn, names, three_queries)
+        print(f"Three queries, no indexes: {old_time:.3f}s")
+
+        migrate(conn)
+        indexed_time, indexed = time_lookups(conn, names, three_queries)
+        print(f"Three queries, indexed:    {indexed_time:.3f}s")
+
+        new_time, actual = time_lookups(conn, names, joined_query)
+        print(f"Joined query, indexed:     {new_time:.3f}s")
+
+        assert expected == indexed == actual, "lookups returned different values"
+        print(f"Speedup: {old_time / new_time:.1f}x")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+"""
+Test for the /tiles/<z>/<x>/<y> vector tile endpoint.
+This script:
+1. Copies data/trails.db and migrates it, with the tile cache in a
+   temporary directory
+2. Decodes every tile covering the trails at several zoom levels and checks
+   the layer, attributes and geometry against the stored trail paths
+3. Checks tiles are served from the disk cache, revalidated with 304 and
+   gzip-compressed
+4. Checks editing a trail's GeoJSON file in place changes its tiles and
+   their ETag without any database write
+5. Compares the bytes needed to draw every trail as tiles vs as paths
+
+Usage:
+    python test-vector-tiles.py
+
+Make sure to run this from the tests/ directory.
+"""
+
+import json
+import math
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+
+import api.api
+from core.encoding import load_line_coordinates
+from core.mvt import BUFFER, EXTENT, MVT_MEDIA_TYPE, tile_coordinates
+from data.init_db import migrate
+from utils import get_db_path, get_full_trail_path
+from utils.tile_cache import DiskTileCache
+
+ZOOMS = (8, 11, 13, 15)
+
+
+def read_varint(data, pos):
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def read_fields(data):
+    """(field number, value) of each protobuf field in a message"""
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = struct.unpack("<d", data[pos : pos + 8])[0], pos + 8
+        elif wire_type == 2:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos : pos + length], pos + length
+        else:
+            raise ValueError(f"unexpected wire type {wire_type}")
+        yield field, value
+
+
+def read_packed(data):
+    pos, values = 0, []
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_value(data):
+    for field, value in read_fields(data):
+        if field == 1:
+            return value.decode("utf-8")
+        if field == 3:
+            return value
+        if field == 6:
+            return unzigzag(value)
+    raise ValueError("unexpected value type")
+
+
+def decode_geometry(commands):
+    """Line parts of a geometry as lists of (x, y)"""
+    parts, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        assert command in (1, 2), command
+        if command == 1:
+            assert count == 1
+            parts.append([])
+        for _ in range(count):
+            x += unzigzag(commands[i])
+            y += unzigzag(commands[i + 1])
+            parts[-1].append((x, y))
+            i += 2
+    return parts
+
+
+def decode_tile(data):
+    """{layer name: [(id, attributes, parts)]}"""
+    layers = {}
+    for field, layer_data in read_fields(data):
+        assert field == 3
+        name, raw_features, keys, values, extent = None, [], [], [], None
+        for layer_field, value in read_fields(layer_data):
+            if layer_field == 1:
+                name = value.decode("utf-8")
+            elif layer_field == 2:
+                raw_features.append(value)
+            elif layer_field == 3:
+                keys.append(value.decode("utf-8"))
+            elif layer_field == 4:
+                values.append(decode_value(value))
+            elif layer_field == 5:
+                extent = value
+        assert extent == EXTENT
+
+        features = []
+        for raw in raw_features:
+            feature = dict(read_fields(raw))
+            assert feature[3] == 2, "not a linestring"
+            tags = read_packed(feature.get(2, b""))
+            attributes = {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}
+            features.append(
+                (feature[1], attributes, decode_geometry(read_packed(feature[4])))
+            )
+        layers[name] = features
+    return layers
+
+
+def tile_range(bbox, z):
+    """x and y ranges of the tiles covering a bounding box"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    n = 2**z
+
+    def tile_x(lon):
+        return int((lon + 180) / 360 * n)
+
+    def tile_y(lat):
+        lat = math.radians(lat)
+        return int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+
+    return (
+        range(tile_x(min_lon), tile_x(max_lon) + 1),
+        range(tile_y(max_lat), tile_y(min_lat) + 1),
+    )
+
+
+def load_paths(conn):
+    paths = {}
+    for trail_id, geojson_path in conn.execute(
+        "SELECT trail_id, geojson_path FROM trails"
+    ):
+        try:
+            paths[trail_id] = load_line_coordinates(get_full_trail_path(geojson_path))
+        except OSError:
+            pass
+    return paths
+
+
+def check_tiles(client, conn, paths):
+    bbox = conn.execute(
+        "SELECT MIN(min_lon), MIN(min_lat), MAX(max_lon), MAX(max_lat) FROM trail_rtree"
+    ).fetchone()
+    names = dict(conn.execute("SELECT trail_id, name FROM trails"))
+
+    for z in ZOOMS:
+        xs, ys = tile_range(bbox, z)
+        seen, tiles, vertices = set(), 0, 0
+        for x in xs:
+            for y in ys:
+                response = client.get(f"/tiles/{z}/{x}/{y}")
+                assert response.status_code == 200, (z, x, y)
+                assert response.mimetype == MVT_MEDIA_TYPE
+                layers = decode_tile(response.data)
+                tiles += 1
+
+                for trail_id, attributes, parts in layers.get("trails", []):
+                    assert attributes["name"] == names[trail_id]
+                    seen.add(trail_id)
+
+                    # vertices inside the tile are projected path vertices
+                    projected = tile_coordinates(paths[trail_id], z, x, y)
+                    for part in parts:
+                        assert len(part) >= 2
+                        points = np.array(part)
+                        assert (
+                            points.min() >= -BUFFER and points.max() <= EXTENT + BUFFER
+                        )
+                        vertices += len(points)
+                        inner = points[np.all((points > 0) & (points < EXTENT), axis=1)]
+                        for point in inner[:: max(1, len(inner) // 20)]:
+                            gap = np.abs(projected - point).max(axis=1).min()
+                            assert gap <= 0.5 + 1e-6, (z, x, y, trail_id, gap)
+
+        assert seen == set(paths), f"z{z}: missing {set(paths) - seen}"
+        print(f"z{z}: {tiles} tiles, {vertices} vertices, all {len(seen)} trails")
+
+
+def check_caching(client, tile_dir, paths):
+    # a tile on the first trail, at a zoom check_tiles has not built
+    lon, lat = next(iter(paths.values()))[0][:2]
+    xs, ys = tile_range((lon, lat, lon, lat), 14)
+    url = f"/tiles/14/{xs[0]}/{ys[0]}"
+    start = time.perf_counter()
+    first = client.get(url)
+    cold = time.perf_counter() - start
+    cached_files = [name for _, _, names in os.walk(tile_dir) for name in names]
+    assert any(name.startswith(f"{ys[0]}.") for name in cached_files)
+
+    start = time.perf_counter()
+    second = client.get(url)
+    warm = time.perf_counter() - start
+    assert first.data == second.data
+
+    etag = second.headers["ETag"].strip('"')
+    assert client.get(url, headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+    if len(first.data) >= api.api.MIN_COMPRESS_SIZE:
+        assert gzipped.headers["Content-Encoding"] == "gzip"
+
+    for bad in ("/tiles/3/8/0", "/tiles/3/0/-1", "/tiles/30/0/0"):
+        assert client.get(bad).status_code == 404, bad
+    print(f"Tile built in {cold * 1000:.1f}ms, from disk in {warm * 1000:.1f}ms")
+
+
+def shorten_lines(path):
+    """Keep the first half of every line in a GeoJSON file, in place"""
+    with open(path) as f:
+        data = json.load(f)
+    for feature in data["features"]:
+        geometry = feature["geometry"]
+        if geometry["type"] == "LineString":
+            lines = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiLineString":
+            lines = geometry["coordinates"]
+        else:
+            continue
+        for line in lines:
+            del line[max(2, len(line) // 2) :]
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def check_edited_file(client, conn, tmp, tile_dir):
+    # serve one trail from a copy of its file that can be edited
+    trail_id, geojson_path = conn.execute(
+        "SELECT trail_id, geojson_path FROM trails ORDER BY trail_id"
+    ).fetchone()
+    copy = os.path.join(tmp, os.path.basename(geojson_path))
+    shutil.copy(get_full_trail_path(geojson_path), copy)
+    conn.execute(
+        "UPDATE trails SET geojson_path = ? WHERE trail_id = ?", (copy, trail_id)
+    )
+    conn.commit()
+
+    lon, lat = load_line_coordinates(copy)[0][:2]
+    xs, ys = tile_range((lon, lat, lon, lat), 13)
+    url = f"/tiles/13/{xs[0]}/{ys[0]}"
+    before = client.get(url)
+    etag = before.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    shorten_lines(copy)
+    after = client.get(url, headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    assert after.data != before.data
+    assert client.get(url).data == after.data
+
+    # the stale copy of the tile was replaced, not kept beside the new one
+    directory = os.path.dirname(
+        api.api.tile_cache.path(next(os.scandir(tile_dir)).name, 13, xs[0], ys[0])
+    )
+    cached = [name for name in os.listdir(directory) if name.startswith(f"{ys[0]}.")]
+    assert len(cached) == 1, cached
+    print("Editing a trail file rebuilds its tiles")
+
+
+def compare_sizes(client, conn, z=11):
+    bbox = conn.execute(
+        "SELECT MIN(min_lon), MIN(min_lat), MAX(max_lon), MAX(max_lat) FROM trail_rtree"
+    ).fetchone()
+    xs, ys = tile_range(bbox, z)
+    headers = {"Accept-Encoding": "gzip"}
+    tile_bytes = sum(
+        len(client.get(f"/tiles/{z}/{x}/{y}", headers=headers).data)
+        for x in xs
+        for y in ys
+    )
+    path_bytes = 0
+    for (name,) in conn.execute("SELECT name FROM trails"):
+        response = client.get(f"/api/trail_path/{quote(name)}", headers=headers)
+        if response.status_code == 200:
+            path_bytes += len(response.data)
+    print(f"Every trail at z{z}: tiles {tile_bytes} bytes, paths {path_bytes} bytes")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "trails.db")
+        shutil.copy(get_db_path(), db_path)
+        conn = sqlite3.connect(db_path)
+        migrate(conn)
+
+        tile_dir = os.path.join(tmp, "tiles")
+        api.api.get_db_path = lambda: db_path
+        api.api.tile_cache = DiskTileCache(tile_dir)
+        client = api.api.app.test_client()
+
+        paths = load_paths(conn)
+        check_tiles(client, conn, paths)
+        check_caching(client, tile_dir, paths)
+        check_edited_file(client, conn, tmp, tile_dir)
+        compare_sizes(client, conn)
+        conn.close()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
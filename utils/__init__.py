@@ -19,6 +19,16 @@ def get_trail_files():
     return os.path.join(get_project_root(), "storage", "trail_files")
 
 
+def get_tile_cache_dir():
+    """Returns the absolute path to the generated map tile directory"""
+    return os.path.join(get_project_root(), "storage", "tile_cache")
+
+
+def get_dem_dir():
+    """Returns the absolute path to the directory of SRTM .hgt elevation tiles"""
+    return os.path.join(get_project_root(), "storage", "dem")
+
+
 def get_trail_file_name(full_path):
     """Extracts just the trail file name from a full path"""
     return os.path.basename(full_path)
@@ -29,3 +39,13 @@ def get_full_trail_path(file_name):
     if os.path.isabs(file_name):
         return file_name
     return os.path.join(get_trail_files(), file_name)
+
+
+def resolve_trail_path(file_name):
+    """
+    Absolute path to a trail file with the symlinks in its directory resolved,
+    so the same file always gets the same path
+    """
+    full_path = get_full_trail_path(file_name)
+    directory, name = os.path.split(os.path.abspath(full_path))
+    return os.path.join(os.path.realpath(directory), name)
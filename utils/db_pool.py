@@ -0,0 +1,124 @@
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# applied once when a pooled connection is opened, not per request
+READ_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,  # read pages straight from the OS cache
+    "cache_size": -16384,  # negative means KiB, so 16 MiB per connection
+    "temp_store": "MEMORY",
+}
+
+
+def enable_wal(db_path: str) -> str:
+    """
+    Switch a database to WAL so readers never block on the writer.
+    Needs a writable connection, so call it once at startup; the setting is
+    stored in the database file. Returns the resulting journal mode.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers which database file it was opened on"""
+
+    file_id: Optional[Tuple[int, int]] = None
+
+
+class ConnectionPool:
+    """
+    Reusable read-only SQLite connections.
+
+    Idle connections are kept in a stack; a request borrows one with
+    acquire() and hands it back with release(). Connections are opened
+    with mode=ro and their pragmas are set once, so a request only pays
+    for its queries. The pool starts over after a fork (each worker process
+    gets its own connections) and when the database file is replaced.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_idle: int = 8,
+        pragmas: Optional[Dict[str, object]] = None,
+    ) -> None:
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.pragmas = READ_PRAGMAS if pragmas is None else pragmas
+        self.opened = 0
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._file_id = self._current_file_id()
+
+    def acquire(self) -> PooledConnection:
+        """Borrow an idle connection, opening a new one if there is none"""
+        self._check_process_and_file()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._open()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection; closed instead if the pool is full or stale"""
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            if (
+                os.getpid() == self._pid
+                and getattr(conn, "file_id", None) == self._file_id
+                and len(self._idle) < self.max_idle
+            ):
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self) -> None:
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _open(self) -> PooledConnection:
+        uri = f"{pathlib.Path(self.db_path).resolve().as_uri()}?mode=ro"
+        # connections move between request threads, but only one uses each at a time
+        conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False, factory=PooledConnection
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        conn.file_id = self._file_id
+        self.opened += 1
+        return conn
+
+    def _current_file_id(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def _check_process_and_file(self) -> None:
+        file_id = self._current_file_id()
+        pid = os.getpid()
+        if pid == self._pid and file_id == self._file_id:
+            return
+
+        with self._lock:
+            idle, self._idle = self._idle, []
+            if pid != self._pid:
+                # inherited from the parent process, unsafe to use or close here
+                idle = []
+            self._pid = pid
+            self._file_id = file_id
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+# brotli is optional, gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def file_stamp(path: str) -> Tuple[int, int]:
+    """(size, mtime_ns) of a file, or (0, 0) if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (0, 0)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def database_stamp(db_path: str) -> Tuple[int, int, int, int]:
+    """
+    Changes whenever the SQLite database does: in WAL mode commits only touch
+    the -wal file until a checkpoint, so both files are included.
+    """
+    return file_stamp(db_path) + file_stamp(f"{db_path}-wal")
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag value (without quotes) for a response built from parts"""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def last_modified(*stamps: Tuple[int, ...]) -> datetime:
+    """Latest mtime among file or database stamps, as an aware datetime"""
+    # every stamp is (size, mtime_ns) pairs
+    mtime_ns = max(stamp[i] for stamp in stamps for i in range(1, len(stamp), 2))
+    return datetime.fromtimestamp(mtime_ns // 1_000_000_000, tz=timezone.utc)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Content encodings this server can produce, in order of preference"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Best encoding from a werkzeug Accept-Encoding header, or None"""
+    return accept_encodings.best_match(available_encodings())
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    if not mimetype:
+        return False
+    return (
+        mimetype.startswith("text/")
+        or mimetype == "application/json"
+        or mimetype.endswith("+json")
+        or mimetype == "application/javascript"
+        # vector tiles are protobuf, but mostly small varints that gzip well
+        or mimetype == "application/vnd.mapbox-vector-tile"
+    )
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional
+
+
+class DiskTileCache:
+    """
+    Generated tiles stored as files under root/<version>/<z>/<x>/<y>.
+
+    The version names the data the tiles were built from (e.g. a hash of the
+    database stamp), so a changed database simply misses and rebuilds; the
+    directories of older versions are removed the first time a tile of a new
+    version is written. A tile may also have a variant naming inputs of that
+    tile alone (e.g. the files it was drawn from), stored as <y>.<variant>;
+    writing one variant removes the tile's others. Files are written to a
+    temporary name and renamed, so concurrent readers never see a partial
+    tile.
+    """
+
+    def __init__(self, root: str, suffix: str = ".mvt") -> None:
+        self.root = root
+        self.suffix = suffix
+        self._current: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def path(self, version: str, z: int, x: int, y: int, variant: str = "") -> str:
+        name = f"{y}.{variant}" if variant else str(y)
+        return os.path.join(self.root, version, str(z), str(x), name + self.suffix)
+
+    def get(
+        self, version: str, z: int, x: int, y: int, variant: str = ""
+    ) -> Optional[bytes]:
+        try:
+            with open(self.path(version, z, x, y, variant), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(
+        self, version: str, z: int, x: int, y: int, data: bytes, variant: str = ""
+    ) -> None:
+        self._prune(version)
+        path = self.path(version, z, x, y, variant)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._remove_variants(path, y)
+        except OSError as e:
+            # a read-only or full disk only costs the cache, not the response
+            print(f"Could not cache tile {path}: {e}")
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._current = None
+
+    def _remove_variants(self, path: str, y: int) -> None:
+        """Remove the other variants of the tile just written to path"""
+        directory, current = os.path.split(path)
+        for name in os.listdir(directory):
+            if name == current or not name.endswith(self.suffix):
+                continue
+            if name == f"{y}{self.suffix}" or name.startswith(f"{y}."):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def _prune(self, version: str) -> None:
+        """Remove every other version's tiles, once per new version"""
+        with self._lock:
+            if self._current == version:
+                return
+            self._current = version
+        try:
+            stale = [name for name in os.listdir(self.root) if name != version]
+        except OSError:
+            return
+        for name in stale:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)